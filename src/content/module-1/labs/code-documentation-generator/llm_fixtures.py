@@ -0,0 +1,265 @@
+"""
+Record/replay fixtures for LLM calls made during grading.
+
+`verify.py` calls each submission's `generate_documentation`, which talks to
+the model through the OpenAI SDK. With a fixture store installed, every
+chat completion request is intercepted at the SDK level:
+
+    record  call the API and save the request/response pair
+    replay  answer from the store only; unrecorded requests fail and are
+            listed in the mismatch report
+    auto    replay when recorded, otherwise call the API and record
+
+Requests are keyed by a hash of their canonical form (model, messages and
+sampling parameters, with transport-only options such as timeouts left
+out), so the same request from any submission or run hits the same entry.
+The store is a JSON Lines file holding only what graders read back (content,
+finish reason, usage), loaded into memory once, so replay costs a
+dictionary lookup.
+
+Usage:
+    store = FixtureStore("fixtures.jsonl", mode="auto")
+    with store.installed():
+        result = run_verification("doc_generator.py")
+    print(store.mismatch_report())
+"""
+
+import difflib
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+MODES = ("record", "replay", "auto")
+
+# Request options that do not change the response
+TRANSPORT_OPTIONS = {"timeout", "extra_headers", "extra_query"}
+
+
+class FixtureMissing(LookupError):
+    """Raised in replay mode for a request that was never recorded."""
+
+
+def canonical_request(kwargs: dict) -> dict:
+    """Reduce chat completion keyword arguments to what determines the response."""
+    return {key: value for key, value in sorted(kwargs.items())
+            if key not in TRANSPORT_OPTIONS and value is not None}
+
+
+def request_key(request: dict) -> str:
+    """Content address of a canonical request."""
+    payload = json.dumps(request, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class FixtureStore:
+    """
+    In-memory fixture table backed by an append-only JSON Lines file.
+
+    Appends are single line writes, so concurrent grading workers can record
+    into the same file.
+
+    Args:
+        path: Fixture file; created on first record.
+        mode: "record", "replay" or "auto".
+    """
+
+    def __init__(self, path: str, mode: str = "auto"):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.path = path
+        self.mode = mode
+        self.entries = {}
+        self.misses = []
+        self.stats = {'replayed': 0, 'recorded': 0, 'missed': 0}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.entries[entry['key']] = entry
+
+    def lookup(self, request: dict) -> dict | None:
+        """Return the recorded entry for a canonical request, noting misses in replay mode."""
+        key = request_key(request)
+        entry = None if self.mode == "record" else self.entries.get(key)
+        with self._lock:
+            if entry is not None:
+                self.stats['replayed'] += 1
+            elif self.mode == "replay":
+                self.stats['missed'] += 1
+                self.misses.append({'key': key, 'request': request})
+        return entry
+
+    def record(self, request: dict, response: dict) -> None:
+        """Save one request/response pair."""
+        key = request_key(request)
+        entry = {'key': key, 'request': request, 'response': response,
+                 'recorded_at': round(time.time())}
+        line = json.dumps(entry, separators=(',', ':'), ensure_ascii=False, default=str)
+        with self._lock:
+            self.entries[key] = entry
+            self.stats['recorded'] += 1
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+    # -------------------------------------------------------------------------
+    # SDK interception
+    # -------------------------------------------------------------------------
+
+    @contextmanager
+    def installed(self):
+        """Route every OpenAI chat completion call through the store while active."""
+        from openai.resources.chat.completions import AsyncCompletions, Completions
+
+        store = self
+        original_create = Completions.create
+        original_async_create = AsyncCompletions.create
+
+        def create(self, **kwargs):
+            request = canonical_request(kwargs)
+            entry = store.lookup(request)
+            if entry is None:
+                if store.mode == "replay":
+                    raise FixtureMissing(f"No fixture for request {request_key(request)[:12]}")
+                response = original_create(self, **kwargs)
+                if kwargs.get('stream'):
+                    chunks = list(response)
+                    store.record(request, _compact_stream(chunks))
+                    return iter(chunks)
+                store.record(request, _compact(response))
+                return response
+            return _expand(entry['response'], kwargs.get('stream'))
+
+        async def async_create(self, **kwargs):
+            request = canonical_request(kwargs)
+            entry = store.lookup(request)
+            if entry is None:
+                if store.mode == "replay":
+                    raise FixtureMissing(f"No fixture for request {request_key(request)[:12]}")
+                response = await original_async_create(self, **kwargs)
+                if kwargs.get('stream'):
+                    chunks = [chunk async for chunk in response]
+                    store.record(request, _compact_stream(chunks))
+                    return _aiter(chunks)
+                store.record(request, _compact(response))
+                return response
+            expanded = _expand(entry['response'], kwargs.get('stream'))
+            return _aiter(expanded) if kwargs.get('stream') else expanded
+
+        Completions.create = create
+        AsyncCompletions.create = async_create
+        try:
+            yield self
+        finally:
+            Completions.create = original_create
+            AsyncCompletions.create = original_async_create
+
+    # -------------------------------------------------------------------------
+    # Reporting
+    # -------------------------------------------------------------------------
+
+    def mismatch_report(self) -> list[dict]:
+        """
+        Describe every request that missed in replay mode.
+
+        Returns:
+            One entry per miss with its key, model, the closest recorded
+            request for the same model and a unified diff of their prompts,
+            which usually shows what changed (prompt edits, parameters).
+        """
+        report = []
+        for miss in self.misses:
+            request = miss['request']
+            prompt = _prompt_text(request)
+            candidates = [entry['request'] for entry in self.entries.values()
+                          if entry['request'].get('model') == request.get('model')]
+            nearest = max(candidates, default=None,
+                          key=lambda other: difflib.SequenceMatcher(
+                              None, prompt, _prompt_text(other)).quick_ratio())
+            item = {'key': miss['key'], 'model': request.get('model'), 'nearest': None,
+                    'diff': None}
+            if nearest is not None:
+                item['nearest'] = request_key(nearest)
+                item['diff'] = '\n'.join(difflib.unified_diff(
+                    _prompt_text(nearest).splitlines(), prompt.splitlines(),
+                    'recorded', 'requested', lineterm='', n=1))
+                changed = sorted(key for key in set(nearest) | set(request)
+                                 if key != 'messages' and nearest.get(key) != request.get(key))
+                item['changed_parameters'] = changed
+            report.append(item)
+        return report
+
+
+# =============================================================================
+# RESPONSE (DE)SERIALIZATION
+# =============================================================================
+
+def _compact(response) -> dict:
+    """Keep only the fields a grader reads back from a chat completion."""
+    usage = getattr(response, 'usage', None)
+    return {
+        'model': response.model,
+        'choices': [{'content': choice.message.content, 'finish_reason': choice.finish_reason}
+                    for choice in response.choices],
+        'usage': usage.model_dump() if usage is not None else None,
+    }
+
+
+def _compact_stream(chunks: list) -> dict:
+    """Fold streamed chunks into the same compact form as a plain response."""
+    contents, reasons, model = {}, {}, None
+    for chunk in chunks:
+        model = model or chunk.model
+        for choice in chunk.choices:
+            contents[choice.index] = contents.get(choice.index, '') + (choice.delta.content or '')
+            reasons[choice.index] = choice.finish_reason or reasons.get(choice.index)
+    return {
+        'model': model,
+        'choices': [{'content': contents[i], 'finish_reason': reasons.get(i)}
+                    for i in sorted(contents)],
+        'usage': None,
+    }
+
+
+def _expand(compact: dict, stream: bool = False):
+    """Rebuild SDK objects from a compact response."""
+    from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+    if stream:
+        return iter([ChatCompletionChunk.model_validate({
+            'id': 'chatcmpl-fixture', 'object': 'chat.completion.chunk', 'created': 0,
+            'model': compact['model'],
+            'choices': [{'index': i, 'delta': {'role': 'assistant', 'content': choice['content']},
+                         'finish_reason': choice['finish_reason']}
+                        for i, choice in enumerate(compact['choices'])],
+        })])
+
+    return ChatCompletion.model_validate({
+        'id': 'chatcmpl-fixture', 'object': 'chat.completion', 'created': 0,
+        'model': compact['model'],
+        'choices': [{'index': i, 'finish_reason': choice['finish_reason'] or 'stop',
+                     'message': {'role': 'assistant', 'content': choice['content']}}
+                    for i, choice in enumerate(compact['choices'])],
+        'usage': compact['usage'],
+    })
+
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
+
+def _prompt_text(request: dict) -> str:
+    return '\n'.join(str(message.get('content', '')) for message in request.get('messages', []))
@@ -0,0 +1,352 @@
+"""
+Async Documentation Engine
+
+Documents every function in a file concurrently using the OpenAI async client.
+The sequential `document_file` makes one LLM round-trip per function, so a
+300-function module pays for 300 back-to-back requests. This engine issues
+them in parallel behind a concurrency limit, so wall-clock time for a file is
+bounded by the slowest few calls instead of the sum of all calls.
+"""
+
+import asyncio
+
+import doc_generator
+from metrics import METRICS
+from doc_generator import (
+    MAX_TOKENS,
+    TEMPERATURE,
+    build_messages,
+    clean_code_output,
+    validate_documentation,
+)
+from token_budget import plan_request, restore_body
+from triage import triage_file
+
+# Maximum number of in-flight requests per engine
+DEFAULT_CONCURRENCY = 16
+
+# Seconds before a single request is abandoned
+DEFAULT_TIMEOUT = 60.0
+
+
+# =============================================================================
+# ENGINE
+# =============================================================================
+
+class AsyncDocumentationEngine:
+    """
+    Generate documentation for many functions concurrently.
+
+    Requests are limited by a semaphore so large files do not open hundreds
+    of connections at once, and each request is bounded by its own timeout.
+    Results are always returned in the order the sources were given.
+
+    Args:
+        client: An async OpenAI-compatible client. Defaults to the async
+            client of the selected backend (see `doc_generator.set_backend`).
+        model: The model to use for generation. Defaults to "gpt-4-turbo".
+        concurrency: Maximum number of requests in flight at once, across
+            all callers and hedged duplicates included.
+        timeout: Seconds to wait for a single request, or None to wait forever.
+        cache: Optional `DocumentationCache` consulted before each request.
+        scheduler: Optional `RateLimitScheduler` that admits each request,
+            hedged duplicates included. A client built by the engine then
+            leaves retries to it (`max_retries=0`).
+        router: Optional `router.ModelRouter`; each function then goes to the
+            cheapest suitable model and escalates on a poor validation score,
+            and `model` is ignored.
+        hedge: Duplicate a request once it outlasts the model's p95 latency
+            and use whichever answer arrives first (see `router.hedged`).
+
+    Example:
+        >>> engine = AsyncDocumentationEngine(concurrency=32, timeout=30)
+        >>> results = asyncio.run(engine.document_file("legacy.py"))
+    """
+
+    def __init__(self, client=None, model: str = "gpt-4-turbo",
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float | None = DEFAULT_TIMEOUT, cache=None, scheduler=None,
+                 router=None, hedge: bool = False):
+        if concurrency < 1:
+            raise ValueError("Concurrency must be at least 1")
+
+        # A client built here is closed by `aclose`; a given one belongs to the caller
+        self.owns_client = client is None
+        if client is None:
+            from backends import create_backend
+            options = {} if scheduler is None else {'max_retries': 0}
+            client = create_backend(doc_generator.backend_spec, asynchronous=True, **options)
+        self.client = client
+        self.model = model
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache = cache
+        self.scheduler = scheduler
+        self.router = router
+        self._slots = None
+        self._slots_loop = None
+        self.latencies = None
+        if hedge:
+            from router import LatencyTracker
+            self.latencies = LatencyTracker()
+
+    def _request_slots(self) -> asyncio.Semaphore:
+        """The semaphore bounding this engine's requests, for the running event loop."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._slots_loop:
+            self._slots_loop, self._slots = loop, asyncio.Semaphore(self.concurrency)
+        return self._slots
+
+    async def aclose(self) -> None:
+        """Close the client's connections if this engine created the client."""
+        close = getattr(self.client, 'close', None) if self.owns_client else None
+        if close is not None:
+            await close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def generate_documentation(self, code: str, model: str | None = None) -> str:
+        """
+        Generate documentation for a single function.
+
+        Async counterpart of `doc_generator.generate_documentation`, using the
+        same prompt and output cleanup.
+
+        Args:
+            code: The Python function source code as a string.
+            model: Model to use instead of the engine's `model`.
+
+        Returns:
+            The documented version of the function.
+
+        Raises:
+            ValueError: If the provided code is empty.
+            asyncio.TimeoutError: If the request exceeds the engine timeout.
+            token_budget.PromptTooLarge: If the function cannot be trimmed to
+                fit the model's context window.
+        """
+        if not code or not code.strip():
+            raise ValueError("Code cannot be empty")
+        model = model or self.model
+
+        if self.cache is not None:
+            cached = self.cache.get(code, model, TEMPERATURE, MAX_TOKENS)
+            if cached is not None:
+                return cached
+
+        plan = plan_request(code, model)
+        messages = build_messages(plan['code'])
+
+        def create():
+            return self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=TEMPERATURE,
+                max_tokens=plan['max_tokens']
+            )
+
+        async def attempt():
+            with METRICS.timer("network", model):
+                return await asyncio.wait_for(create(), timeout=self.timeout)
+
+        async def request():
+            # Every attempt, a hedged duplicate included, takes a slot and
+            # spends the rate limit budget
+            async with self._request_slots():
+                if self.scheduler is None:
+                    return await attempt()
+                return await self.scheduler.run(
+                    attempt, plan['prompt_tokens'] + plan['max_tokens']
+                )
+
+        if self.latencies is None:
+            response = await request()
+        else:
+            from router import hedged
+            response = await hedged(request, model, self.latencies, plan['max_tokens'])
+
+        METRICS.record_usage(response, model)
+
+        with METRICS.timer("clean"):
+            result = clean_code_output(response.choices[0].message.content)
+            if plan['trimmed']:
+                result = restore_body(code, result)
+        if self.cache is not None:
+            self.cache.put(code, model, TEMPERATURE, MAX_TOKENS, result)
+        return result
+
+    async def document_sources(self, sources: list[str]) -> list[dict]:
+        """
+        Document a list of function sources concurrently.
+
+        A failing or timed-out request does not cancel the others; its entry
+        carries an `error` message instead of documentation.
+
+        Args:
+            sources: Function source strings to document.
+
+        Returns:
+            One result per source, in the same order, each containing
+            `original`, `documented`, `validation` and `error`.
+        """
+        # gather preserves argument order regardless of completion order; the
+        # engine's request slots bound how many are in flight
+        return await asyncio.gather(*(self.document(code) for code in sources))
+
+    async def document(self, code: str) -> dict:
+        """
+        Document and validate one function without raising on failure.
+
+        Args:
+            code: The Python function source code as a string.
+
+        Returns:
+            A result containing `original`, `documented`, `validation`,
+            `model` and `error`; `error` is None on success.
+        """
+        models = [self.model] if self.router is None else self.router.models(code)
+        try:
+            for model in models:
+                documented = await self.generate_documentation(code, model)
+                validation = validate_documentation(documented)
+                if self.router is None or not self.router.should_escalate(validation, model):
+                    break
+        except asyncio.TimeoutError:
+            return _failed(code, f"Timed out after {self.timeout}s")
+        except Exception as e:
+            return _failed(code, str(e))
+
+        return {
+            'original': code,
+            'documented': documented,
+            'validation': validation,
+            'model': model,
+            'error': None
+        }
+
+    async def document_file(self, file_path: str, min_score: int | None = None) -> dict:
+        """
+        Document all functions in a Python file concurrently.
+
+        Functions are triaged locally first (see `triage.py`) and submitted
+        public API first, most complex first.
+
+        Args:
+            file_path: Path to the Python file to document.
+            min_score: Skip functions whose existing documentation passes
+                validation with at least this score. None documents everything.
+
+        Returns:
+            Dictionary mapping qualified function names to their results:
+            documented functions in submission order, then skipped ones
+            (`skipped` True, `validation` holding the local score).
+        """
+        queue, skipped = triage_file(file_path, min_score)
+        results = await self.document_sources([item['source'] for item in queue])
+
+        documented = {item['name']: {**result, 'skipped': False}
+                      for item, result in zip(queue, results)}
+        for item in skipped:
+            documented[item['name']] = {'original': item['source'], 'documented': item['source'],
+                                        'validation': item['assessment'], 'model': None,
+                                        'error': None, 'skipped': True}
+        return documented
+
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+def _failed(code: str, error: str) -> dict:
+    """Build the result entry for a function whose request failed."""
+    return {'original': code, 'documented': None, 'validation': None, 'model': None,
+            'error': error}
+
+
+def run_engine(engine: AsyncDocumentationEngine, coroutine):
+    """
+    Run `coroutine` to completion, then close the engine on the same event loop.
+
+    Args:
+        engine: The engine the coroutine uses.
+        coroutine: Work to run, e.g. `engine.document_file(path)`.
+
+    Returns:
+        Whatever the coroutine returns.
+    """
+    async def run():
+        async with engine:
+            return await coroutine
+
+    return asyncio.run(run())
+
+
+def document_file_concurrent(file_path: str, min_score: int | None = None,
+                             **engine_options) -> dict:
+    """
+    Synchronous wrapper that documents a file with `AsyncDocumentationEngine`.
+
+    Args:
+        file_path: Path to the Python file to document.
+        min_score: Skip functions already documented with at least this score.
+        **engine_options: Passed through to `AsyncDocumentationEngine`.
+
+    Returns:
+        Dictionary mapping function names to their results (see
+        `AsyncDocumentationEngine.document_file`).
+    """
+    engine = AsyncDocumentationEngine(**engine_options)
+    return run_engine(engine, engine.document_file(file_path, min_score))
+
+
+# =============================================================================
+# CLI INTERFACE
+# =============================================================================
+
+def main():
+    """Document a file concurrently from the command line."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", help="Python file to document")
+    parser.add_argument("--model", default="gpt-4-turbo")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--min-score", type=int,
+                        help="Skip functions already documented with at least this score")
+    parser.add_argument("--rpm", type=int,
+                        help="Requests per minute allowed by the provider (see scheduler.py)")
+    parser.add_argument("--tpm", type=int,
+                        help="Tokens per minute allowed by the provider (see scheduler.py)")
+    args = parser.parse_args()
+
+    from scheduler import create_scheduler
+    results = document_file_concurrent(
+        args.file,
+        min_score=args.min_score,
+        model=args.model,
+        concurrency=args.concurrency,
+        timeout=args.timeout,
+        scheduler=create_scheduler(args.rpm, args.tpm)
+    )
+
+    for func_name, data in results.items():
+        print(f"\n{'='*60}")
+        print(f"FUNCTION: {func_name}")
+        print('='*60)
+        if data['error']:
+            print(f"ERROR: {data['error']}")
+            continue
+        if data['skipped']:
+            print(f"Already documented (score {data['validation']['score']}/100)")
+            continue
+        print(data['documented'])
+        print(f"\nScore: {data['validation']['score']}/100")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""
+LLM Backends
+
+Pluggable clients for the documentation pipeline. Everything that talks to a
+model only relies on the small OpenAI-compatible surface
+`client.chat.completions.create(...)`, so any object providing it can be
+used as a backend:
+
+    openai  the real OpenAI API (`OpenAI()` / `AsyncOpenAI()`), over a
+            shared connection pool (see http_pool.py)
+    fake    a local, deterministic stand-in with configurable latency and
+            token-rate distributions, for benchmarks and CI without network
+
+Backends are selected by name, optionally with options, either on the
+command line (`--backend fake:latency=0.05,tokens_per_second=60`) or with
+the DOCGEN_BACKEND environment variable.
+
+Example:
+    >>> backend = create_backend("fake:latency=0.2,latency_sigma=0.3")
+    >>> documented = generate_documentation(code, client=backend)
+"""
+
+import ast
+import asyncio
+import math
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from doc_generator import estimate_tokens
+from triage import complexity
+
+DEFAULT_BACKEND = "openai"
+
+# Environment variable holding the default backend spec
+BACKEND_ENV = "DOCGEN_BACKEND"
+
+# Recent prompts whose attempts the fake backend counts; a repeat of an
+# older prompt draws like a first attempt again
+FAKE_ATTEMPT_MEMORY = 10_000
+
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+def _openai_backend(asynchronous: bool = False, **options):
+    from http_pool import POOL_OPTIONS, get_pool
+    pool = get_pool(**{key: options.pop(key) for key in POOL_OPTIONS if key in options})
+    return pool.async_client(**options) if asynchronous else pool.client(**options)
+
+
+def _fake_backend(asynchronous: bool = False, **options):
+    # Nothing to retry: the fake backend never fails a request
+    options.pop('max_retries', None)
+    return AsyncFakeBackend(**options) if asynchronous else FakeBackend(**options)
+
+
+BACKENDS = {
+    'openai': _openai_backend,
+    'fake': _fake_backend,
+}
+
+
+def register_backend(name: str, factory) -> None:
+    """
+    Make a backend available by name.
+
+    Args:
+        name: Name used in backend specs.
+        factory: Callable taking `asynchronous` plus the spec's options and
+            returning an OpenAI-compatible client.
+    """
+    BACKENDS[name] = factory
+
+
+def parse_backend_spec(spec: str) -> tuple[str, dict]:
+    """
+    Split a spec such as "fake:latency=0.05,seed=3" into name and options.
+
+    Option values are parsed as int or float where possible.
+    """
+    name, _, rest = spec.partition(':')
+    options = {}
+    for item in filter(None, rest.split(',')):
+        key, sep, value = item.partition('=')
+        if not sep:
+            raise ValueError(f"Backend option {item!r} must look like key=value")
+        options[key.strip()] = _parse_value(value.strip())
+    return name.strip(), options
+
+
+def _parse_value(value: str):
+    for convert in (int, float):
+        try:
+            return convert(value)
+        except ValueError:
+            pass
+    return value
+
+
+_environment_loaded = False
+
+
+def load_environment() -> None:
+    """
+    Load `.env` into the environment, once, before the first client is built.
+
+    Deferred until a backend is actually needed, so `--help` and validation
+    runs do not pay for python-dotenv.
+    """
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _environment_loaded = True
+
+
+def create_backend(spec: str | None = None, asynchronous: bool = False, **overrides):
+    """
+    Build a client from a backend spec.
+
+    Args:
+        spec: Backend name with optional options, e.g. "fake:latency=0.1".
+            Defaults to $DOCGEN_BACKEND, then "openai".
+        asynchronous: Build an async client instead of a blocking one.
+        **overrides: Options applied on top of the spec's, e.g. `max_retries=0`
+            for a client whose retries a `RateLimitScheduler` owns.
+
+    Returns:
+        An OpenAI-compatible client.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    load_environment()
+    spec = spec or os.getenv(BACKEND_ENV) or DEFAULT_BACKEND
+    name, options = parse_backend_spec(spec)
+    options.update(overrides)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; choose from {', '.join(sorted(BACKENDS))}")
+    return BACKENDS[name](asynchronous=asynchronous, **options)
+
+
+# =============================================================================
+# FAKE BACKEND
+# =============================================================================
+
+class FakeBackend:
+    """
+    Deterministic local stand-in for `OpenAI()`.
+
+    Each response documents the function from the prompt: parameters get
+    `Any` annotations and a Google-style docstring is inserted, so the
+    output passes `validate_documentation` like real model output would.
+
+    Simulated time for a request is a time-to-first-token drawn from a
+    log-normal distribution around `latency`, plus the completion length
+    divided by a token rate drawn from a log-normal distribution around
+    `tokens_per_second`. Draws are seeded from the prompt, so the same
+    request always takes the same time regardless of scheduling order; a
+    repeated request (e.g. a hedged duplicate) draws again independently,
+    as long as it is among the last `FAKE_ATTEMPT_MEMORY` distinct prompts.
+
+    With `quality` below 1, each decision point in a function is a chance
+    for the model to slip: the reply then omits the Args and Returns
+    sections, with probability `1 - quality ** complexity`.
+
+    A batch prompt (see `batch_prompting.py`) is answered like a model
+    following its protocol: each numbered function is documented inside
+    its `### FUNCTION <n> START`/`END` markers.
+
+    Every option can be overridden per model by prefixing it with the model
+    name, e.g. `fake:latency=0.3,gpt-4o-mini.latency=0.1,gpt-4o-mini.quality=0.95`.
+
+    Args:
+        latency: Median seconds before the first token.
+        latency_sigma: Log-normal shape of the latency; 0 makes it constant.
+        tokens_per_second: Median generation speed; 0 generates instantly.
+        rate_sigma: Log-normal shape of the token rate.
+        seed: Seed mixed into every request's draws.
+        quality: Chance of getting each decision point right.
+        **model_options: Per-model overrides named `<model>.<option>`.
+    """
+
+    def __init__(self, latency: float = 0.0, latency_sigma: float = 0.0,
+                 tokens_per_second: float = 0.0, rate_sigma: float = 0.0, seed: int = 0,
+                 quality: float = 1.0, **model_options):
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.tokens_per_second = tokens_per_second
+        self.rate_sigma = rate_sigma
+        self.seed = seed
+        self.quality = quality
+        self.profiles = {}
+        for key, value in model_options.items():
+            model, _, option = key.rpartition('.')
+            if not model or option not in _PROFILE_OPTIONS:
+                raise TypeError(f"Unknown fake backend option {key!r}")
+            self.profiles.setdefault(model, {})[option] = value
+        self.requests = 0
+        self._attempts = OrderedDict()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model: str, messages: list, max_tokens: int | None = None,
+               stream: bool = False, **kwargs):
+        content, usage, first_token, per_token = self._respond(model, messages, max_tokens)
+        if stream:
+            return self._stream(content, first_token, per_token)
+        time.sleep(first_token + per_token * usage.completion_tokens)
+        return _completion(model, content, usage)
+
+    def _stream(self, content: str, first_token: float, per_token: float):
+        time.sleep(first_token)
+        for piece in _pieces(content):
+            time.sleep(per_token * estimate_tokens(piece))
+            yield _chunk(piece)
+
+    def _respond(self, model: str, messages: list, max_tokens: int | None):
+        """Build the reply and draw its timing."""
+        self.requests += 1
+        prompt = messages[-1]['content']
+        profile = {option: getattr(self, option) for option in _PROFILE_OPTIONS}
+        profile.update(self.profiles.get(model, {}))
+
+        key = hash((model, prompt))
+        attempt = self._attempts[key] = self._attempts.get(key, -1) + 1
+        self._attempts.move_to_end(key)
+        if len(self._attempts) > FAKE_ATTEMPT_MEMORY:
+            self._attempts.popitem(last=False)
+        seed = f"{self.seed}\0{model}\0{prompt}" + (f"\0{attempt}" if attempt else "")
+
+        slips = None
+        if profile['quality'] < 1:
+            slips = random.Random(f"{seed}\0quality")
+        content = fake_documentation(prompt, profile['quality'], slips)
+
+        prompt_tokens = sum(estimate_tokens(m['content']) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        if max_tokens is not None and completion_tokens > max_tokens:
+            content = content[:max_tokens * 4]
+            completion_tokens = max_tokens
+        usage = SimpleNamespace(prompt_tokens=prompt_tokens,
+                                completion_tokens=completion_tokens,
+                                total_tokens=prompt_tokens + completion_tokens)
+
+        if not _BATCH_BLOCK_PATTERN.search(prompt):
+            content = f"```python\n{content}\n```"
+        if not (profile['latency'] or profile['tokens_per_second']):
+            return content, usage, 0.0, 0.0
+
+        draws = random.Random(seed)
+        first_token = profile['latency'] * math.exp(draws.gauss(0, profile['latency_sigma']))
+        per_token = 0.0
+        if profile['tokens_per_second']:
+            rate = profile['tokens_per_second'] * math.exp(draws.gauss(0, profile['rate_sigma']))
+            per_token = 1 / rate
+        return content, usage, first_token, per_token
+
+
+class AsyncFakeBackend(FakeBackend):
+    """`FakeBackend` for `AsyncOpenAI()` call sites; simulated time is awaited."""
+
+    async def create(self, model: str, messages: list, max_tokens: int | None = None,
+                     stream: bool = False, **kwargs):
+        content, usage, first_token, per_token = self._respond(model, messages, max_tokens)
+        if stream:
+            return self._stream(content, first_token, per_token)
+        await asyncio.sleep(first_token + per_token * usage.completion_tokens)
+        return _completion(model, content, usage)
+
+    async def _stream(self, content: str, first_token: float, per_token: float):
+        await asyncio.sleep(first_token)
+        for piece in _pieces(content):
+            await asyncio.sleep(per_token * estimate_tokens(piece))
+            yield _chunk(piece)
+
+
+_CODE_BLOCK_PATTERN = re.compile(r'```python\n(.*?)\n```', re.DOTALL)
+
+# A numbered function in a batch prompt (`batch_prompting.FUNCTION_BLOCK_TEMPLATE`)
+_BATCH_BLOCK_PATTERN = re.compile(r'^### FUNCTION (\d+)\n```python\n(.*?)\n```',
+                                  re.MULTILINE | re.DOTALL)
+
+# Options that can be set per model
+_PROFILE_OPTIONS = ('latency', 'latency_sigma', 'tokens_per_second', 'rate_sigma', 'quality')
+
+
+def fake_documentation(prompt: str, quality: float = 1.0,
+                       slips: random.Random | None = None) -> str:
+    """
+    Document every function in the prompt's code block(s) mechanically.
+
+    Args:
+        prompt: A user prompt containing ```python fenced code.
+        quality: Chance of getting each decision point of a function right.
+        slips: Random source deciding the slips when `quality` is below 1.
+
+    Returns:
+        The documented code, or the raw code if it cannot be parsed. For a
+        batch prompt, each numbered function wrapped in its START/END markers.
+    """
+    numbered = _BATCH_BLOCK_PATTERN.findall(prompt)
+    if numbered:
+        return '\n\n'.join(
+            f"### FUNCTION {number} START\n{_document_block(block, quality, slips)}\n"
+            f"### FUNCTION {number} END"
+            for number, block in numbered
+        )
+    blocks = _CODE_BLOCK_PATTERN.findall(prompt) or [prompt]
+    return '\n\n'.join(_document_block(block, quality, slips) for block in blocks)
+
+
+def _document_block(block: str, quality: float, slips: random.Random | None) -> str:
+    try:
+        tree = ast.parse(block)
+    except SyntaxError:
+        return block
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            complete = slips is None or slips.random() < quality ** complexity(node)
+            _document_node(node, complete)
+    return ast.unparse(tree)
+
+
+def _document_node(node: ast.FunctionDef, complete: bool = True) -> None:
+    params = [arg for arg in node.args.posonlyargs + node.args.args + node.args.kwonlyargs
+              if arg.arg not in ('self', 'cls')]
+    for arg in params:
+        arg.annotation = arg.annotation or ast.Name('Any')
+    node.returns = node.returns or ast.Name('Any')
+
+    summary = node.name.replace('_', ' ').strip().capitalize() or "Run the function"
+    lines = [f"{summary}.", ""]
+    if params and complete:
+        lines.append("Args:")
+        lines.extend(f"    {arg.arg}: The {arg.arg.replace('_', ' ')}." for arg in params)
+        lines.append("")
+    if complete:
+        lines.extend(["Returns:", "    The result.", ""])
+    if any(isinstance(child, ast.Raise) for child in ast.walk(node)):
+        lines.extend(["Raises:", "    Exception: If the operation fails.", ""])
+    lines.extend(["Example:", f"    >>> {node.name}(...)", ""])
+    # Indent continuation lines to the body so unparse renders a normal docstring
+    indent = '\n' + '    ' * (node.col_offset // 4 + 1)
+    text = lines[0] + ''.join(indent + line if line else '\n' for line in lines[1:])
+
+    body = node.body
+    if ast.get_docstring(node, clean=False) is not None:
+        body = body[1:]
+    node.body = [ast.Expr(ast.Constant(text.rstrip() + indent)), *body]
+
+
+def _pieces(content: str, size: int = 16):
+    """Split a reply into stream-sized pieces."""
+    return (content[i:i + size] for i in range(0, len(content), size))
+
+
+def _completion(model: str, content: str, usage) -> SimpleNamespace:
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, finish_reason='stop',
+                                 message=SimpleNamespace(role='assistant', content=content))],
+        usage=usage,
+    )
+
+
+def _chunk(piece: str) -> SimpleNamespace:
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=piece))])
@@ -0,0 +1,356 @@
+"""
+Batch Prompting
+
+Packs several small functions into one completion request. For tiny helpers
+like `add` or `merge_dicts`, most of a single request's prompt is the
+repeated `SYSTEM_PROMPT` and template boilerplate; sending them together
+pays that overhead once per batch instead of once per function.
+
+The model is asked to wrap each documented function in numbered markers,
+and the response is split back per function. A block that is missing, does
+not parse or does not define the function it was asked for falls back to a
+single-function request.
+
+Every function is sized with `token_budget.plan_request` first: oversized
+functions are trimmed before packing (and get their original body back
+afterwards), and a batch reserves the sum of its functions' completion
+budgets, within the model's output limit.
+"""
+
+import ast
+import re
+import textwrap
+
+import doc_generator
+from doc_generator import (
+    MAX_TOKENS,
+    SYSTEM_PROMPT,
+    TEMPERATURE,
+    build_messages,
+    clean_code_output,
+    validate_documentation,
+)
+from token_budget import (
+    DEFAULT_MAX_OUTPUT_TOKENS,
+    MAX_OUTPUT_TOKENS,
+    completion_budget,
+    count_tokens,
+    plan_request,
+    restore_body,
+)
+
+# Prompt tokens allowed per batch (function sources only)
+DEFAULT_TOKEN_BUDGET = 1500
+
+# Completion tokens allowed per batch
+MAX_BATCH_TOKENS = 4000
+
+# Never pack more functions than this into one request
+MAX_BATCH_SIZE = 10
+
+_FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+BATCH_PROMPT_TEMPLATE = """Add comprehensive documentation to each of these {count} Python functions.
+
+{functions}
+
+Requirements:
+- Add type hints to all parameters and return values
+- Write a Google-style docstring for each function with:
+  - One-line summary
+  - Detailed description if the function is complex
+  - Args section with types and descriptions
+  - Returns section with type and description
+  - Raises section if applicable
+  - Example usage section
+
+Return every documented function, in the same order, each wrapped exactly like this:
+### FUNCTION <number> START
+<documented function code>
+### FUNCTION <number> END"""
+
+FUNCTION_BLOCK_TEMPLATE = """### FUNCTION {number}
+```python
+{code}
+```"""
+
+_MARKER_PATTERN = re.compile(
+    r'^### FUNCTION (\d+) START[ \t]*\n(.*?)\n### FUNCTION \1 END[ \t]*$',
+    re.MULTILINE | re.DOTALL
+)
+
+
+# =============================================================================
+# PACKING
+# =============================================================================
+
+def estimate_output_tokens(code: str, model: str = "gpt-4-turbo") -> int:
+    """Completion tokens reserved for one function, as for a single request."""
+    return completion_budget(count_tokens(code, model), model)
+
+
+def pack_functions(sources: list[str], token_budget: int = DEFAULT_TOKEN_BUDGET,
+                   max_batch_size: int = MAX_BATCH_SIZE,
+                   model: str = "gpt-4-turbo") -> list[list[int]]:
+    """
+    Greedily group functions into batches that fit the token budgets.
+
+    Functions stay in their original order. A function too large for any
+    batch is placed alone, which is the same as a single-function request.
+
+    Args:
+        sources: Function source strings.
+        token_budget: Maximum prompt tokens of source per batch.
+        max_batch_size: Maximum number of functions per batch.
+        model: Model whose tokenizer counts the tokens.
+
+    Returns:
+        Lists of indices into `sources`, one list per request.
+    """
+    batches = []
+    current, prompt_tokens, output_tokens = [], 0, 0
+
+    for index, code in enumerate(sources):
+        cost, output = count_tokens(code, model), estimate_output_tokens(code, model)
+        if current and (prompt_tokens + cost > token_budget
+                        or output_tokens + output > MAX_BATCH_TOKENS
+                        or len(current) >= max_batch_size):
+            batches.append(current)
+            current, prompt_tokens, output_tokens = [], 0, 0
+        current.append(index)
+        prompt_tokens += cost
+        output_tokens += output
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def build_batch_messages(sources: list[str]) -> list[dict]:
+    """Build the chat messages for documenting several functions at once."""
+    blocks = '\n\n'.join(
+        FUNCTION_BLOCK_TEMPLATE.format(number=number, code=code)
+        for number, code in enumerate(sources, 1)
+    )
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": BATCH_PROMPT_TEMPLATE.format(
+            count=len(sources), functions=blocks)}
+    ]
+
+
+def parse_markers(text: str) -> dict[int, str]:
+    """
+    Extract every well-formed marker block from a batched response.
+
+    Args:
+        text: The raw completion text.
+
+    Returns:
+        Cleaned function code keyed by its 1-based number. The first block
+        wins if a number repeats.
+    """
+    found = {}
+    for match in _MARKER_PATTERN.finditer(text):
+        found.setdefault(int(match.group(1)), clean_code_output(match.group(2)))
+    return found
+
+
+def function_name(code: str) -> str | None:
+    """Name of the outermost function `code` defines, or None if it does not parse."""
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError:
+        return None
+    return next((node.name for node in ast.walk(tree) if isinstance(node, _FUNCTION_TYPES)),
+                None)
+
+
+# =============================================================================
+# BATCHED GENERATION
+# =============================================================================
+
+def document_batched(sources: list[str], model: str = "gpt-4-turbo",
+                     token_budget: int = DEFAULT_TOKEN_BUDGET, scheduler=None,
+                     client=None, cache=None) -> tuple[list[str], dict]:
+    """
+    Document functions with as few requests as the token budget allows.
+
+    Args:
+        sources: Function source strings.
+        model: The OpenAI model to use for generation.
+        token_budget: Maximum prompt tokens of source per batch.
+        scheduler: Optional `RateLimitScheduler` admitting every request,
+            fallbacks included.
+        client: OpenAI-compatible client. Defaults to the module client.
+        cache: Optional `DocumentationCache`, shared with
+            `generate_documentation`. Cached functions are not sent, and
+            every new result is stored.
+
+    Raises:
+        token_budget.PromptTooLarge: If a function cannot be trimmed to fit
+            the model's context window.
+
+    Returns:
+        The documented functions in input order, and a report with request
+        counts, cache hits, API-reported and locally counted prompt tokens,
+        the prompt tokens single-function requests would have used for the
+        functions sent, and the saving per function sent.
+
+    Example:
+        >>> documented, report = document_batched([add_src, merge_src, clamp_src])
+        >>> report['requests'], report['saved_prompt_tokens_per_function']
+        (1, 212.7)
+    """
+    client = client or doc_generator.get_client()
+    results = [None] * len(sources)
+    report = {
+        'functions': len(sources),
+        'requests': 0,
+        'fallback_requests': 0,
+        'cache_hits': 0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'estimated_prompt_tokens': 0,
+    }
+
+    pending = []
+    for index, code in enumerate(sources):
+        cached = cache.get(code, model, TEMPERATURE, MAX_TOKENS) if cache is not None else None
+        if cached is None:
+            pending.append(index)
+        else:
+            results[index] = cached
+            report['cache_hits'] += 1
+
+    plans = {index: plan_request(sources[index], model) for index in pending}
+    output_limit = MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS)
+
+    def store(index: int, text: str) -> None:
+        results[index] = text
+        if cache is not None:
+            cache.put(sources[index], model, TEMPERATURE, MAX_TOKENS, text)
+
+    packed = pack_functions([plans[index]['code'] for index in pending], token_budget,
+                            model=model)
+    for batch in ([pending[i] for i in positions] for positions in packed):
+        if len(batch) == 1:
+            index = batch[0]
+            store(index, _document_single(sources[index], plans[index], model, client,
+                                          scheduler, report))
+            continue
+
+        messages = build_batch_messages([plans[i]['code'] for i in batch])
+        max_tokens = min(sum(plans[i]['max_tokens'] for i in batch), output_limit)
+        response = _complete(client, scheduler, model, messages, max_tokens)
+        report['requests'] += 1
+        _add_usage(report, response, messages, model)
+
+        # Functions the response lost or mangled fall back to single requests
+        found = parse_markers(response.choices[0].message.content)
+        for number, index in enumerate(batch, 1):
+            text = found.get(number)
+            expected = function_name(sources[index])
+            if not text or expected is None or function_name(text) != expected:
+                report['fallback_requests'] += 1
+                text = _document_single(sources[index], plans[index], model, client,
+                                        scheduler, report)
+            elif plans[index]['trimmed']:
+                text = restore_body(sources[index], text)
+            store(index, text)
+
+    single_tokens = sum(count_tokens(m['content'], model)
+                        for index in pending for m in build_messages(sources[index]))
+    report['single_request_prompt_tokens'] = single_tokens
+    report['saved_prompt_tokens_per_function'] = round(
+        (single_tokens - report['estimated_prompt_tokens']) / max(1, len(pending)), 1
+    )
+    return results, report
+
+
+def _complete(client, scheduler, model: str, messages: list[dict], max_tokens: int):
+    """Send one completion request, through `scheduler` if there is one."""
+    def request():
+        return client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=max_tokens
+        )
+
+    if scheduler is None:
+        return request()
+    prompt_tokens = sum(count_tokens(m['content'], model) for m in messages)
+    return scheduler.call(request, prompt_tokens + max_tokens)
+
+
+def _document_single(code: str, plan: dict, model: str, client, scheduler,
+                     report: dict) -> str:
+    """Fallback: one request for one function, sized by its `plan`, counted in the report."""
+    messages = build_messages(plan['code'])
+    response = _complete(client, scheduler, model, messages, plan['max_tokens'])
+    report['requests'] += 1
+    _add_usage(report, response, messages, model)
+    text = clean_code_output(response.choices[0].message.content)
+    return restore_body(code, text) if plan['trimmed'] else text
+
+
+def _add_usage(report: dict, response, messages: list[dict], model: str) -> None:
+    """Add the API-reported token usage, or a local count if it is missing."""
+    estimate = sum(count_tokens(m['content'], model) for m in messages)
+    report['estimated_prompt_tokens'] += estimate
+
+    usage = getattr(response, 'usage', None)
+    if usage is not None:
+        report['prompt_tokens'] += usage.prompt_tokens
+        report['completion_tokens'] += usage.completion_tokens
+    else:
+        report['prompt_tokens'] += estimate
+        report['completion_tokens'] += count_tokens(response.choices[0].message.content, model)
+
+
+def document_file_batched(file_path: str, model: str = "gpt-4-turbo",
+                          token_budget: int = DEFAULT_TOKEN_BUDGET, scheduler=None,
+                          client=None, cache=None,
+                          min_score: int | None = None) -> tuple[dict, dict]:
+    """
+    Document all functions in a Python file using batched requests.
+
+    Args:
+        file_path: Path to the Python file to document.
+        model: The OpenAI model to use for generation.
+        token_budget: Maximum prompt tokens of source per batch.
+        scheduler: Optional `RateLimitScheduler` admitting every request.
+        client: OpenAI-compatible client. Defaults to the module client.
+        cache: Optional `DocumentationCache` (see `document_batched`).
+        min_score: Skip functions whose existing documentation passes
+            validation with at least this score. None documents everything.
+
+    Returns:
+        The same mapping as `doc_generator.document_file`, and the batching report.
+    """
+    from triage import triage_file
+
+    queue, skipped = triage_file(file_path, min_score)
+
+    documented, report = document_batched([item['source'] for item in queue], model,
+                                          token_budget, scheduler, client, cache)
+    results = {
+        item['name']: {
+            'original': item['source'],
+            'documented': text,
+            'validation': validate_documentation(text),
+            'model': model,
+            'skipped': False
+        }
+        for item, text in zip(queue, documented)
+    }
+    for item in skipped:
+        results[item['name']] = {
+            'original': item['source'],
+            'documented': item['source'],
+            'validation': item['assessment'],
+            'model': None,
+            'skipped': True
+        }
+    return results, report
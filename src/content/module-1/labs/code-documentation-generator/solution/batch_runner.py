@@ -0,0 +1,266 @@
+"""
+Repository-Scale Batch Documentation
+
+Documents a whole source tree as a streaming pipeline:
+
+    discover .py files -> parse in a process pool -> bounded work queue
+    -> concurrent LLM workers -> JSONL results as each file finishes
+
+`ast.parse` is CPU-bound on large files, so parsing runs in worker processes
+while the event loop keeps the LLM requests in flight. Only files that still
+have functions in flight are held in memory, so a 50k-function monorepo can
+be processed with a flat memory profile.
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from async_engine import AsyncDocumentationEngine, run_engine
+from extractor import discover_files
+from triage import triage_file
+
+# Maximum number of function segments waiting for an LLM worker
+DEFAULT_QUEUE_SIZE = 256
+
+
+# =============================================================================
+# PARSING
+# =============================================================================
+
+def parse_file(path: str, min_score: int | None = None) -> tuple[list, list, str | None]:
+    """
+    Extract and triage a file's functions (runs in a worker process).
+
+    Args:
+        path: Path to the Python file.
+        min_score: Skip functions already documented with at least this
+            score (see `triage.py`).
+
+    Returns:
+        A (functions, skipped, error) tuple. `functions` is a list of
+        (name, source) pairs in priority order, `skipped` a list of
+        (name, local validation result) pairs and `error` describes why the
+        file could not be parsed.
+    """
+    try:
+        queue, skipped = triage_file(path, min_score)
+    except (OSError, UnicodeDecodeError, SyntaxError, ValueError) as e:
+        return [], [], f"{type(e).__name__}: {e}"
+    return ([(item['name'], item['source']) for item in queue],
+            [(item['name'], item['assessment']) for item in skipped], None)
+
+
+# =============================================================================
+# REPORTING
+# =============================================================================
+
+class JsonlReporter:
+    """
+    Write per-file results and progress to a JSONL stream as they finish.
+
+    Every completed file produces a `file` record followed by a `progress`
+    record; a `summary` record is written at the end of the run.
+
+    Args:
+        stream: A text stream opened for writing.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.start = time.perf_counter()
+        self.files_done = 0
+        self.files_failed = 0
+        self.functions_done = 0
+        self.functions_failed = 0
+        self.functions_skipped = 0
+
+    def write(self, record: dict) -> None:
+        self.stream.write(json.dumps(record) + '\n')
+        self.stream.flush()
+
+    def file_done(self, path: str, results: list[dict], error: str | None = None) -> None:
+        """Record one finished file and the updated throughput."""
+        failed = sum(1 for r in results if r['error'])
+        skipped = sum(1 for r in results if r.get('skipped'))
+        self.files_done += 1
+        self.files_failed += bool(error)
+        self.functions_done += len(results) - skipped
+        self.functions_failed += failed
+        self.functions_skipped += skipped
+
+        self.write({
+            'type': 'file',
+            'path': path,
+            'error': error,
+            'functions': [
+                {
+                    'name': r['name'],
+                    'documented': r['documented'],
+                    'score': r['validation']['score'] if r['validation'] else None,
+                    'issues': r['validation']['issues'] if r['validation'] else None,
+                    'model': r.get('model'),
+                    'error': r['error'],
+                    'skipped': r.get('skipped', False)
+                }
+                for r in results
+            ]
+        })
+        self.write({'type': 'progress', **self.counters()})
+
+    def counters(self) -> dict:
+        elapsed = time.perf_counter() - self.start
+        return {
+            'files_done': self.files_done,
+            'files_failed': self.files_failed,
+            'functions_done': self.functions_done,
+            'functions_failed': self.functions_failed,
+            'functions_skipped': self.functions_skipped,
+            'elapsed': round(elapsed, 3),
+            'functions_per_second': round(self.functions_done / elapsed, 2) if elapsed else 0.0
+        }
+
+    def summary(self) -> dict:
+        record = {'type': 'summary', **self.counters()}
+        self.write(record)
+        return record
+
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+class _FileState:
+    """Results collected so far for one file whose functions are in flight."""
+
+    __slots__ = ('path', 'results', 'remaining')
+
+    def __init__(self, path: str, count: int, skipped: list[dict] = ()):
+        self.path = path
+        # Skipped functions are already complete and go after the queued ones
+        self.results = [None] * count + list(skipped)
+        self.remaining = count
+
+
+async def run_batch(targets: list[str], reporter: JsonlReporter,
+                    engine: AsyncDocumentationEngine, workers: int | None = None,
+                    queue_size: int = DEFAULT_QUEUE_SIZE, min_score: int | None = None) -> dict:
+    """
+    Document every Python file under `targets`, streaming results.
+
+    Args:
+        targets: File paths, directory paths or glob patterns.
+        reporter: Receives each file's results as soon as they are complete.
+        engine: Engine used for the LLM stage; its `concurrency` sets the
+            number of LLM workers.
+        workers: Number of parser processes. Defaults to the CPU count.
+        queue_size: Maximum number of function segments waiting for the LLM
+            stage; parsing pauses when the queue is full.
+        min_score: Skip functions already documented with at least this
+            score; they are reported without reaching the LLM stage.
+
+    Returns:
+        The summary record written at the end of the run.
+    """
+    queue = asyncio.Queue(maxsize=queue_size)
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count() or 1
+
+    async def produce(pool: ProcessPoolExecutor) -> None:
+        pending = {}
+        files = discover_files(targets)
+        exhausted = False
+
+        while pending or not exhausted:
+            # Keep a couple of files per worker parsing ahead of the LLM stage
+            while not exhausted and len(pending) < workers * 2:
+                path = next(files, None)
+                if path is None:
+                    exhausted = True
+                    break
+                pending[loop.run_in_executor(pool, parse_file, path, min_score)] = path
+
+            if not pending:
+                break
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+
+            for future in done:
+                path = pending.pop(future)
+                functions, skipped, error = future.result()
+                skipped = [_skipped(name, assessment) for name, assessment in skipped]
+                if error or not functions:
+                    reporter.file_done(path, skipped, error)
+                    continue
+
+                state = _FileState(path, len(functions), skipped)
+                for index, (name, code) in enumerate(functions):
+                    await queue.put((state, index, name, code))
+
+    async def consume() -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+
+            state, index, name, code = item
+            result = await engine.document(code)
+            result['name'] = name
+            del result['original']
+            state.results[index] = result
+            state.remaining -= 1
+            if state.remaining == 0:
+                reporter.file_done(state.path, state.results)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        consumers = [asyncio.create_task(consume()) for _ in range(engine.concurrency)]
+        try:
+            await produce(pool)
+            for _ in consumers:
+                await queue.put(None)
+            await asyncio.gather(*consumers)
+        finally:
+            for task in consumers:
+                task.cancel()
+
+    return reporter.summary()
+
+
+def _skipped(name: str, assessment: dict) -> dict:
+    """Build the result entry for a function that was triaged out."""
+    return {'name': name, 'documented': None, 'validation': assessment, 'error': None,
+            'skipped': True}
+
+
+def document_tree(targets: list[str], output: str | None = None,
+                  workers: int | None = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                  min_score: int | None = None, **engine_options) -> dict:
+    """
+    Synchronous entry point for batch documentation.
+
+    Args:
+        targets: File paths, directory paths or glob patterns.
+        output: JSONL file to write; defaults to standard output.
+        workers: Number of parser processes. Defaults to the CPU count.
+        queue_size: Maximum number of function segments queued for the LLM stage.
+        min_score: Skip functions already documented with at least this score.
+        **engine_options: Passed through to `AsyncDocumentationEngine`.
+
+    Returns:
+        The summary record for the run.
+
+    Example:
+        >>> document_tree(["src/"], output="docs.jsonl", concurrency=32)
+        {'type': 'summary', 'files_done': 412, 'functions_done': 5120, ...}
+    """
+    engine = AsyncDocumentationEngine(**engine_options)
+
+    if output is None:
+        return run_engine(engine, run_batch(targets, JsonlReporter(sys.stdout), engine,
+                                            workers, queue_size, min_score))
+
+    with open(output, 'w') as stream:
+        return run_engine(engine, run_batch(targets, JsonlReporter(stream), engine,
+                                            workers, queue_size, min_score))
@@ -0,0 +1,76 @@
+"""
+Benchmark: sequential vs concurrent file documentation.
+
+Runs `AsyncDocumentationEngine` against the local `AsyncFakeBackend`, which
+waits out a simulated network latency, so the speedup can be measured without
+an API key or network access.
+
+Usage:
+    python bench_async.py
+    python bench_async.py --sizes 10 100 1000 --latency 0.05 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from async_engine import AsyncDocumentationEngine
+from backends import AsyncFakeBackend
+
+
+# =============================================================================
+# BENCHMARK
+# =============================================================================
+
+def write_synthetic_module(path: str, count: int) -> None:
+    """Write a module containing `count` small undocumented functions."""
+    with open(path, 'w') as f:
+        for i in range(count):
+            f.write(f"def func_{i}(a, b):\n    return a + b\n\n\n")
+
+
+def time_run(path: str, concurrency: int, latency: float, latency_sigma: float) -> float:
+    """Document `path` with the given concurrency and return elapsed seconds."""
+    engine = AsyncDocumentationEngine(
+        client=AsyncFakeBackend(latency=latency, latency_sigma=latency_sigma),
+        concurrency=concurrency
+    )
+    start = time.perf_counter()
+    results = asyncio.run(engine.document_file(path))
+    elapsed = time.perf_counter() - start
+
+    failed = [name for name, data in results.items() if data['error']]
+    if failed:
+        raise RuntimeError(f"{len(failed)} functions failed, e.g. {failed[0]}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent documentation")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--latency", type=float, default=0.02,
+                        help="Simulated median seconds per request")
+    parser.add_argument("--latency-sigma", type=float, default=0.3,
+                        help="Log-normal spread of the simulated latency")
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"Simulated latency: {args.latency * 1000:.0f}ms, "
+          f"concurrency: {args.concurrency}\n")
+    print(f"{'functions':>10} {'sequential':>12} {'concurrent':>12} {'speedup':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            path = os.path.join(tmp, f"synthetic_{size}.py")
+            write_synthetic_module(path, size)
+
+            sequential = time_run(path, 1, args.latency, args.latency_sigma)
+            concurrent = time_run(path, args.concurrency, args.latency, args.latency_sigma)
+            print(f"{size:>10} {sequential:>11.2f}s {concurrent:>11.2f}s "
+                  f"{sequential / concurrent:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
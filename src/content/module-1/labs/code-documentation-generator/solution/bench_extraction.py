@@ -0,0 +1,175 @@
+"""
+Benchmark: function extraction from very large generated files.
+
+Compares three ways of pulling every function's source out of a file:
+
+    segment   ast.parse + ast.walk + ast.get_source_segment per function
+              (the original document_file; quadratic, so only run on the
+              smallest size unless --segment-max-mb is raised)
+    full      read + ast.parse + one line split, slicing each function
+    lazy      extractor.iter_file_functions, parsing one top-level statement
+              at a time from a memory-mapped file (--no-mmap reads it instead)
+
+Each run happens in a fresh process and reports wall time, functions found
+and the peak resident memory added by the extraction.
+
+Usage:
+    python bench_extraction.py
+    python bench_extraction.py --sizes-mb 1 10 --no-mmap
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+# One synthetic "unit": a class with methods and a nested helper, an async
+# def, a decorated function and a module-level data literal
+UNIT_TEMPLATE = '''
+class Model{i}:
+    """Generated model."""
+
+    def __init__(self, values):
+        self.values = list(values)
+
+    def total(self, scale=1):
+        def weight(value):
+            return value * scale
+        return sum(weight(v) for v in self.values)
+
+    async def refresh(self, client):
+        data = await client.fetch({i})
+        self.values = [item["value"] for item in data]
+        return self
+
+
+async def load_{i}(client, ids):
+    return [await client.get(i) for i in ids]
+
+
+@register("handler_{i}")
+def handle_{i}(event, context=None):
+    if event.get("kind") == "error":
+        raise ValueError("bad event {i}")
+    return {{"id": {i}, "ok": True}}
+
+
+TABLE_{i} = {{
+    "name": "table_{i}",
+    "rows": [{i}, {i} + 1, {i} + 2],
+}}
+'''
+
+FUNCTIONS_PER_UNIT = 6
+
+
+def write_synthetic_file(path: str, megabytes: float) -> int:
+    """Write roughly `megabytes` of generated code and return the unit count."""
+    target = int(megabytes * 1024 * 1024)
+    units = 0
+    with open(path, 'w') as f:
+        while f.tell() < target:
+            f.write(UNIT_TEMPLATE.format(i=units))
+            units += 1
+    return units
+
+
+# =============================================================================
+# EXTRACTORS (run in a child process)
+# =============================================================================
+
+def extract_segment(path: str) -> int:
+    import ast
+    with open(path) as f:
+        source = f.read()
+    tree = ast.parse(source)
+    count = 0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            ast.get_source_segment(source, node)
+            count += 1
+    return count
+
+
+def extract_full(path: str) -> int:
+    import ast
+    import re
+    with open(path) as f:
+        source = f.read()
+    tree = ast.parse(source)
+    lines = re.findall(r'[^\r\n]*(?:\r\n|\r|\n)|[^\r\n]+$', source)
+    count = 0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            first, last = node.lineno - 1, node.end_lineno - 1
+            ''.join(lines[first:last + 1])
+            count += 1
+    return count
+
+
+def extract_lazy(path: str, use_mmap: bool = True) -> int:
+    from extractor import iter_file_functions
+    return sum(1 for _ in iter_file_functions(path, use_mmap=use_mmap))
+
+
+def measure(method: str, path: str) -> dict:
+    """Run one extractor and report time and peak RSS growth (child process)."""
+    import resource
+
+    import extractor  # noqa: F401  (import cost is not part of the measurement)
+
+    def peak_mb():
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    run = {
+        'segment': extract_segment,
+        'full': extract_full,
+        'lazy': extract_lazy,
+        'lazy-read': lambda p: extract_lazy(p, use_mmap=False),
+    }[method]
+
+    baseline = peak_mb()
+    start = time.perf_counter()
+    functions = run(path)
+    elapsed = time.perf_counter() - start
+    return {'functions': functions, 'elapsed': elapsed, 'memory_mb': peak_mb() - baseline}
+
+
+def measure_isolated(method: str, path: str) -> dict:
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(measure, (method, path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark function extraction")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[0.1, 5, 20])
+    parser.add_argument("--segment-max-mb", type=float, default=0.1,
+                        help="Largest file to run the quadratic get_source_segment baseline on")
+    parser.add_argument("--no-mmap", action="store_true",
+                        help="Also run the lazy extractor reading the file instead of mapping it")
+    args = parser.parse_args()
+
+    methods = ["full", "lazy"] + (["lazy-read"] if args.no_mmap else [])
+    print(f"{'size':>7} {'method':<10} {'functions':>10} {'time':>9} {'fn/s':>10} {'peak +MB':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes_mb:
+            path = os.path.join(tmp, f"generated_{size:g}mb.py")
+            units = write_synthetic_file(path, size)
+            expected = units * FUNCTIONS_PER_UNIT
+
+            for method in (["segment"] if size <= args.segment_max_mb else []) + methods:
+                r = measure_isolated(method, path)
+                if r['functions'] != expected:
+                    raise SystemExit(f"{method}: found {r['functions']} functions, "
+                                     f"expected {expected}")
+                print(f"{size:>5g}MB {method:<10} {r['functions']:>10} {r['elapsed']:>8.2f}s "
+                      f"{r['functions'] / r['elapsed']:>10.0f} {r['memory_mb']:>9.1f}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Benchmark: connection pooling against a local stub server under concurrent load.
+
+Sends chat completion requests through the real OpenAI SDK to
+`FakeOpenAIServer` (no rate limit, short fixed latency) in several
+configurations:
+
+    per-request   a new client, and so a new connection, for every request
+    sdk-default   one `OpenAI()` client with the SDK's transport settings
+    pooled-sync   one shared `ClientPool` client used from a thread pool
+    pooled-async  `AsyncOpenAI` clients from the same pool, one event loop
+    small-pool    pooled-async with fewer connections than concurrent requests
+
+For each it reports throughput, request latency quantiles, connections the
+server accepted, connections the client opened, the share of requests that
+reused a connection, peak requests in flight and the p95 time requests
+waited before being sent (for a free connection, and in a single process
+also for the interpreter lock).
+
+Client and server share one interpreter here, so absolute throughput is
+bounded by Python overhead; the connection counts are the point.
+
+Usage:
+    python bench_http_pool.py
+    python bench_http_pool.py --requests 4000 --concurrency 128 --latency 0.005
+"""
+
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_server import FakeOpenAIServer
+from http_pool import ClientPool
+from metrics import METRICS
+
+# Configurations not measured through one shared ClientPool
+SHARED = ("per-request", "sdk-default")
+
+MESSAGES = [{'role': 'user', 'content': "def add(a, b):\n    return a + b"}]
+
+
+def quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def timed(call) -> float:
+    start = time.perf_counter()
+    call()
+    return time.perf_counter() - start
+
+
+def run_threads(requests: int, concurrency: int, make_call) -> list[float]:
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(lambda _: timed(make_call()), range(requests)))
+
+
+async def run_async(requests: int, concurrency: int, client) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await client.chat.completions.create(model="gpt-4-turbo", messages=MESSAGES)
+            latencies.append(time.perf_counter() - start)
+
+    try:
+        await asyncio.gather(*(one() for _ in range(requests)))
+    finally:
+        await client.close()
+    return latencies
+
+
+def run(name: str, args, server: FakeOpenAIServer) -> dict:
+    client_options = {'base_url': server.base_url, 'api_key': "test", 'max_retries': 0}
+    max_connections = args.concurrency // 4 if name == "small-pool" else args.concurrency
+    pool = ClientPool(max_connections=max_connections, max_keepalive=max_connections,
+                      http2=False)
+    METRICS.reset()
+    server.stats['connections'] = 0
+
+    start = time.perf_counter()
+    if name == "per-request":
+        def make_call():
+            def call():
+                # A fresh pool per request: nothing is kept alive in between
+                with ClientPool(max_connections=1, http2=False) as fresh:
+                    fresh.client(**client_options).chat.completions.create(
+                        model="gpt-4-turbo", messages=MESSAGES)
+            return call
+        latencies = run_threads(args.requests, args.concurrency, make_call)
+    elif name == "sdk-default":
+        from openai import OpenAI
+        client = OpenAI(**client_options)
+        latencies = run_threads(args.requests, args.concurrency, lambda: lambda: (
+            client.chat.completions.create(model="gpt-4-turbo", messages=MESSAGES)))
+        client.close()
+    elif name == "pooled-sync":
+        client = pool.client(**client_options)
+        latencies = run_threads(args.requests, args.concurrency, lambda: lambda: (
+            client.chat.completions.create(model="gpt-4-turbo", messages=MESSAGES)))
+    else:
+        latencies = asyncio.run(run_async(args.requests, args.concurrency,
+                                          pool.async_client(**client_options)))
+    elapsed = time.perf_counter() - start
+    pool.close()
+
+    stats = pool.stats()
+    waits = {entry['stage']: entry for entry in METRICS.to_dict()['stages']}
+    opened = sum(entry['value'] for entry in METRICS.to_dict()['counters']
+                 if entry['name'] == 'http_connections_opened')
+    return {
+        'throughput': args.requests / elapsed,
+        'p50': quantile(latencies, 0.5),
+        'p95': quantile(latencies, 0.95),
+        'server_connections': server.stats['connections'],
+        # Per-request pools are thrown away, so count from the metrics;
+        # the SDK's own transport is not instrumented
+        'client_opened': opened if name != "sdk-default" else '-',
+        'reuse_ratio': 1 - server.stats['connections'] / args.requests,
+        'peak_in_flight': stats['peak_in_flight'] if name not in SHARED else '-',
+        'pool_wait_p95': waits.get('pool_wait', {}).get('p95', 0.0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTTP connection pooling")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.01,
+                        help="Seconds the stub server takes per request")
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, "
+          f"server latency {args.latency * 1000:.0f}ms\n")
+    print(f"{'config':<13} {'req/s':>7} {'p50':>8} {'p95':>8} {'srv conns':>9} "
+          f"{'opened':>7} {'reuse':>6} {'peak':>5} {'wait p95':>9}")
+
+    with FakeOpenAIServer(rpm=10_000_000, latency=args.latency) as server:
+        for name in ("per-request", "sdk-default", "pooled-sync", "pooled-async",
+                     "small-pool"):
+            r = run(name, args, server)
+            print(f"{name:<13} {r['throughput']:>7.0f} {r['p50'] * 1000:>6.1f}ms "
+                  f"{r['p95'] * 1000:>6.1f}ms {r['server_connections']:>9} "
+                  f"{r['client_opened']:>7} {r['reuse_ratio']:>6.1%} {r['peak_in_flight']:>5} "
+                  f"{r['pool_wait_p95'] * 1000:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
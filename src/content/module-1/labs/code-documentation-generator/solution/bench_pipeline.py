@@ -0,0 +1,219 @@
+"""
+Benchmark: end-to-end documentation pipeline on the fake backend.
+
+Runs `document_file` (or the async engine with `--engine async`) over the
+lab's sample functions and over synthetic modules of 1k/10k/100k functions,
+with every request answered by the local `FakeBackend`. No API key or
+network is needed, so the numbers are stable enough to gate regressions in
+CI. Each target runs in a fresh process and reports:
+
+    fn/s       functions documented per second, end to end
+    peak MB    peak resident memory of the run
+    stages     time per pipeline stage from METRICS (parse, network, ...)
+
+With `--engine async`, requests overlap, so their summed network time says
+nothing about wall time; the network column (`net/req`) then shows the
+mean time per request instead.
+
+Targets smaller than a second of work are documented repeatedly.
+
+By default the fake backend answers instantly, which measures the
+pipeline's own overhead. Pass `--latency`/`--tokens-per-second` to
+simulate a real provider (use `--engine async` for large sizes then).
+
+Usage:
+    python bench_pipeline.py
+    python bench_pipeline.py --sizes 1000 10000 --json results.json
+    python bench_pipeline.py --baseline results.json --tolerance 0.2
+    python bench_pipeline.py --engine async --latency 0.2 --tokens-per-second 80
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "..", "starter_code", "sample_functions.py")
+
+# Minimum timed duration per target
+MIN_SECONDS = 1.0
+
+STAGES = ("parse", "segment", "network", "clean", "validate")
+
+# Rotated through by the synthetic modules so the validator and the fake
+# backend see a mix of shapes rather than one repeated function
+SYNTHETIC_TEMPLATES = (
+    "def add_{i}(a, b):\n    return a + b\n",
+    "def scale_{i}(values, factor=2.0):\n    return [v * factor for v in values]\n",
+    "def checked_{i}(value, limit=10):\n"
+    "    if value > limit:\n"
+    "        raise ValueError('value too large')\n"
+    "    return value\n",
+    "def lookup_{i}(table, key, default=None):\n"
+    "    for name, item in table.items():\n"
+    "        if name == key:\n"
+    "            return item\n"
+    "    return default\n",
+)
+
+
+def write_synthetic_module(path: str, count: int) -> None:
+    """Write a module containing `count` small undocumented functions."""
+    with open(path, 'w') as f:
+        for i in range(count):
+            f.write(SYNTHETIC_TEMPLATES[i % len(SYNTHETIC_TEMPLATES)].format(i=i))
+            f.write("\n\n")
+
+
+# =============================================================================
+# SINGLE RUN (in a child process)
+# =============================================================================
+
+def run_target(path: str, backend: str, engine: str, concurrency: int) -> dict:
+    """Document one file on the given backend and report throughput and memory."""
+    import resource
+
+    import doc_generator
+    from async_engine import document_file_concurrent
+    from metrics import METRICS
+
+    doc_generator.set_backend(backend)
+    METRICS.reset()
+
+    # Small files are documented repeatedly so their rate is not just noise
+    functions = failed = 0
+    start = time.perf_counter()
+    while True:
+        if engine == "async":
+            results = document_file_concurrent(path, concurrency=concurrency)
+        else:
+            results = doc_generator.document_file(path)
+        functions += len(results)
+        failed += sum(1 for data in results.values() if data.get('error'))
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_SECONDS:
+            break
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+    stages = {entry['stage']: entry for entry in METRICS.to_dict()['stages']}
+    return {
+        'functions': len(results),
+        'failed': failed,
+        'elapsed': elapsed,
+        'functions_per_second': functions / elapsed,
+        'peak_mb': peak_mb,
+        'stages': {name: stages[name]['total'] for name in STAGES if name in stages},
+        'network_per_request': (stages['network']['total'] / stages['network']['count']
+                                if 'network' in stages else 0.0),
+    }
+
+
+def run_isolated(path: str, backend: str, engine: str, concurrency: int) -> dict:
+    """Run `run_target` in a fresh interpreter so peak memory is per target."""
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(run_target, (path, backend, engine, concurrency))
+
+
+# =============================================================================
+# REGRESSION GATE
+# =============================================================================
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    List regressions against a baseline produced with `--json`.
+
+    A target regresses when its throughput drops, or its peak memory grows,
+    by more than `tolerance` (a fraction of the baseline value).
+    """
+    problems = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        floor = previous['functions_per_second'] * (1 - tolerance)
+        if current['functions_per_second'] < floor:
+            problems.append(f"{name}: {current['functions_per_second']:.0f} fn/s, "
+                            f"baseline {previous['functions_per_second']:.0f}")
+        ceiling = previous['peak_mb'] * (1 + tolerance)
+        if current['peak_mb'] > ceiling:
+            problems.append(f"{name}: peak {current['peak_mb']:.0f} MB, "
+                            f"baseline {previous['peak_mb']:.0f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the documentation pipeline offline")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 100000],
+                        help="Synthetic module sizes in functions")
+    parser.add_argument("--no-sample", action="store_true",
+                        help="Skip the lab's sample_functions.py")
+    parser.add_argument("--engine", choices=["sync", "async"], default="sync",
+                        help="document_file (sync) or AsyncDocumentationEngine (async)")
+    parser.add_argument("--concurrency", type=int, default=64,
+                        help="Concurrent requests for --engine async")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Fake backend: median seconds to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.0,
+                        help="Fake backend: log-normal shape of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0,
+                        help="Fake backend: median generation speed (0 = instant)")
+    parser.add_argument("--rate-sigma", type=float, default=0.0,
+                        help="Fake backend: log-normal shape of the token rate")
+    parser.add_argument("--json", metavar="PATH", help="Write results here")
+    parser.add_argument("--baseline", metavar="PATH",
+                        help="Fail if results regress against this --json output")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed regression against the baseline (fraction)")
+    args = parser.parse_args()
+
+    backend = (f"fake:latency={args.latency},latency_sigma={args.latency_sigma},"
+               f"tokens_per_second={args.tokens_per_second},rate_sigma={args.rate_sigma}")
+    print(f"Backend: {backend}, engine: {args.engine}\n")
+    # Concurrent requests overlap: show the mean per request, not their sum
+    overlapping = args.engine == "async"
+    labels = ["net/req" if overlapping and stage == "network" else stage for stage in STAGES]
+    print(f"{'target':<10} {'functions':>9} {'fn/s':>9} {'peak MB':>8}  "
+          + ' '.join(f"{label:>9}" for label in labels))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        targets = [] if args.no_sample else [("sample", SAMPLE_PATH)]
+        for size in args.sizes:
+            path = os.path.join(tmp, f"synthetic_{size}.py")
+            write_synthetic_module(path, size)
+            targets.append((f"{size // 1000}k" if size % 1000 == 0 else str(size), path))
+
+        for name, path in targets:
+            r = run_isolated(path, backend, args.engine, args.concurrency)
+            if r['failed']:
+                raise SystemExit(f"{name}: {r['failed']} functions failed")
+            results[name] = r
+            columns = [f"{r['network_per_request'] * 1000:>7.1f}ms"
+                       if overlapping and stage == "network"
+                       else f"{r['stages'].get(stage, 0.0):>8.2f}s" for stage in STAGES]
+            print(f"{name:<10} {r['functions']:>9} {r['functions_per_second']:>9.0f} "
+                  f"{r['peak_mb']:>8.1f}  " + ' '.join(columns))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        if problems:
+            print("\nRegressions:\n  " + "\n  ".join(problems))
+            raise SystemExit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Benchmark: single-model vs routed vs routed + hedged documentation.
+
+Documents a synthetic module of mostly simple and some complex functions
+with the async engine against the fake backend, configured so the cheap
+model is faster but occasionally slips on complex functions, and latencies
+have a long log-normal tail. For each configuration it reports throughput,
+per-function latency quantiles (including escalations and hedges), the
+token cost from `router.PRICES` and how often routing escalated or hedged.
+
+Usage:
+    python bench_routing.py
+    python bench_routing.py --functions 1200 --concurrency 32 --latency-sigma 1.0
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from async_engine import AsyncDocumentationEngine
+from backends import AsyncFakeBackend
+from extractor import iter_source_functions
+from metrics import METRICS
+from router import DEFAULT_TIERS, ModelRouter, estimate_cost
+
+SIMPLE_TEMPLATE = '''def get_{i}(record, key="{i}"):
+    return record.get(key)
+'''
+
+COMPLEX_TEMPLATE = '''def reconcile_{i}(ledger, payments, tolerance=0.01):
+    matched, unmatched = [], []
+    for payment in payments:
+        entry = ledger.get(payment["id"])
+        if entry is None:
+            unmatched.append(payment)
+        elif abs(entry["amount"] - payment["amount"]) <= tolerance:
+            matched.append((entry, payment))
+        elif payment.get("partial") and entry["amount"] > payment["amount"]:
+            entry["amount"] -= payment["amount"]
+        else:
+            try:
+                entry["disputes"].append(payment)
+            except KeyError:
+                entry["disputes"] = [payment]
+    if unmatched and not matched:
+        raise ValueError("No payments could be matched")
+    return matched, unmatched
+'''
+
+
+def synthetic_sources(count: int, complex_share: float, seed: int = 0) -> list[str]:
+    """Generate `count` functions, `complex_share` of them complex."""
+    draws = random.Random(seed)
+    module = ''.join((COMPLEX_TEMPLATE if draws.random() < complex_share else SIMPLE_TEMPLATE)
+                     .format(i=i) + '\n\n' for i in range(count))
+    return [code for _, code in iter_source_functions(module)]
+
+
+def make_backend(args) -> AsyncFakeBackend:
+    cheap, premium = DEFAULT_TIERS
+    return AsyncFakeBackend(**{
+        'latency_sigma': args.latency_sigma,
+        'rate_sigma': 0.3,
+        f'{cheap}.latency': args.latency / 3,
+        f'{cheap}.tokens_per_second': 600,
+        f'{cheap}.quality': args.cheap_quality,
+        f'{premium}.latency': args.latency,
+        f'{premium}.tokens_per_second': 150,
+    })
+
+
+async def run(sources: list[str], engine: AsyncDocumentationEngine) -> tuple[float, list[float]]:
+    """Document every source; return wall time and per-function latencies."""
+    semaphore = asyncio.Semaphore(engine.concurrency)
+    latencies = []
+
+    async def one(code: str) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            result = await engine.document(code)
+            latencies.append(time.perf_counter() - start)
+        if result['error']:
+            raise RuntimeError(result['error'])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(code) for code in sources))
+    return time.perf_counter() - start, latencies
+
+
+def quantile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model routing and hedging")
+    parser.add_argument("--functions", type=int, default=400)
+    parser.add_argument("--complex-share", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--latency", type=float, default=0.5,
+                        help="Median time to first token of the premium model")
+    parser.add_argument("--latency-sigma", type=float, default=1.2,
+                        help="Log-normal shape of latencies (tail heaviness)")
+    parser.add_argument("--cheap-quality", type=float, default=0.97,
+                        help="Cheap model's chance of handling each decision point")
+    args = parser.parse_args()
+
+    sources = synthetic_sources(args.functions, args.complex_share)
+    configurations = [
+        ("premium", {'model': DEFAULT_TIERS[-1]}),
+        ("routed", {'router': ModelRouter()}),
+        ("routed+hedge", {'router': ModelRouter(), 'hedge': True}),
+    ]
+
+    print(f"{len(sources)} functions, concurrency {args.concurrency}\n")
+    print(f"{'config':<13} {'fn/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'cost $':>9} "
+          f"{'escalated':>9} {'hedged':>7}")
+    for name, options in configurations:
+        METRICS.reset()
+        engine = AsyncDocumentationEngine(client=make_backend(args),
+                                          concurrency=args.concurrency, timeout=None, **options)
+        elapsed, latencies = asyncio.run(run(sources, engine))
+
+        counters = {}
+        for entry in METRICS.to_dict()['counters']:
+            counters[entry['name']] = counters.get(entry['name'], 0) + entry['value']
+        cost = sum(estimate_cost().values())
+        print(f"{name:<13} {len(sources) / elapsed:>7.1f} "
+              f"{quantile(latencies, 0.5):>7.2f}s {quantile(latencies, 0.95):>7.2f}s "
+              f"{quantile(latencies, 0.99):>7.2f}s {cost:>9.4f} "
+              f"{counters.get('escalations', 0):>9} {counters.get('hedged_requests', 0):>7}")
+
+
+if __name__ == "__main__":
+    main()
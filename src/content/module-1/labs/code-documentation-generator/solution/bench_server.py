@@ -0,0 +1,121 @@
+"""
+Benchmark: per-process CLI calls vs the persistent documentation server.
+
+Documents a small file (a fresh function name each call, so no cache hits)
+with the fake backend at a fixed model latency, the way an editor
+integration or hook would:
+
+    cli           python doc_generator.py FILE, a new process per call
+    thin client   python doc_client.py document FILE, a new process per call
+    in-process    DocumentationClient.document_file on a kept connection
+
+and validates a file with `doc_generator.py --check` vs `doc_client.py
+validate`. Reports the mean wall time per call and the overhead on top of
+the simulated model latency. Finally sends identical requests concurrently
+and counts how many reached the model.
+
+Usage:
+    python bench_server.py
+    python bench_server.py --calls 20 --latency 0.5
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from doc_client import DocumentationClient, ensure_server
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TEMPLATE = '''def scale_{i}(values, factor=2):
+    return [value * factor for value in values]
+'''
+
+
+def timed_runs(calls: int, run) -> float:
+    """Mean seconds per call of `run(i)`."""
+    start = time.perf_counter()
+    for i in range(calls):
+        run(i)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the documentation server")
+    parser.add_argument("--calls", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="Simulated model latency per request")
+    parser.add_argument("--concurrent", type=int, default=20,
+                        help="Identical requests sent at once to test coalescing")
+    args = parser.parse_args()
+
+    backend = f"fake:latency={args.latency}"
+    workdir = tempfile.mkdtemp(prefix="docgen-bench-")
+    address = os.path.join(workdir, "server.sock")
+    environment = {**os.environ, 'DOCGEN_BACKEND': backend, 'DOCGEN_SERVER': address}
+
+    def source(i: int) -> str:
+        path = os.path.join(workdir, f"module_{i}.py")
+        with open(path, 'w') as f:
+            f.write(TEMPLATE.format(i=i))
+        return path
+
+    def run(*argv: str) -> None:
+        subprocess.run([sys.executable, *argv], cwd=HERE, env=environment, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    started = time.perf_counter()
+    client = ensure_server(address, ["--backend", backend, "--root", workdir])
+    print(f"server started in {time.perf_counter() - started:.2f}s; "
+          f"{args.calls} calls each, model latency {args.latency * 1000:.0f}ms\n")
+
+    rows = [
+        ("document: cli", True, lambda i: run("doc_generator.py", source(i))),
+        ("document: thin client", True,
+         lambda i: run("doc_client.py", "document", source(args.calls + i))),
+        ("document: in-process", True,
+         lambda i: client.document_file(source(2 * args.calls + i))),
+        ("validate: cli --check", False,
+         lambda i: subprocess.run([sys.executable, "doc_generator.py", "--check", source(i)],
+                                  cwd=HERE, env=environment, stdout=subprocess.DEVNULL)),
+        ("validate: thin client", False,
+         lambda i: subprocess.run([sys.executable, "doc_client.py", "validate", source(i)],
+                                  cwd=HERE, env=environment, stdout=subprocess.DEVNULL)),
+    ]
+    print(f"{'mode':<24} {'per call':>9} {'overhead':>9}")
+    try:
+        for name, uses_model, call in rows:
+            per_call = timed_runs(args.calls, call)
+            overhead = per_call - (args.latency if uses_model else 0.0)
+            print(f"{name:<24} {per_call * 1000:>7.0f}ms {overhead * 1000:>7.0f}ms")
+
+        code = TEMPLATE.format(i="shared")
+        before = _model_calls(client)
+
+        def request() -> None:
+            with DocumentationClient(address) as own:
+                own.generate_documentation(code)
+
+        threads = [threading.Thread(target=request) for _ in range(args.concurrent)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"\n{args.concurrent} identical concurrent requests -> "
+              f"{_model_calls(client) - before} model call(s)")
+    finally:
+        client.shutdown()
+        client.close()
+
+
+def _model_calls(client: DocumentationClient) -> int:
+    stages = client.stats()['metrics']['stages']
+    return sum(entry['count'] for entry in stages if entry['stage'] == 'network')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark: CLI startup time against a budget.
+
+Runs the command line entry points that should start fast, each several
+times in a fresh interpreter under `python -X importtime`, and reports:
+
+- wall time (median), and the same minus a bare `python -c pass`, which is
+  the part this code is responsible for;
+- total import time and the slowest top-level imports;
+- whether any module that must stay lazy (the OpenAI SDK, its HTTP stack,
+  python-dotenv) was imported.
+
+`--help` and the validate-only `--check` path, which pre-commit hooks run
+on every commit, must stay within `--budget-ms` of the bare interpreter and
+must not import the SDK; the script exits 1 otherwise, so it can gate CI.
+Importing the SDK itself is measured for reference.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --runs 10 --budget-ms 60
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Must not be imported by the fast paths
+LAZY_MODULES = ('openai', 'httpx', 'httpx2', 'httpcore', 'httpcore2', 'dotenv', 'tiktoken')
+
+SCENARIOS = [
+    ("python -c pass", ["-c", "pass"], False),
+    ("import openai+dotenv", ["-c", "import openai, dotenv"], False),
+    ("import doc_generator", ["-c", "import doc_generator"], True),
+    ("--help", ["doc_generator.py", "--help"], True),
+    ("--check", ["doc_generator.py", "--check", "triage.py", "extractor.py"], True),
+]
+
+
+def run_once(args: list[str]) -> tuple[float, list[tuple[str, int, int]]]:
+    """
+    Run the interpreter once with -X importtime.
+
+    Returns:
+        Wall seconds and (module, self µs, cumulative µs) for top-level imports.
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=HERE,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    elapsed = time.perf_counter() - start
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        # Nesting is shown by indentation; keep top-level entries only
+        if not name.startswith("  "):
+            imports.append((name.strip(), int(own), int(cumulative)))
+    return elapsed, imports
+
+
+def measure(args: list[str], runs: int) -> dict:
+    walls, imports = [], []
+    for _ in range(runs):
+        wall, imports = run_once(args)
+        walls.append(wall)
+    return {
+        'wall': statistics.median(walls),
+        'import_total': sum(cumulative for _, _, cumulative in imports) / 1e6,
+        'slowest': sorted(imports, key=lambda entry: entry[2], reverse=True)[:3],
+        'modules': {name.split('.')[0] for name, _, _ in imports},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup time")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=75.0,
+                        help="Allowed wall time over a bare interpreter for fast paths")
+    args = parser.parse_args()
+
+    results = {name: measure(argv, args.runs) for name, argv, _ in SCENARIOS}
+    baseline = results["python -c pass"]['wall']
+
+    print(f"median of {args.runs} runs, budget {args.budget_ms:.0f}ms over a bare interpreter\n")
+    print(f"{'scenario':<22} {'wall':>8} {'over':>8} {'imports':>8}  slowest imports")
+    failed = False
+    for name, _, budgeted in SCENARIOS:
+        r = results[name]
+        over = (r['wall'] - baseline) * 1000
+        lazy = sorted(r['modules'] & set(LAZY_MODULES))
+        status = ""
+        if budgeted and (over > args.budget_ms or lazy):
+            failed = True
+            status = "  OVER BUDGET" if over > args.budget_ms else ""
+            status += f"  imports {', '.join(lazy)}" if lazy else ""
+        slowest = ', '.join(f"{module} {cumulative / 1000:.0f}ms"
+                            for module, _, cumulative in r['slowest'])
+        print(f"{name:<22} {r['wall'] * 1000:>6.0f}ms {over:>6.0f}ms "
+              f"{r['import_total'] * 1000:>6.0f}ms  {slowest}{status}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark: AST validator vs the original substring validator.
+
+Validates a mix of well documented, partially documented and multi-line
+method snippets with both implementations, reports snippets/s, and lists
+the snippets where the two disagree. The original accepts a signature as
+annotated when any one parameter is, and counts `->` anywhere in the text
+as a return annotation.
+
+Usage:
+    python bench_validation.py
+    python bench_validation.py --count 200000 --workers 4
+"""
+
+import argparse
+import re
+import time
+
+from doc_generator import validate_documentation, validate_documentation_batch
+
+SNIPPETS = [
+    # Fully documented
+    '''def add(a: int, b: int) -> int:
+    """Add two numbers together.
+
+    Args:
+        a: First number.
+        b: Second number.
+
+    Returns:
+        Sum of a and b.
+
+    Example:
+        >>> add(1, 2)
+        3
+    """
+    return a + b''',
+    # No documentation at all
+    "def add(a, b): return a + b",
+    # Multi-line method signature with full annotations
+    '''def merge(
+        self,
+        d1: dict,
+        d2: dict,
+        overwrite: bool = True,
+    ) -> dict:
+        """Merge two dictionaries.
+
+        Args:
+            d1: Base dictionary.
+            d2: Dictionary whose values take priority.
+            overwrite: Whether d2 replaces existing keys.
+
+        Returns:
+            The merged dictionary.
+        """
+        result = d1.copy()
+        result.update(d2)
+        return result''',
+    # Docstring present, annotations missing
+    '''def retry_operation(func, max_attempts=3, delay=1):
+    """Retry a callable.
+
+    Args:
+        func: Callable to retry.
+        max_attempts: Attempts before giving up.
+        delay: Seconds between attempts.
+
+    Returns:
+        The callable's result.
+    """
+    return func()''',
+    # Only the first parameter annotated; "->" appears only in the example
+    '''def scale(values: list, factor, offset=0):
+    """Scale values.
+
+    Args:
+        values: Numbers to scale.
+        factor: Multiplier.
+        offset: Added after scaling.
+
+    Returns:
+        The scaled values.
+
+    Example:
+        >>> scale([1, 2], 2)  # -> [2, 4]
+        [2, 4]
+    """
+    if factor == 0:
+        raise ValueError("factor must be non-zero")
+    return [v * factor + offset for v in values]''',
+]
+
+
+def legacy_validate_documentation(documented_code: str) -> dict:
+    """The original implementation, kept here as the benchmark baseline."""
+    issues = []
+    score = 100
+
+    if '"""' not in documented_code and "'''" not in documented_code:
+        issues.append("No docstring found")
+        score -= 30
+    if 'Args:' not in documented_code:
+        issues.append("Missing Args section in docstring")
+        score -= 15
+    if 'Returns:' not in documented_code:
+        issues.append("Missing Returns section in docstring")
+        score -= 15
+    if '->' not in documented_code:
+        issues.append("Missing return type hint")
+        score -= 10
+    type_hint_pattern = r'def \w+\([^)]*\w+:\s*\w+'
+    if not re.search(type_hint_pattern, documented_code):
+        issues.append("Missing parameter type hints")
+        score -= 10
+    if 'Example' not in documented_code:
+        issues.append("Consider adding Example section")
+        score -= 5
+
+    return {
+        'valid': len([i for i in issues if 'Consider' not in i]) == 0,
+        'issues': issues,
+        'score': max(0, score)
+    }
+
+
+def rate(func, snippets: list[str]) -> float:
+    start = time.perf_counter()
+    func(snippets)
+    return len(snippets) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark documentation validators")
+    parser.add_argument("--count", type=int, default=50000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    snippets = (SNIPPETS * (args.count // len(SNIPPETS) + 1))[:args.count]
+
+    print("Disagreements between implementations:")
+    for code in SNIPPETS:
+        old, new = legacy_validate_documentation(code), validate_documentation(code)
+        if old['valid'] != new['valid'] or old['score'] != new['score']:
+            print(f"  {code.splitlines()[0]!r}: legacy {old['score']} -> ast {new['score']}")
+
+    print(f"\nValidating {args.count} snippets")
+    legacy = rate(lambda s: [legacy_validate_documentation(c) for c in s], snippets)
+    single = rate(validate_documentation_batch, snippets)
+    parallel = rate(lambda s: validate_documentation_batch(s, workers=args.workers), snippets)
+
+    print(f"  {'legacy substring scan':<28} {legacy:>12,.0f} snippets/s")
+    print(f"  {'ast validator':<28} {single:>12,.0f} snippets/s")
+    print(f"  {f'ast validator ({args.workers} workers)':<28} {parallel:>12,.0f} snippets/s")
+
+
+if __name__ == "__main__":
+    main()
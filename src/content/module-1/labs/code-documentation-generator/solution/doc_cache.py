@@ -0,0 +1,301 @@
+"""
+Documentation Response Cache
+
+Persistent, content-addressed cache for `generate_documentation` results.
+CI re-runs the generator over the same repositories on every build, and most
+functions have not changed since the last run. Caching the cleaned model
+output by a hash of everything that influences it lets unchanged functions
+skip the API call entirely.
+
+Entries live in a single SQLite file, so the cache survives between runs and
+can be shared by concurrent workers on the same machine.
+"""
+
+import hashlib
+import os
+import sqlite3
+import textwrap
+import threading
+import time
+
+from doc_generator import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE
+from metrics import METRICS
+
+DEFAULT_CACHE_PATH = ".doc_cache.sqlite3"
+
+# Default upper bound on the total size of cached documentation
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Bump when the key derivation itself changes
+CACHE_FORMAT_VERSION = "1"
+
+
+# =============================================================================
+# KEYS
+# =============================================================================
+
+def normalize_source(code: str) -> str:
+    """
+    Normalize function source so formatting-only changes share a cache entry.
+
+    Line endings are unified, trailing whitespace is dropped and the block is
+    dedented, so the same function copied from a class body or a different
+    editor produces the same key.
+
+    Args:
+        code: The Python function source code.
+
+    Returns:
+        The normalized source.
+    """
+    lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return textwrap.dedent('\n'.join(line.rstrip() for line in lines)).strip()
+
+
+def prompt_fingerprint() -> str:
+    """
+    Hash the prompt templates currently in use.
+
+    Returns:
+        A hex digest that changes whenever `SYSTEM_PROMPT` or
+        `USER_PROMPT_TEMPLATE` is edited.
+    """
+    payload = '\0'.join([CACHE_FORMAT_VERSION, SYSTEM_PROMPT, USER_PROMPT_TEMPLATE])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cache_key(code: str, model: str, temperature: float, max_tokens: int,
+              fingerprint: str | None = None) -> str:
+    """
+    Compute the content address for one documentation request.
+
+    Args:
+        code: The Python function source code.
+        model: The model used for generation.
+        temperature: The sampling temperature.
+        max_tokens: The completion token limit.
+        fingerprint: Prompt fingerprint; computed from the templates if omitted.
+
+    Returns:
+        A SHA-256 hex digest identifying the request.
+    """
+    fingerprint = fingerprint or prompt_fingerprint()
+    payload = '\0'.join([
+        fingerprint,
+        model,
+        repr(float(temperature)),
+        str(int(max_tokens)),
+        normalize_source(code),
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# =============================================================================
+# CACHE
+# =============================================================================
+
+class DocumentationCache:
+    """
+    Size-bounded LRU cache of generated documentation, stored on disk.
+
+    Every entry records the prompt fingerprint it was generated with. When the
+    cache is opened with different prompt templates, entries from the old
+    templates are purged so stale documentation is never served.
+
+    Args:
+        path: SQLite file holding the cache. Defaults to ".doc_cache.sqlite3".
+        max_bytes: Upper bound on the total size of cached documentation;
+            least recently used entries are evicted beyond it. The total is
+            summed once when the cache is opened and kept up to date by this
+            instance, so entries another process adds only count from the
+            next time the cache is opened.
+
+    Example:
+        >>> cache = DocumentationCache(".doc_cache.sqlite3")
+        >>> documented = generate_documentation(code, cache=cache)
+        >>> cache.stats()
+        {'hits': 0, 'misses': 1, 'evictions': 0, 'entries': 1, 'bytes': 812}
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be positive")
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.fingerprint = prompt_fingerprint()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                documented TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)"
+        )
+        self.invalidate_stale()
+
+    def key(self, code: str, model: str, temperature: float, max_tokens: int) -> str:
+        """Compute the cache key for a request under the current prompts."""
+        return cache_key(code, model, temperature, max_tokens, self.fingerprint)
+
+    def get(self, code: str, model: str, temperature: float,
+            max_tokens: int) -> str | None:
+        """
+        Look up cached documentation and mark it as recently used.
+
+        Args:
+            code: The Python function source code.
+            model: The model used for generation.
+            temperature: The sampling temperature.
+            max_tokens: The completion token limit.
+
+        Returns:
+            The cached documentation, or None on a miss.
+        """
+        key = self.key(code, model, temperature, max_tokens)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT documented FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                METRICS.count("cache_misses")
+                return None
+
+            self.hits += 1
+            METRICS.count("cache_hits")
+            self._conn.execute(
+                "UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            return row[0]
+
+    def put(self, code: str, model: str, temperature: float, max_tokens: int,
+            documented: str) -> None:
+        """
+        Store generated documentation, evicting old entries if over budget.
+
+        Args:
+            code: The Python function source code.
+            model: The model used for generation.
+            temperature: The sampling temperature.
+            max_tokens: The completion token limit.
+            documented: The cleaned documentation to cache.
+        """
+        key = self.key(code, model, temperature, max_tokens)
+        size = len(documented.encode())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = self._conn.execute(
+                    "SELECT size FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (key, self.fingerprint, documented, size, time.time())
+                )
+                total = self._evict(self._bytes + size - (replaced[0] if replaced else 0))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._bytes = total
+
+    def _evict(self, total: int) -> int:
+        """
+        Drop least recently used entries until the cache fits its budget.
+
+        Args:
+            total: Size of all entries, including the one just stored.
+
+        Returns:
+            The size of the entries left.
+        """
+        if total <= self.max_bytes:
+            return total
+
+        cursor = self._conn.execute("SELECT key, size FROM entries ORDER BY last_used")
+        doomed = []
+        for key, size in cursor:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+        return total
+
+    def invalidate_stale(self) -> int:
+        """
+        Remove entries generated with different prompt templates.
+
+        Called automatically when the cache is opened, so editing
+        `SYSTEM_PROMPT` or `USER_PROMPT_TEMPLATE` never serves old output.
+
+        Returns:
+            The number of entries removed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM entries WHERE fingerprint != ?", (self.fingerprint,)
+            )
+            # The one full scan: `put` keeps the total up to date from here on
+            self._bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+            return cursor.rowcount
+
+    def clear(self) -> None:
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self.hits = self.misses = self.evictions = 0
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """
+        Report cache effectiveness and size.
+
+        Returns:
+            A dictionary with hits, misses, evictions, entries and bytes.
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': self._bytes
+        }
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,338 @@
+"""
+Documentation Server Client
+
+Thin client for `doc_server.py`. It only imports the standard library, so an
+editor integration or pre-commit hook that calls it pays for interpreter
+startup and one round trip on a local socket; the SDK, the warm clients and
+the caches all live in the server process.
+
+The protocol is one JSON object per line in each direction:
+
+    -> {"method": "validate_documentation", "params": {"code": "def f(): ..."}}
+    <- {"result": {"valid": false, "score": 45, "issues": [...]}}
+    <- {"error": {"type": "ValueError", "message": "Code cannot be empty"}}
+
+A server started with `--token-file` also expects a "token" member holding
+the file's contents in every request; the client reads it from
+`$DOCGEN_TOKEN_FILE` or its `token_file` argument.
+
+Example:
+    >>> client = ensure_server()
+    >>> client.document_file("service.py", min_score=90)
+    {'Client.request': {'documented': '...', 'validation': {...}, ...}, ...}
+
+    python doc_client.py document service.py --spawn
+    python doc_client.py validate snippet.py
+"""
+
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Environment variable holding the server address (socket path or host:port)
+ADDRESS_ENV = "DOCGEN_SERVER"
+
+# Environment variable naming the file holding the shared server token
+TOKEN_ENV = "DOCGEN_TOKEN_FILE"
+
+# Largest single message either side accepts
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+def default_address() -> str:
+    """The server address from $DOCGEN_SERVER, else a per-user Unix socket."""
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.getenv(ADDRESS_ENV) or os.path.join(tempfile.gettempdir(), f"docgen-{uid}.sock")
+
+
+def parse_address(address: str) -> tuple[str, str | tuple[str, int]]:
+    """
+    Split an address into a socket family name and a connect target.
+
+    Args:
+        address: A Unix socket path, or "host:port" for TCP on localhost.
+
+    Returns:
+        ("unix", path) or ("tcp", (host, port)).
+    """
+    host, sep, port = address.rpartition(':')
+    if sep and port.isdigit() and os.sep not in address:
+        return 'tcp', (host or "127.0.0.1", int(port))
+    return 'unix', address
+
+
+def read_token(path: str) -> str:
+    """
+    Read a shared server token, refusing files other users can read.
+
+    Args:
+        path: File whose stripped contents are the token, e.g. created with
+            `umask 077; python -c "import secrets; print(secrets.token_hex())" > token`.
+
+    Returns:
+        The token.
+
+    Raises:
+        PermissionError: If the file is readable or writable by group or others.
+        ValueError: If the file is empty.
+    """
+    with open(path, encoding='utf-8') as f:
+        if os.name == 'posix' and os.fstat(f.fileno()).st_mode & 0o077:
+            raise PermissionError(f"Token file {path} must not be accessible to other users "
+                                  "(chmod 600)")
+        token = f.read().strip()
+    if not token:
+        raise ValueError(f"Token file {path} is empty")
+    return token
+
+
+class ServerError(RuntimeError):
+    """An error raised inside the server while handling a request."""
+
+    def __init__(self, type_name: str, message: str):
+        super().__init__(f"{type_name}: {message}")
+        self.type_name = type_name
+
+
+class DocumentationClient:
+    """
+    Connection to a running documentation server.
+
+    The connection is opened on the first call and reused; if the server
+    closed it in between, the call is retried once on a new connection.
+
+    Args:
+        address: Socket path or "host:port". Defaults to `default_address()`.
+        timeout: Seconds to wait for a response, or None to wait forever.
+        token_file: File holding the server's shared token. Defaults to
+            $DOCGEN_TOKEN_FILE; without either, requests carry no token.
+    """
+
+    def __init__(self, address: str | None = None, timeout: float | None = 600.0,
+                 token_file: str | None = None):
+        self.address = address or default_address()
+        self.timeout = timeout
+        self.token_file = token_file or os.getenv(TOKEN_ENV)
+        self._token = read_token(self.token_file) if self.token_file else None
+        self._sock = None
+        self._reader = None
+
+    def connect(self) -> None:
+        family, target = parse_address(self.address)
+        if family == 'tcp':
+            sock = socket.create_connection(target, timeout=self.timeout)
+        else:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(target)
+            except OSError:
+                sock.close()
+                raise
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._reader.close()
+            self._sock.close()
+            self._sock = self._reader = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def call(self, method: str, **params):
+        """
+        Send one request and wait for its response.
+
+        Args:
+            method: Server method name.
+            **params: Method parameters.
+
+        Returns:
+            The method's result.
+
+        Raises:
+            ServerError: If the method raised in the server.
+            ConnectionError: If the server cannot be reached.
+        """
+        request = {'method': method, 'params': params}
+        if self._token is not None:
+            request['token'] = self._token
+        message = (json.dumps(request) + '\n').encode()
+        while True:
+            reused = self._sock is not None
+            if not reused:
+                self.connect()
+            try:
+                self._sock.sendall(message)
+                line = self._reader.readline(MAX_MESSAGE_BYTES)
+            except (BrokenPipeError, ConnectionResetError):
+                line = b''
+            if line:
+                break
+            self.close()
+            # A kept connection may have been closed by a server restart
+            if not reused:
+                raise ConnectionError(f"Documentation server at {self.address} closed the "
+                                      "connection")
+
+        response = json.loads(line)
+        if 'error' in response:
+            raise ServerError(response['error']['type'], response['error']['message'])
+        return response['result']
+
+    def ping(self) -> dict:
+        return self.call('ping')
+
+    def generate_documentation(self, code: str, model: str | None = None) -> str:
+        return self.call('generate_documentation', code=code, model=model)
+
+    def validate_documentation(self, code: str) -> dict:
+        return self.call('validate_documentation', code=code)
+
+    def document(self, code: str) -> dict:
+        return self.call('document', code=code)
+
+    def document_file(self, path: str, min_score: int | None = None) -> dict:
+        # The server may run in another directory
+        return self.call('document_file', path=os.path.abspath(path), min_score=min_score)
+
+    def stats(self) -> dict:
+        return self.call('stats')
+
+    def shutdown(self) -> None:
+        self.call('shutdown')
+
+
+def ensure_server(address: str | None = None, server_args: list[str] | None = None,
+                  timeout: float = 30.0, token_file: str | None = None) -> DocumentationClient:
+    """
+    Connect to the server, starting one in the background if none is running.
+
+    Args:
+        address: Socket path or "host:port". Defaults to `default_address()`.
+        server_args: Extra `doc_server.py` arguments for a newly started server,
+            e.g. ["--backend", "fake", "--cache", ".doc_cache.sqlite3"].
+        timeout: Seconds to wait for a new server to accept connections.
+        token_file: Shared token file, passed to the client and to a newly
+            started server. Defaults to $DOCGEN_TOKEN_FILE.
+
+    Returns:
+        A connected client.
+
+    Raises:
+        TimeoutError: If a started server does not come up in time.
+    """
+    client = DocumentationClient(address, token_file=token_file)
+    try:
+        client.ping()
+        return client
+    except OSError:
+        client.close()
+
+    family, target = parse_address(client.address)
+    location = ["--socket", target] if family == 'unix' else ["--host", target[0],
+                                                              "--port", str(target[1])]
+    if client.token_file:
+        location += ["--token-file", client.token_file]
+    server = os.path.join(os.path.dirname(os.path.abspath(__file__)), "doc_server.py")
+    subprocess.Popen([sys.executable, server, *location, *(server_args or [])],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     start_new_session=True)
+
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            client.ping()
+            return client
+        except OSError:
+            client.close()
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Documentation server at {client.address} did not start")
+            time.sleep(0.05)
+
+
+# =============================================================================
+# CLI INTERFACE
+# =============================================================================
+
+def main():
+    """Call a documentation server from the command line."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Call a running documentation server")
+    parser.add_argument("method", choices=["document", "generate", "validate", "stats",
+                                           "ping", "shutdown"])
+    parser.add_argument("file", nargs="?",
+                        help="document: Python file; generate/validate: function source "
+                             "file, or - for standard input")
+    parser.add_argument("--address", help=f"Socket path or host:port (default ${ADDRESS_ENV}, "
+                                          "then a per-user socket)")
+    parser.add_argument("--token-file", metavar="PATH",
+                        help=f"Shared server token (default ${TOKEN_ENV})")
+    parser.add_argument("--spawn", action="store_true",
+                        help="Start a server in the background if none is running")
+    parser.add_argument("--min-score", type=int, metavar="SCORE",
+                        help="document: skip functions already documented with this score")
+    parser.add_argument("--json", action="store_true", help="Print the raw result as JSON")
+    args = parser.parse_args()
+
+    if args.method in ("document", "generate", "validate") and not args.file:
+        parser.error(f"{args.method} needs a file")
+
+    client = (ensure_server(args.address, token_file=args.token_file) if args.spawn
+              else DocumentationClient(args.address, token_file=args.token_file))
+    try:
+        if args.method == "document":
+            result = client.document_file(args.file, args.min_score)
+        elif args.method in ("generate", "validate"):
+            if args.file == "-":
+                code = sys.stdin.read()
+            else:
+                with open(args.file, encoding='utf-8') as f:
+                    code = f.read()
+            result = (client.generate_documentation(code) if args.method == "generate"
+                      else client.validate_documentation(code))
+        else:
+            result = getattr(client, args.method)()
+    except ServerError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except OSError as e:
+        print(f"Error: cannot reach the documentation server at {client.address} ({e}); "
+              "start it with doc_server.py or pass --spawn", file=sys.stderr)
+        sys.exit(2)
+    finally:
+        client.close()
+
+    if args.json or args.method in ("stats", "ping"):
+        print(json.dumps(result, indent=2))
+    elif args.method == "generate":
+        print(result)
+    elif args.method == "validate":
+        print(f"Score: {result['score']}/100")
+        for issue in result['issues']:
+            print(f"  - {issue}")
+        sys.exit(0 if result['valid'] else 1)
+    elif args.method == "document":
+        for name, data in result.items():
+            print(f"\n{'='*60}\nFUNCTION: {name}\n{'='*60}")
+            if data['error']:
+                print(f"ERROR: {data['error']}")
+            elif data['skipped']:
+                print(f"Already documented (score {data['validation']['score']}/100)")
+            else:
+                print(data['documented'])
+                print(f"\nScore: {data['validation']['score']}/100")
+
+
+if __name__ == "__main__":
+    main()
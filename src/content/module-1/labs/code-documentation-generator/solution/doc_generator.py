@@ -5,16 +5,24 @@ This module demonstrates an effective approach to AI-powered documentation gener
 using prompt engineering best practices.
 """
 
+import ast
+import glob
 import os
 import re
-import inspect
-from openai import OpenAI
-from dotenv import load_dotenv
+import sys
+import time
 
-load_dotenv()
+from metrics import METRICS
 
-# Initialize OpenAI client
-client = OpenAI()
+# Backend spec (see backends.py); None means $DOCGEN_BACKEND, then OpenAI
+backend_spec = None
+
+# Client shared by every blocking call site, created on first use
+client = None
+
+# Generation settings (also part of the response cache key)
+TEMPERATURE = 0.3  # Lower temperature for consistent formatting
+MAX_TOKENS = 2000
 
 # =============================================================================
 # PROMPT TEMPLATE
@@ -57,7 +65,8 @@ Return only the documented function code."""
 # CORE FUNCTIONS
 # =============================================================================
 
-def generate_documentation(code: str, model: str = "gpt-4-turbo") -> str:
+def generate_documentation(code: str, model: str = "gpt-4-turbo", cache=None,
+                           scheduler=None, client=None) -> str:
     """
     Generate comprehensive documentation for a Python function.
     
@@ -67,12 +76,19 @@ def generate_documentation(code: str, model: str = "gpt-4-turbo") -> str:
     Args:
         code: The Python function source code as a string.
         model: The OpenAI model to use for generation. Defaults to "gpt-4-turbo".
+        cache: Optional `DocumentationCache`. Unchanged functions are served
+            from it without an API call.
+        scheduler: Optional `RateLimitScheduler` that admits the request and
+            retries it on rate limit errors.
+        client: OpenAI-compatible client. Defaults to `get_client()`.
         
     Returns:
         The documented version of the function with docstrings and type hints.
         
     Raises:
         ValueError: If the provided code is empty.
+        token_budget.PromptTooLarge: If the function cannot be trimmed to
+            fit the model's context window.
         openai.APIError: If the API call fails.
         
     Example:
@@ -85,24 +101,104 @@ def generate_documentation(code: str, model: str = "gpt-4-turbo") -> str:
     if not code or not code.strip():
         raise ValueError("Code cannot be empty")
     
-    response = client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": USER_PROMPT_TEMPLATE.format(code=code)}
-        ],
-        temperature=0.3,  # Lower temperature for consistent formatting
-        max_tokens=2000
-    )
+    if cache is not None:
+        cached = cache.get(code, model, TEMPERATURE, MAX_TOKENS)
+        if cached is not None:
+            return cached
+    
+    # Size the request; oversized functions are trimmed or rejected here
+    from token_budget import plan_request, restore_body
+    plan = plan_request(code, model)
+    messages = build_messages(plan['code'])
+    client = client or get_client()
+    
+    def request():
+        with METRICS.timer("network", model):
+            return client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=TEMPERATURE,
+                max_tokens=plan['max_tokens']
+            )
+    
+    if scheduler is None:
+        response = request()
+    else:
+        response = scheduler.call(request, plan['prompt_tokens'] + plan['max_tokens'])
+    METRICS.record_usage(response, model)
     
     result = response.choices[0].message.content
     
     # Clean up markdown code blocks if present
-    result = clean_code_output(result)
+    with METRICS.timer("clean"):
+        result = clean_code_output(result)
+        if plan['trimmed']:
+            result = restore_body(code, result)
+    
+    if cache is not None:
+        cache.put(code, model, TEMPERATURE, MAX_TOKENS, result)
     
     return result
 
 
+def get_client():
+    """
+    Return the shared blocking client, creating it from `backend_spec` on first use.
+    
+    Returns:
+        An OpenAI-compatible client (the real API unless another backend
+        was selected with `set_backend` or $DOCGEN_BACKEND).
+    """
+    global client
+    if client is None:
+        from backends import create_backend
+        client = create_backend(backend_spec)
+    return client
+
+
+def set_backend(spec: str | None) -> None:
+    """
+    Select the backend used by every call site that was not given a client.
+    
+    Args:
+        spec: Backend spec such as "openai" or "fake:latency=0.05".
+    """
+    global backend_spec, client
+    backend_spec, client = spec, None
+
+
+def build_messages(code: str) -> list[dict]:
+    """
+    Build the chat messages for documenting a single function.
+    
+    Shared by the sync and async generators so every request uses the
+    exact same prompt.
+    
+    Args:
+        code: The Python function source code as a string.
+        
+    Returns:
+        The system and user messages for the chat completions API.
+    """
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": USER_PROMPT_TEMPLATE.format(code=code)}
+    ]
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the token count of a text without a tokenizer.
+    
+    Args:
+        text: Prompt or completion text.
+        
+    Returns:
+        About one token per four characters, which holds for code and English.
+    """
+    return len(text) // 4 + 1
+
+
 def clean_code_output(code: str) -> str:
     """
     Remove markdown code block formatting from LLM output.
@@ -119,12 +215,39 @@ def clean_code_output(code: str) -> str:
     return code
 
 
+# Docstring section headers, matched once per docstring
+_SECTION_PATTERN = re.compile(
+    r'^[ \t]*(Args|Arguments|Returns|Yields|Raises|Examples?)[ \t]*:',
+    re.MULTILINE
+)
+
+_TRIPLE_QUOTE_PATTERN = re.compile(r'"""|\'\'\'')
+
+# Fallback for output that is not valid Python: every marker in one scan
+_TEXT_MARKER_PATTERN = re.compile(r'"""|\'\'\'|Args:|Returns:|->|Example')
+_TEXT_TYPE_HINT_PATTERN = re.compile(r'def \w+\([^)]*\w+:\s*\w+')
+
+# Score deductions per issue
+_PENALTIES = {
+    "No docstring found": 30,
+    "Missing Args section in docstring": 15,
+    "Missing Returns section in docstring": 15,
+    "Missing return type hint": 10,
+    "Missing parameter type hints": 10,
+    "Consider adding Raises section": 5,
+    "Consider adding Example section": 5,
+}
+
+
 def validate_documentation(documented_code: str) -> dict:
     """
     Validate that generated documentation meets quality standards.
     
-    Checks for presence of required docstring sections, type hints,
-    and proper formatting.
+    Parses the code once and checks the first function definition directly:
+    docstring presence, its Args/Returns/Raises/Example sections, the
+    annotation of every parameter and the return annotation. This handles
+    multi-line signatures, methods and async functions correctly. Output that
+    is not valid Python falls back to a single text scan.
     
     Args:
         documented_code: The documented function code to validate.
@@ -135,78 +258,243 @@ def validate_documentation(documented_code: str) -> dict:
             - issues (list): List of issue descriptions
             - score (int): Quality score out of 100
     """
+    start = time.perf_counter()
+    func, has_body = _parse_header(documented_code)
+    if func is None:
+        try:
+            func = _first_function(ast.parse(documented_code))
+            has_body = True
+        except (SyntaxError, ValueError):
+            func = None
+    
+    if func is None:
+        issues = _text_issues(documented_code)
+    else:
+        issues = _function_issues(func, has_body)
+    
+    METRICS.observe("validate", time.perf_counter() - start)
+    return _result(issues)
+
+
+def assess_function(func: ast.AST) -> dict:
+    """
+    Score the existing documentation of an already parsed function.
+    
+    Applies the same checks and penalties as `validate_documentation` to a
+    function node, so source that was parsed once (e.g. by the extractor)
+    can be triaged without reparsing or a model call.
+    
+    Args:
+        func: A `FunctionDef` or `AsyncFunctionDef` node, including its body.
+        
+    Returns:
+        The same dictionary as `validate_documentation`.
+    """
+    return _result(_function_issues(func))
+
+
+def validate_documentation_batch(snippets: list[str], workers: int = 1) -> list[dict]:
+    """
+    Validate many documented snippets.
+    
+    Args:
+        snippets: Documented function code strings.
+        workers: Number of worker processes. Parsing is CPU-bound, so large
+            QA batches benefit from more than one.
+        
+    Returns:
+        One validation result per snippet, in the same order.
+    """
+    if workers <= 1 or len(snippets) < 2:
+        return [validate_documentation(code) for code in snippets]
+    
+    from concurrent.futures import ProcessPoolExecutor
+    
+    chunksize = max(1, len(snippets) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(validate_documentation, snippets, chunksize=chunksize))
+
+
+def _result(issues: list[str]) -> dict:
+    """Turn a list of issues into a validation result."""
+    score = 100 - sum(_PENALTIES[issue.split(':')[0]] for issue in issues)
+    return {
+        'valid': len([i for i in issues if 'Consider' not in i]) == 0,
+        'issues': issues,
+        'score': max(0, score)
+    }
+
+
+def _parse_header(code: str) -> tuple[ast.AST | None, bool]:
+    """
+    Parse only the signature and docstring when that is enough.
+    
+    A function whose body is just its docstring is valid Python, so cutting
+    the code right after the first triple-quoted string and parsing that
+    avoids building the AST for the whole body. The body is only needed when
+    it may contain a raise statement. If the cut does not yield a function
+    with a docstring, the caller parses the full code instead.
+    
+    Returns:
+        The function node (or None) and whether it includes the full body.
+    """
+    match = _TRIPLE_QUOTE_PATTERN.search(code)
+    if match is None:
+        return None, False
+    
+    quote = match.group()
+    end = code.find(quote, match.end())
+    if end == -1:
+        return None, False
+    
+    cut = end + len(quote)
+    if 'raise' in code[cut:]:
+        return None, False
+    
+    try:
+        func = _first_function(ast.parse(code[:cut]))
+    except (SyntaxError, ValueError):
+        return None, False
+    
+    if func is None or ast.get_docstring(func, clean=False) is None:
+        return None, False
+    return func, False
+
+
+def _first_function(tree: ast.Module) -> ast.AST | None:
+    """Return the first function definition, looking inside classes too."""
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return node
+        if isinstance(node, ast.ClassDef):
+            found = _first_function(node)
+            if found is not None:
+                return found
+    return None
+
+
+def _function_issues(func: ast.AST, has_body: bool = True) -> list[str]:
+    """Collect issues for a parsed function definition."""
     issues = []
-    score = 100
+    docstring = ast.get_docstring(func, clean=False)
+    sections = set(_SECTION_PATTERN.findall(docstring or ''))
+    
+    args = func.args
+    params = [*args.posonlyargs, *args.args, *args.kwonlyargs]
+    if params and params[0].arg in ('self', 'cls'):
+        params = params[1:]
+    params += [arg for arg in (args.vararg, args.kwarg) if arg is not None]
     
-    # Check for docstring presence
-    if '"""' not in documented_code and "'''" not in documented_code:
+    if docstring is None:
         issues.append("No docstring found")
-        score -= 30
     
-    # Check for Args section
-    if 'Args:' not in documented_code:
+    if params and not sections & {'Args', 'Arguments'}:
         issues.append("Missing Args section in docstring")
-        score -= 15
     
-    # Check for Returns section
-    if 'Returns:' not in documented_code:
+    returns_none = isinstance(func.returns, ast.Constant) and func.returns.value is None
+    if not returns_none and not sections & {'Returns', 'Yields'}:
         issues.append("Missing Returns section in docstring")
-        score -= 15
     
-    # Check for return type hint
-    if '->' not in documented_code:
+    if func.returns is None:
         issues.append("Missing return type hint")
-        score -= 10
     
-    # Check for parameter type hints (look for : after parameter name)
-    # Match pattern like "def func(param: type"
-    type_hint_pattern = r'def \w+\([^)]*\w+:\s*\w+'
-    if not re.search(type_hint_pattern, documented_code):
-        issues.append("Missing parameter type hints")
-        score -= 10
+    unannotated = [arg.arg for arg in params if arg.annotation is None]
+    if unannotated:
+        issues.append(f"Missing parameter type hints: {', '.join(unannotated)}")
+    
+    if 'Raises' not in sections and has_body and _raises(func):
+        issues.append("Consider adding Raises section")
     
-    # Check for Example section (bonus)
-    if 'Example' not in documented_code:
+    if not sections & {'Example', 'Examples'}:
         issues.append("Consider adding Example section")
-        score -= 5
     
-    return {
-        'valid': len([i for i in issues if 'Consider' not in i]) == 0,
-        'issues': issues,
-        'score': max(0, score)
-    }
+    return issues
+
 
+def _raises(func: ast.AST) -> bool:
+    """Return True if the function body itself contains a raise statement."""
+    stack = list(func.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Raise):
+            return True
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+            stack.extend(ast.iter_child_nodes(node))
+    return False
 
-def document_file(file_path: str) -> dict:
+
+def _text_issues(documented_code: str) -> list[str]:
+    """Collect issues with text heuristics when the code cannot be parsed."""
+    markers = set(_TEXT_MARKER_PATTERN.findall(documented_code))
+    issues = []
+    
+    if not markers & {'"""', "'''"}:
+        issues.append("No docstring found")
+    if 'Args:' not in markers:
+        issues.append("Missing Args section in docstring")
+    if 'Returns:' not in markers:
+        issues.append("Missing Returns section in docstring")
+    if '->' not in markers:
+        issues.append("Missing return type hint")
+    if not _TEXT_TYPE_HINT_PATTERN.search(documented_code):
+        issues.append("Missing parameter type hints")
+    if 'Example' not in markers:
+        issues.append("Consider adding Example section")
+    
+    return issues
+
+
+def document_file(file_path: str, cache=None, min_score: int | None = None,
+                  router=None, scheduler=None, client=None) -> dict:
     """
     Document all functions in a Python file.
     
+    Existing documentation is scored locally first (see `triage.py`), so
+    with `min_score` set, functions that already pass validation never reach
+    the model. The rest are sent public API first, most complex first.
+    
     Args:
         file_path: Path to the Python file to document.
+        cache: Optional `DocumentationCache` passed to `generate_documentation`.
+        min_score: Skip functions whose existing documentation passes
+            validation with at least this score. None documents everything.
+        router: Optional `router.ModelRouter` choosing the model per
+            function, escalating when validation scores too low.
+        scheduler: Optional `RateLimitScheduler` admitting every request.
+        client: OpenAI-compatible client. Defaults to `get_client()`.
         
     Returns:
-        Dictionary mapping function names to their documented versions.
+        Dictionary mapping qualified function names (`Class.method`,
+        `outer.inner`) to their results: documented functions in the order
+        they were sent, then skipped ones, whose `documented` is the
+        original source and whose `validation` is the local score.
     """
-    import ast
+    # Functions are extracted lazily from a memory-mapped file, one
+    # top-level statement at a time, and scored on the AST they were parsed into
+    from triage import triage_file
     
-    with open(file_path, 'r') as f:
-        source = f.read()
+    queue, skipped = triage_file(file_path, min_score)
     
-    tree = ast.parse(source)
     results = {}
-    
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            # Get the source of this function
-            func_source = ast.get_source_segment(source, node)
-            if func_source:
-                documented = generate_documentation(func_source)
-                validation = validate_documentation(documented)
-                results[node.name] = {
-                    'original': func_source,
-                    'documented': documented,
-                    'validation': validation
-                }
+    for item in queue:
+        if router is None:
+            documented = generate_documentation(item['source'], cache=cache,
+                                                scheduler=scheduler, client=client)
+            routed = {'documented': documented, 'validation': validate_documentation(documented),
+                      'model': "gpt-4-turbo"}
+        else:
+            from router import route_documentation
+            routed = route_documentation(item['source'], router, cache=cache,
+                                         scheduler=scheduler, client=client)
+        results[item['name']] = {'original': item['source'], **routed, 'skipped': False}
+    for item in skipped:
+        results[item['name']] = {
+            'original': item['source'],
+            'documented': item['source'],
+            'validation': item['assessment'],
+            'model': None,
+            'skipped': True
+        }
     
     return results
 
@@ -217,10 +505,173 @@ def document_file(file_path: str) -> dict:
 
 def main():
     """Main function to run the documentation generator from command line."""
-    import sys
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Generate documentation for Python functions")
+    parser.add_argument("file", nargs="?",
+                        help="Python file, directory or glob to document (omit for demo mode)")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="Reuse documentation for unchanged functions from this cache file")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="Empty the cache before running")
+    parser.add_argument("--stream", action="store_true",
+                        help="Demo mode: print documentation as it is generated")
+    parser.add_argument("--pack", type=int, metavar="TOKENS",
+                        help="File mode: pack small functions into shared requests "
+                             "of up to TOKENS prompt tokens")
+    parser.add_argument("--backend", metavar="SPEC",
+                        help="LLM backend, e.g. 'openai' or 'fake:latency=0.05' "
+                             "(defaults to $DOCGEN_BACKEND, then openai)")
+    parser.add_argument("--min-score", type=int, metavar="SCORE",
+                        help="File and batch mode: skip functions whose existing documentation "
+                             "already passes validation with at least SCORE (e.g. 90)")
+    parser.add_argument("--apply", action="store_true",
+                        help="File and batch mode: patch the generated docstrings and "
+                             "annotations into the files and print the diff")
+    parser.add_argument("--diff", action="store_true",
+                        help="Like --apply, but only print the diff")
+    parser.add_argument("--route", action="store_true",
+                        help="Send simple functions to a cheaper model and escalate to the "
+                             "premium one when validation scores too low")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Batch and write-back modes: duplicate requests that outlast the "
+                             "model's p95 latency and use the first answer")
+    parser.add_argument("--check", nargs="*", metavar="PATH",
+                        help="Validate existing documentation only, without a model or the "
+                             "OpenAI SDK, and exit 1 if any function fails validation or "
+                             "scores below --min-score (default 90); for pre-commit hooks")
+    parser.add_argument("--estimate", action="store_true",
+                        help="File mode: report the token budget without calling the model")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="Write stage timings and counters here (.prom for Prometheus "
+                             "text format, JSON otherwise)")
+    parser.add_argument("--profile", action="store_true",
+                        help="Run under cProfile and print the hottest functions to stderr")
+    parser.add_argument("--output", metavar="PATH",
+                        help="Batch mode: write JSONL results here instead of stdout")
+    parser.add_argument("--workers", type=int,
+                        help="Batch mode: number of parser processes")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Batch mode: number of concurrent LLM requests")
+    parser.add_argument("--rpm", type=int,
+                        help="Requests per minute allowed by the provider; every request is "
+                             "then paced and retried by a shared scheduler (see scheduler.py)")
+    parser.add_argument("--tpm", type=int,
+                        help="Tokens per minute allowed by the provider (see --rpm)")
+    parser.add_argument("--manifest", metavar="PATH",
+                        help="Incremental mode: only document functions changed since "
+                             "the run recorded in this manifest")
+    parser.add_argument("--changed-by", choices=["hash", "mtime", "git"], default="hash",
+                        help="Incremental mode: how to detect changed files")
+    parser.add_argument("--since",
+                        help="Incremental mode: git revision for --changed-by git "
+                             "(default: the commit of the last git run)")
+    args = parser.parse_args()
+    if args.pack and args.route:
+        parser.error("--pack cannot be combined with --route: a batch is sent to one model")
+    
+    if args.check is not None:
+        sys.exit(check(args.check + ([args.file] if args.file else []), args.min_score))
+    
+    if args.backend:
+        # Exported too: run as a script, this module is __main__ and the
+        # engines import their own doc_generator
+        os.environ["DOCGEN_BACKEND"] = args.backend
+        set_backend(args.backend)
+    
+    if args.profile:
+        from metrics import profile_call
+        profile_call(run, args)
+    else:
+        run(args)
+    
+    if args.metrics:
+        METRICS.write(args.metrics)
+    if args.metrics or args.profile:
+        print(f"\n{METRICS.summary()}", file=sys.stderr)
+
+
+def check(targets: list[str], min_score: int | None = None) -> int:
+    """
+    Report functions whose existing documentation fails validation.
+    
+    Only the local triage scoring runs, so this path never builds a client
+    or imports the model SDK, which keeps it fast enough for a pre-commit
+    hook run on every commit.
+    
+    Args:
+        targets: Files, directories or glob patterns to check.
+        min_score: Lowest passing score. Defaults to `triage.DEFAULT_MIN_SCORE`.
+        
+    Returns:
+        The process exit status: 1 if any function failed, 0 otherwise.
+    """
+    from triage import DEFAULT_MIN_SCORE, check_files
+    
+    failures = check_files(targets, DEFAULT_MIN_SCORE if min_score is None else min_score)
+    for failure in failures:
+        name = f"{failure['name']}: score {failure['score']}/100: " if failure['name'] else ""
+        print(f"{failure['path']}: {name}{'; '.join(failure['issues'])}")
+    return 1 if failures else 0
+
+
+def run(args) -> None:
+    """Run the mode selected by the parsed command line arguments."""
+    cache = None
+    if args.cache:
+        from doc_cache import DocumentationCache
+        cache = DocumentationCache(args.cache)
+        if args.clear_cache:
+            cache.clear()
     
-    if len(sys.argv) < 2:
+    # One scheduler paces every request of the run; the clients built for it
+    # (here and by the engines) leave retries to it
+    from scheduler import create_scheduler
+    scheduler = create_scheduler(args.rpm, args.tpm)
+    client = None
+    if scheduler is not None:
+        from backends import create_backend
+        client = create_backend(backend_spec, max_retries=0)
+    
+    engine_options = {'router': None, 'hedge': args.hedge, 'scheduler': scheduler}
+    if args.route:
+        from router import ModelRouter
+        engine_options['router'] = ModelRouter()
+    
+    if args.file is not None and args.manifest:
+        # Incremental mode: only changed functions reach the model
+        from manifest import update_manifest
+        stats = update_manifest([args.file], args.manifest, changed_by=args.changed_by,
+                                since=args.since, concurrency=args.concurrency, cache=cache,
+                                **engine_options)
+        print(f"Documented {stats['functions_documented']} changed functions, "
+              f"reused {stats['functions_reused']}, skipped {stats['files_skipped']} "
+              f"unchanged files ({stats['functions_failed']} failed, "
+              f"{stats['files_failed']} files could not be read)")
+        for path, error in stats['errors'].items():
+            print(f"  {path}: {error}", file=sys.stderr)
+    elif args.file is not None and (args.apply or args.diff):
+        # Write-back mode: patch docstrings and annotations into the files
+        from writeback import apply_documentation
+        totals = apply_documentation([args.file], min_score=args.min_score,
+                                     write=not args.diff, concurrency=args.concurrency,
+                                     cache=cache, **engine_options)
+        print(f"{'Would patch' if args.diff else 'Patched'} {totals['edited']} functions in "
+              f"{totals['files_changed']} of {totals['files']} files "
+              f"({totals['skipped']} skipped, {totals['failed']} failed)", file=sys.stderr)
+    elif args.file is not None and (os.path.isdir(args.file) or glob.has_magic(args.file)):
+        # Batch mode: stream results for a whole tree as JSONL
+        from batch_runner import document_tree
+        summary = document_tree([args.file], output=args.output, workers=args.workers,
+                                min_score=args.min_score, concurrency=args.concurrency,
+                                cache=cache, **engine_options)
+        print(f"Documented {summary['functions_done']} functions in "
+              f"{summary['files_done']} files ({summary['functions_per_second']}/s), "
+              f"skipped {summary['functions_skipped']} already documented",
+              file=sys.stderr)
+    elif args.file is None:
         # Demo mode: document sample functions
+        import inspect
         from sample_functions import (
             calc_price, merge_dicts, retry_operation
         )
@@ -237,25 +688,74 @@ def main():
             print(f"\n{'='*60}")
             print(f"DOCUMENTED: {func.__name__}")
             print('='*60)
-            documented = generate_documentation(code)
-            print(documented)
+            if args.stream:
+                from streaming import MalformedOutputError, stream_documentation
+                chunks = []
+                try:
+                    for chunk in stream_documentation(code, cache=cache, scheduler=scheduler,
+                                                      client=client):
+                        print(chunk, end="", flush=True)
+                        chunks.append(chunk)
+                except MalformedOutputError as e:
+                    print(f"\nCancelled: {e}\n")
+                    continue
+                documented = ''.join(chunks)
+                print()
+            else:
+                documented = generate_documentation(code, cache=cache, scheduler=scheduler,
+                                                    client=client)
+                print(documented)
             
             validation = validate_documentation(documented)
             print(f"\nValidation Score: {validation['score']}/100")
             if validation['issues']:
                 print(f"Issues: {', '.join(validation['issues'])}")
             print()
+    elif args.estimate:
+        # Estimate mode: budget a file without calling the model
+        from extractor import iter_file_functions
+        from token_budget import estimate_budget
+        sources = [code for _, code in iter_file_functions(args.file)]
+        totals = estimate_budget(sources)
+        print(f"{totals['functions']} functions: {totals['prompt_tokens']} prompt tokens, "
+              f"up to {totals['max_completion_tokens']} completion tokens "
+              f"({totals['trimmed']} trimmed, {totals['rejected']} too large)")
     else:
         # File mode: document a file
-        file_path = sys.argv[1]
-        results = document_file(file_path)
+        report = None
+        if args.pack:
+            from batch_prompting import document_file_batched
+            results, report = document_file_batched(args.file, token_budget=args.pack,
+                                                    scheduler=scheduler, client=client,
+                                                    cache=cache, min_score=args.min_score)
+        else:
+            results = document_file(args.file, cache=cache, min_score=args.min_score,
+                                    router=engine_options['router'], scheduler=scheduler,
+                                    client=client)
         
+        skipped = [name for name, data in results.items() if data.get('skipped')]
         for func_name, data in results.items():
+            if data.get('skipped'):
+                continue
             print(f"\n{'='*60}")
             print(f"FUNCTION: {func_name}")
             print('='*60)
             print(data['documented'])
             print(f"\nScore: {data['validation']['score']}/100")
+        
+        if skipped:
+            print(f"\nSkipped {len(skipped)} of {len(results)} functions already documented "
+                  f"with a score of at least {args.min_score}")
+        if report is not None:
+            print(f"\nBatching: {report['requests']} requests for {report['functions']} functions "
+                  f"({report['fallback_requests']} fallbacks), ~"
+                  f"{report['saved_prompt_tokens_per_function']} prompt tokens saved per function")
+    
+    if cache is not None:
+        stats = cache.stats()
+        print(f"\nCache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries")
+        cache.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,350 @@
+"""
+Documentation Server
+
+A long-running local process that keeps everything expensive warm between
+calls: the imported SDK, the pooled HTTP client, the response cache and the
+prompt fingerprint. Editor integrations and pre-commit hooks talk to it
+through the stdlib-only `doc_client.py` instead of starting
+`doc_generator.py` each time, so a call costs one round trip on a local
+socket plus the model's own latency.
+
+Methods (see `doc_client.py` for the line-delimited JSON protocol):
+
+    generate_documentation  code, model -> documented code
+    validate_documentation  code -> validation result
+    document                code -> result with documentation and validation
+    document_file           path, min_score -> results per function
+    ping, stats, shutdown
+
+Identical requests that arrive while one is in flight share it: a function
+requested by two editors at once, or appearing twice in a file, costs one
+model call, and the same file documented twice concurrently is processed
+once. Completed answers are served from the cache (in memory unless
+`--cache` names a file).
+
+The server listens on a per-user Unix socket by default (created mode 0600),
+or on localhost TCP with `--port`. Listening on any other interface needs
+`--token-file`: every request must then carry the file's contents (see
+`doc_client.read_token`). `document_file` only reads files under the
+`--root` directories (default: the directory the server was started in).
+SIGINT and SIGTERM shut it down cleanly:
+it stops accepting connections, lets requests in progress finish, closes
+the HTTP client and the cache, and removes its socket.
+
+Usage:
+    python doc_server.py --cache .doc_cache.sqlite3
+    python doc_server.py --port 8765 --backend fake:latency=0.2
+    python doc_server.py --host 0.0.0.0 --port 8765 --token-file ~/.docgen-token
+"""
+
+import argparse
+import asyncio
+import hmac
+import ipaddress
+import json
+import os
+import signal
+import sys
+import time
+
+import doc_generator
+from async_engine import DEFAULT_CONCURRENCY, AsyncDocumentationEngine
+from doc_client import MAX_MESSAGE_BYTES, default_address, read_token
+from doc_generator import validate_documentation
+from metrics import METRICS
+
+# Seconds requests in progress get to finish when the server is stopped
+SHUTDOWN_GRACE = 30.0
+
+
+def coalesce(table: dict, key, factory) -> asyncio.Future:
+    """
+    Return the in-flight future for `key`, starting `factory()` if there is none.
+
+    Args:
+        table: In-flight futures by key; entries remove themselves when done.
+        key: Identifies equivalent requests.
+        factory: Zero-argument function returning the coroutine to run.
+
+    Returns:
+        A future shared by every caller with the same key. Await it through
+        `asyncio.shield` so one caller's cancellation does not cancel the rest.
+    """
+    future = table.get(key)
+    if future is not None:
+        METRICS.count("requests_coalesced")
+        return future
+
+    def done(finished: asyncio.Future) -> None:
+        table.pop(key, None)
+        # Mark the exception as retrieved even if every waiter went away
+        if not finished.cancelled():
+            finished.exception()
+
+    future = table[key] = asyncio.ensure_future(factory())
+    future.add_done_callback(done)
+    return future
+
+
+class CoalescingEngine(AsyncDocumentationEngine):
+    """`AsyncDocumentationEngine` that shares in-flight identical model requests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_flight = {}
+
+    async def generate_documentation(self, code: str, model: str | None = None) -> str:
+        model = model or self.model
+        parent = super()
+        future = coalesce(self._in_flight, (model, code),
+                          lambda: parent.generate_documentation(code, model))
+        return await asyncio.shield(future)
+
+
+# =============================================================================
+# SERVER
+# =============================================================================
+
+class DocumentationServer:
+    """
+    Serve documentation requests over a local socket.
+
+    Args:
+        engine: Engine answering model requests; it should be a
+            `CoalescingEngine` created inside the server's event loop.
+        address: Unix socket path or "host:port". Defaults to
+            `doc_client.default_address()`.
+        roots: Directories `document_file` may read from. Defaults to the
+            current directory.
+        token: Shared secret every request must carry, or None to accept
+            any client that can reach the socket.
+    """
+
+    def __init__(self, engine: AsyncDocumentationEngine, address: str | None = None,
+                 roots: list[str] | None = None, token: str | None = None):
+        self.engine = engine
+        self.address = address or default_address()
+        self.roots = [os.path.realpath(root) for root in roots or [os.getcwd()]]
+        self.token = token
+        self.started = time.time()
+        self.requests = 0
+        self._files = {}
+        self._stopped = None
+        self._server = None
+        # Connection handler tasks, and the writers of those waiting for a request
+        self._handlers = set()
+        self._idle = set()
+
+    # -------------------------------------------------------------------------
+    # Methods
+    # -------------------------------------------------------------------------
+
+    async def generate_documentation(self, code: str, model: str | None = None) -> str:
+        return await self.engine.generate_documentation(code, model)
+
+    async def validate_documentation(self, code: str) -> dict:
+        return validate_documentation(code)
+
+    async def document(self, code: str) -> dict:
+        return await self.engine.document(code)
+
+    async def document_file(self, path: str, min_score: int | None = None) -> dict:
+        real = os.path.realpath(path)
+        if not any(os.path.commonpath([root, real]) == root for root in self.roots):
+            raise PermissionError(f"{path} is outside the server's roots")
+        # Keyed by content identity, so an edited file is never served stale
+        stat = os.stat(real)
+        key = (real, stat.st_mtime_ns, stat.st_size, min_score)
+        future = coalesce(self._files, key,
+                          lambda: self.engine.document_file(real, min_score))
+        return await asyncio.shield(future)
+
+    async def ping(self) -> dict:
+        return {'pid': os.getpid(), 'uptime': time.time() - self.started,
+                'requests': self.requests}
+
+    async def stats(self) -> dict:
+        stats = {'server': await self.ping(), 'metrics': METRICS.to_dict()}
+        if self.engine.cache is not None:
+            stats['cache'] = self.engine.cache.stats()
+        if 'http_pool' in sys.modules:
+            stats['http_pools'] = sys.modules['http_pool'].pool_stats()
+        return stats
+
+    async def shutdown(self) -> None:
+        self._stopped.set()
+
+    METHODS = ('generate_documentation', 'validate_documentation', 'document',
+               'document_file', 'ping', 'stats', 'shutdown')
+
+    # -------------------------------------------------------------------------
+    # Connections
+    # -------------------------------------------------------------------------
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answer requests on one connection, in order, until the client hangs up."""
+        self._handlers.add(asyncio.current_task())
+        try:
+            while not self._stopped.is_set():
+                self._idle.add(writer)
+                line = await reader.readline()
+                self._idle.discard(writer)
+                if not line:
+                    break
+                response = await self.respond(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._idle.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def respond(self, line: bytes) -> dict:
+        self.requests += 1
+        try:
+            request = json.loads(line)
+            if self.token is not None and not hmac.compare_digest(
+                    str(request.get('token', '')).encode(), self.token.encode()):
+                raise PermissionError("Missing or wrong token")
+            method = request.get('method')
+            if method not in self.METHODS:
+                raise ValueError(f"Unknown method {method!r}")
+            with METRICS.timer("server", method):
+                result = await getattr(self, method)(**request.get('params') or {})
+            return {'result': result}
+        except Exception as e:
+            return {'error': {'type': type(e).__name__, 'message': str(e)}}
+
+    async def serve(self) -> None:
+        """Listen until `shutdown` is called or SIGINT/SIGTERM arrives, then clean up."""
+        from doc_client import parse_address
+
+        self._stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopped.set)
+
+        family, target = parse_address(self.address)
+        if family == 'tcp':
+            self._server = await asyncio.start_server(self.handle, *target,
+                                                      limit=MAX_MESSAGE_BYTES)
+        else:
+            await _claim_socket(target)
+            # Created owner-only: a chmod after bind leaves a window where others can connect
+            umask = os.umask(0o077)
+            try:
+                self._server = await asyncio.start_unix_server(self.handle, target,
+                                                               limit=MAX_MESSAGE_BYTES)
+            finally:
+                os.umask(umask)
+        print(f"Documentation server listening on {self.address} (pid {os.getpid()})",
+              file=sys.stderr)
+
+        try:
+            await self._stopped.wait()
+        finally:
+            # Requests being answered finish; idle connections are closed
+            self._server.close()
+            for writer in list(self._idle):
+                writer.close()
+            if self._handlers:
+                _, pending = await asyncio.wait(self._handlers, timeout=SHUTDOWN_GRACE)
+                for task in pending:
+                    task.cancel()
+            await self.engine.aclose()
+            if self.engine.cache is not None:
+                self.engine.cache.close()
+            if family == 'unix' and os.path.exists(target):
+                os.unlink(target)
+
+
+async def _claim_socket(path: str) -> None:
+    """Remove a socket left behind by a dead server; refuse to replace a live one."""
+    if not os.path.exists(path):
+        return
+    try:
+        _, writer = await asyncio.open_unix_connection(path)
+    except OSError:
+        os.unlink(path)
+        return
+    writer.close()
+    raise RuntimeError(f"A documentation server is already listening on {path}")
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+# =============================================================================
+# CLI INTERFACE
+# =============================================================================
+
+def main():
+    """Run the documentation server from the command line."""
+    parser = argparse.ArgumentParser(description="Serve documentation requests locally")
+    parser.add_argument("--socket", metavar="PATH",
+                        help="Unix socket to listen on (default $DOCGEN_SERVER, then a "
+                             "per-user socket in the temp directory)")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="With --port: interface to listen on; anything but loopback "
+                             "needs --token-file")
+    parser.add_argument("--port", type=int, help="Listen on localhost TCP instead")
+    parser.add_argument("--token-file", metavar="PATH",
+                        help="Require every request to carry this file's contents "
+                             "(mode 0600)")
+    parser.add_argument("--root", action="append", metavar="DIR",
+                        help="Directory document_file may read from; repeatable "
+                             "(default: the current directory)")
+    parser.add_argument("--backend", metavar="SPEC",
+                        help="LLM backend, e.g. 'openai:max_connections=32' or 'fake'")
+    parser.add_argument("--cache", metavar="PATH",
+                        help="Persistent response cache (default: in memory)")
+    parser.add_argument("--model", default="gpt-4-turbo")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Concurrent model requests per document_file call")
+    parser.add_argument("--route", action="store_true",
+                        help="Route functions across model tiers (see router.py)")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Hedge requests that outlast the model's p95 latency")
+    args = parser.parse_args()
+
+    if args.port and not args.token_file and not _is_loopback(args.host):
+        parser.error(f"--host {args.host} is reachable from other machines; pass "
+                     "--token-file or listen on 127.0.0.1")
+    try:
+        token = read_token(args.token_file) if args.token_file else None
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    if args.backend:
+        doc_generator.set_backend(args.backend)
+    address = f"{args.host}:{args.port}" if args.port else args.socket
+
+    async def run():
+        from doc_cache import DocumentationCache
+        router = None
+        if args.route:
+            from router import ModelRouter
+            router = ModelRouter()
+        # Built inside the loop: async clients belong to the loop that uses them
+        engine = CoalescingEngine(model=args.model, concurrency=args.concurrency,
+                                  cache=DocumentationCache(args.cache or ":memory:"),
+                                  router=router, hedge=args.hedge)
+        await DocumentationServer(engine, address, args.root, token).serve()
+
+    try:
+        asyncio.run(run())
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
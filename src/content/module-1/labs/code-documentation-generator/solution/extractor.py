@@ -0,0 +1,265 @@
+"""
+Lazy Function Extraction
+
+Yields the functions of a Python file one at a time, without holding the
+whole source text or syntax tree in memory. `ast.parse` on a generated file
+of tens of MB builds a tree far larger than the file, and walking it with
+`ast.get_source_segment` re-splits the source for every function.
+
+Instead the file is memory-mapped and split into top-level statements:
+
+1. Line start offsets are computed once, in a single pass over the bytes.
+2. A line starting in column 0 (other than `else`, `except`, closing
+   brackets, comments, ...) is a candidate statement boundary. Each chunk
+   between boundaries is parsed on its own; a chunk that does not parse
+   (e.g. it ends inside a multi-line string or bracket) is grown until it
+   does, doubling each time so pathological files stay near-linear.
+3. Functions in each chunk are yielded with qualified names, including
+   class methods (`Cache.get`), nested functions (`outer.inner`) and async
+   defs. Their source is sliced from the mapped bytes by offset, since AST
+   columns are UTF-8 byte offsets anyway.
+
+Only one top-level statement's tree is alive at a time, so peak memory is
+bounded by the largest top-level class or function rather than the file.
+Files are assumed to be UTF-8, like the rest of the pipeline.
+`discover_files` expands files, directories and globs into the Python files
+the batch, incremental and validation modes work on.
+
+Example:
+    >>> for qualname, source in iter_file_functions("generated.py"):
+    ...     print(qualname, len(source))
+"""
+
+import ast
+import glob
+import mmap
+import os
+import re
+from array import array
+
+from metrics import METRICS
+
+# Lines that cannot start a top-level statement: indented or blank lines,
+# comments, closing brackets and the continuation clauses of compound statements
+_CONTINUATION_PATTERN = re.compile(rb'(?:else|elif|except|finally)\b|[)\]}#\s]')
+
+_FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+
+def iter_file_functions(path: str, use_mmap: bool = True):
+    """
+    Lazily yield every function in a file with its qualified name.
+
+    Args:
+        path: Path to the Python file.
+        use_mmap: Map the file instead of reading it into memory.
+
+    Yields:
+        (qualified name, function source) tuples, in source order.
+
+    Raises:
+        SyntaxError: If the file is not valid Python.
+    """
+    for qualname, _, source in iter_file_nodes(path, use_mmap):
+        yield qualname, source
+
+
+def iter_file_nodes(path: str, use_mmap: bool = True):
+    """
+    Like `iter_file_functions`, but also yield each function's AST node.
+
+    A node keeps its top-level statement's tree alive, so callers that
+    collect results should keep what they derive from it, not the node.
+
+    Yields:
+        (qualified name, function node, function source) tuples.
+    """
+    with open(path, 'rb') as f:
+        if not use_mmap:
+            with METRICS.timer("read"):
+                source = f.read()
+            yield from iter_buffer_nodes(source)
+            return
+        try:
+            # Mapped pages are faulted in as they are parsed, so this only times the mapping
+            with METRICS.timer("read"):
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return
+        with buffer:
+            yield from iter_buffer_nodes(buffer)
+
+
+def iter_source_functions(source: str):
+    """Lazily yield (qualified name, function source) tuples from source text."""
+    yield from iter_buffer_functions(source.encode('utf-8'))
+
+
+def iter_buffer_functions(buffer):
+    """
+    Yield functions from a bytes-like buffer (bytes or mmap).
+
+    Yields:
+        (qualified name, function source) tuples, in source order.
+    """
+    for qualname, _, source in iter_buffer_nodes(buffer):
+        yield qualname, source
+
+
+def iter_buffer_nodes(buffer):
+    """Yield (qualified name, function node, function source) tuples from a buffer."""
+    for qualname, node, locate in iter_buffer_located(buffer):
+        with METRICS.timer("segment"):
+            start = locate(node.lineno, node.col_offset)
+            end = locate(node.end_lineno, node.end_col_offset)
+            source = buffer[start:end].decode('utf-8')
+        yield qualname, node, source
+
+
+def iter_buffer_located(buffer):
+    """
+    Yield functions with a mapping from their AST positions to buffer offsets.
+
+    Node positions are relative to the chunk the node was parsed from, so
+    callers that edit the buffer translate them with `locate`.
+
+    Yields:
+        (qualified name, function node, locate) tuples, where
+        `locate(lineno, col_offset)` returns the absolute byte offset of a
+        position in that node's tree.
+    """
+    for tree, locate in iter_buffer_chunks(buffer):
+        for qualname, node in iter_qualified(tree.body, []):
+            yield qualname, node, locate
+
+
+def iter_buffer_chunks(buffer):
+    """
+    Yield the parsed top-level statement groups of a buffer, in order.
+
+    For callers that need module-level statements (imports, assignments)
+    as well as functions; use `iter_qualified` on each tree's body.
+
+    Yields:
+        (tree, locate) tuples; see `iter_buffer_located` for `locate`.
+    """
+    offsets = line_offsets(buffer)
+    for first_line, tree in _iter_chunks(buffer, offsets):
+        def locate(lineno: int, col_offset: int, first_line: int = first_line) -> int:
+            return offsets[first_line + lineno - 1] + col_offset
+
+        yield tree, locate
+
+
+def line_offsets(buffer) -> array:
+    """
+    Byte offset of the start of every line, plus the buffer length.
+
+    Returns:
+        An array where line `i` (0-based) spans `offsets[i]:offsets[i + 1]`.
+    """
+    offsets = array('Q', [0])
+    find = buffer.find
+    position = find(b'\n')
+    while position != -1:
+        offsets.append(position + 1)
+        position = find(b'\n', position + 1)
+    if offsets[-1] != len(buffer):
+        offsets.append(len(buffer))
+    return offsets
+
+
+def _iter_chunks(buffer, offsets: array):
+    """Parse the buffer one top-level statement group at a time."""
+    line_count = len(offsets) - 1
+    first = 0
+    minimum = 1  # lines a chunk must span before the next boundary is tried
+
+    for line in range(1, line_count + 1):
+        if line < line_count:
+            if line - first < minimum:
+                continue
+            if _CONTINUATION_PATTERN.match(buffer, offsets[line]):
+                continue
+
+        chunk = buffer[offsets[first]:offsets[line]]
+        try:
+            with METRICS.timer("parse"):
+                tree = ast.parse(chunk)
+        except SyntaxError as e:
+            if line == line_count:
+                if e.lineno is not None:
+                    e.lineno += first
+                raise
+            # Probably cut inside a string or bracket: grow the chunk
+            minimum = 2 * (line - first)
+            continue
+
+        yield first, tree
+        first, minimum = line, 1
+
+
+def iter_qualified(body: list, scope: list):
+    """Walk statements in source order, yielding (qualname, node) for functions."""
+    for node in body:
+        if isinstance(node, _FUNCTION_TYPES):
+            qualname = '.'.join([*scope, node.name])
+            yield qualname, node
+            yield from iter_qualified(node.body, [*scope, node.name])
+        elif isinstance(node, ast.ClassDef):
+            yield from iter_qualified(node.body, [*scope, node.name])
+        else:
+            # Functions defined inside if/try/with/for blocks keep the enclosing scope
+            for field in ('body', 'orelse', 'finalbody'):
+                yield from iter_qualified(getattr(node, field, None) or [], scope)
+            for handler in getattr(node, 'handlers', None) or []:
+                yield from iter_qualified(handler.body, scope)
+            for case in getattr(node, 'cases', None) or []:
+                yield from iter_qualified(case.body, scope)
+
+
+# =============================================================================
+# FILE DISCOVERY
+# =============================================================================
+
+# Directories never worth descending into
+SKIP_DIRS = {'.git', '.hg', '.tox', '.nox', '.venv', 'venv', '__pycache__',
+             'node_modules', 'build', 'dist'}
+
+
+def discover_files(targets: list[str]):
+    """
+    Yield Python files from files, directories and glob patterns.
+
+    Directories are walked recursively, skipping VCS, virtualenv and build
+    directories. Each file is yielded at most once.
+
+    Args:
+        targets: File paths, directory paths or glob patterns.
+
+    Yields:
+        Paths of Python source files, in sorted order per target.
+    """
+    seen = set()
+
+    def candidates(target: str):
+        if os.path.isdir(target):
+            for root, dirs, files in os.walk(target):
+                dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+                for name in sorted(files):
+                    if name.endswith('.py'):
+                        yield os.path.join(root, name)
+        elif glob.has_magic(target):
+            for path in sorted(glob.iglob(target, recursive=True)):
+                if path.endswith('.py') and os.path.isfile(path):
+                    yield path
+        else:
+            yield target
+
+    for target in targets:
+        for path in candidates(target):
+            key = os.path.realpath(path)
+            if key not in seen:
+                seen.add(key)
+                yield path
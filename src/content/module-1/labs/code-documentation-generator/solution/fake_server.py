@@ -0,0 +1,202 @@
+"""
+Local Fake OpenAI Server
+
+A tiny OpenAI-compatible HTTP server for exercising the tooling without an
+API key or network access. It answers `POST /v1/chat/completions` with a
+documented version of the function in the prompt, simulates latency, and
+behaves like a rate-limited provider: requests above its rate get a 429
+with `retry-after-ms`, and a configurable share of requests get a 429 at
+random. `stats` counts connections as well as requests, so clients can
+be checked for connection reuse.
+
+Usage:
+    with FakeOpenAIServer(rpm=600, error_rate=0.05) as server:
+        client = OpenAI(base_url=server.base_url, api_key="test", max_retries=0)
+
+    python fake_server.py --port 8099 --rpm 600
+"""
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DOCUMENTED_TEMPLATE = '''def {name}(a: int, b: int) -> int:
+    """Combine two numbers.
+
+    Args:
+        a: First number.
+        b: Second number.
+
+    Returns:
+        The combined value.
+
+    Example:
+        >>> {name}(1, 2)
+        3
+    """
+    return a + b'''
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Clients that open a connection per request arrive in bursts
+    request_queue_size = 1024
+
+
+class FakeOpenAIServer:
+    """
+    Rate-limited fake chat completions endpoint running in a background thread.
+
+    Args:
+        host: Interface to bind.
+        port: Port to bind; 0 picks a free port.
+        rpm: Requests per minute accepted before answering 429.
+        burst_seconds: Seconds of the rate that may arrive at once.
+        error_rate: Share of accepted requests answered with a random 429.
+        latency: Seconds to wait before answering a successful request.
+        seed: Seed for the random 429s.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, rpm: int = 600,
+                 burst_seconds: float = 1.0, error_rate: float = 0.0,
+                 latency: float = 0.01, seed: int = 0):
+        self.rate = rpm / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.error_rate = error_rate
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'connections': 0, 'requests': 0, 'ok': 0, 'rate_limited': 0,
+                      'injected': 0}
+
+        self.httpd = _Server((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def admit(self) -> float | None:
+        """Apply the rate limit; return None to accept or the retry delay in seconds."""
+        with self.lock:
+            self.stats['requests'] += 1
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.level < 1:
+                self.stats['rate_limited'] += 1
+                return (1 - self.level) / self.rate
+            self.level -= 1
+
+            if self.random.random() < self.error_rate:
+                self.stats['injected'] += 1
+                return 0.05
+            self.stats['ok'] += 1
+            return None
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as separate writes
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def setup(self):
+                # One handler per connection: HTTP/1.1 keep-alive reuses it
+                super().setup()
+                with server.lock:
+                    server.stats['connections'] += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('content-length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+
+                if not self.path.endswith('/chat/completions'):
+                    return self._send(404, {'error': {'message': 'Not found'}})
+
+                delay = server.admit()
+                if delay is not None:
+                    return self._send(429, {
+                        'error': {'message': 'Rate limit reached', 'type': 'rate_limit_error'}
+                    }, {'retry-after-ms': str(int(delay * 1000) + 1)})
+
+                time.sleep(server.latency)
+                prompt = body['messages'][-1]['content']
+                match = re.search(r'def (\w+)', prompt)
+                content = DOCUMENTED_TEMPLATE.format(name=match.group(1) if match else 'f')
+                prompt_tokens = sum(len(m['content']) // 4 + 1 for m in body['messages'])
+                completion_tokens = len(content) // 4 + 1
+
+                self._send(200, {
+                    'id': 'chatcmpl-fake',
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model', 'fake'),
+                    'choices': [{
+                        'index': 0,
+                        'message': {'role': 'assistant', 'content': f"```python\n{content}\n```"},
+                        'finish_reason': 'stop'
+                    }],
+                    'usage': {
+                        'prompt_tokens': prompt_tokens,
+                        'completion_tokens': completion_tokens,
+                        'total_tokens': prompt_tokens + completion_tokens
+                    }
+                })
+
+            def _send(self, status: int, payload: dict, headers: dict | None = None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('content-type', 'application/json')
+                self.send_header('content-length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI server")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--rpm", type=int, default=600)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(port=args.port, rpm=args.rpm, error_rate=args.error_rate,
+                              latency=args.latency)
+    print(f"Serving fake chat completions at {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
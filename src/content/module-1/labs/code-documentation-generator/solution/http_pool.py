@@ -0,0 +1,381 @@
+"""
+HTTP Connection Pooling
+
+Long batch runs and services that embed the generator make thousands of
+requests to the same host, so the transport settings matter: every new
+connection costs a TCP (and TLS) handshake, too few pooled connections make
+requests queue behind each other, and the SDK's default read timeout is ten
+minutes. `ClientPool` owns those settings in one place:
+
+- pool size, keep-alive count and expiry, and separate connect, read,
+  write and pool-wait timeouts;
+- HTTP/2 where the `h2` package is installed (over TLS), HTTP/1.1 with
+  keep-alive otherwise;
+- one shared blocking `OpenAI` client per set of client options, and
+  `AsyncOpenAI` clients built from the same configuration (async clients
+  are bound to the event loop that uses them, so each engine gets its own);
+- utilization statistics from the transport's trace hooks: requests,
+  connections opened (the rest reused a pooled connection), requests in
+  flight and their peak, time spent waiting for a free connection, and pool
+  timeouts. They are also recorded in `METRICS`.
+
+The openai backend builds its clients through the process-wide pools
+returned by `get_pool`, configured from the backend spec, e.g.
+`--backend openai:max_connections=64,read_timeout=60,http2=0`. Blocking
+clients are closed at interpreter exit; async engines close their own
+client when their run finishes.
+
+Example:
+    >>> with ClientPool(max_connections=32, read_timeout=60) as pool:
+    ...     client = pool.client()
+    ...     documented = generate_documentation(code, client=client)
+    ...     print(pool.stats()['reuse_ratio'])
+"""
+
+import atexit
+import importlib.util
+import threading
+import time
+import weakref
+
+try:
+    import httpx
+except ImportError:  # openai releases that ship their transport as httpx2
+    import httpx2 as httpx
+
+from metrics import METRICS
+
+# Connections per pool, and how many idle ones are kept alive for reuse
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+# Seconds; the read timeout covers the longest completion we expect
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_READ_TIMEOUT = 120.0
+DEFAULT_WRITE_TIMEOUT = 30.0
+DEFAULT_POOL_TIMEOUT = 30.0
+
+# Backend spec options that configure the pool rather than the client
+POOL_OPTIONS = ('max_connections', 'max_keepalive', 'keepalive_expiry', 'connect_timeout',
+                'read_timeout', 'write_timeout', 'pool_timeout', 'http2')
+
+
+def http2_available() -> bool:
+    """Return True if the optional `h2` package needed for HTTP/2 is installed."""
+    return importlib.util.find_spec('h2') is not None
+
+
+# =============================================================================
+# STATISTICS
+# =============================================================================
+
+class PoolStats:
+    """
+    Thread-safe request and connection counters for one pool.
+
+    Shared by the pool's blocking and async transports; every update is also
+    recorded in `METRICS` (`http_requests`, `http_connections_opened`,
+    `http_pool_timeouts`, the `pool_wait` stage and the `http_in_flight`
+    gauge).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+        self.pool_timeouts = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def track(self) -> "_Tracer":
+        """Start tracking one request; returns its trace callback."""
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            in_flight = self.in_flight
+        METRICS.count("http_requests")
+        METRICS.gauge("http_in_flight", in_flight)
+        return _Tracer(self)
+
+    def opened(self) -> None:
+        with self._lock:
+            self.connections_opened += 1
+        METRICS.count("http_connections_opened")
+
+    def timed_out(self) -> None:
+        with self._lock:
+            self.pool_timeouts += 1
+        METRICS.count("http_pool_timeouts")
+
+    def finished(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            in_flight = self.in_flight
+        METRICS.gauge("http_in_flight", in_flight)
+
+
+class _Tracer:
+    """
+    httpcore trace callback for one request.
+
+    Counts new connections, records how long the request waited for a
+    connection (time before its headers were sent, minus any time spent
+    connecting) and releases the in-flight slot when the response closes.
+    """
+
+    def __init__(self, stats: PoolStats):
+        self.stats = stats
+        self.start = time.perf_counter()
+        self.connecting = 0.0
+        self.mark = None
+        self.sent = False
+        self.done = False
+
+    def __call__(self, event: str, info: dict) -> None:
+        now = time.perf_counter()
+        if event.endswith(('connect_tcp.started', 'start_tls.started')):
+            self.mark = now
+        elif event.endswith(('connect_tcp.complete', 'start_tls.complete')):
+            self.connecting += now - (self.mark or now)
+            if event.endswith('connect_tcp.complete'):
+                self.stats.opened()
+        elif event.endswith('send_request_headers.started') and not self.sent:
+            self.sent = True
+            METRICS.observe("pool_wait", max(0.0, now - self.start - self.connecting))
+        elif event.endswith('response_closed.complete'):
+            self.finish()
+
+    async def atrace(self, event: str, info: dict) -> None:
+        self(event, info)
+
+    def finish(self) -> None:
+        # A request that fails mid-response may be closed twice
+        if not self.done:
+            self.done = True
+            self.stats.finished()
+
+
+class _PooledTransport(httpx.HTTPTransport):
+    """Blocking transport that reports to a `PoolStats`."""
+
+    def __init__(self, stats: PoolStats, **options):
+        super().__init__(**options)
+        self.stats = stats
+
+    def handle_request(self, request):
+        tracer = self.stats.track()
+        request.extensions['trace'] = tracer
+        try:
+            return super().handle_request(request)
+        except httpx.PoolTimeout:
+            self.stats.timed_out()
+            tracer.finish()
+            raise
+        except BaseException:
+            tracer.finish()
+            raise
+
+    def open_connections(self) -> int:
+        return len(getattr(self._pool, 'connections', ()))
+
+
+class _AsyncPooledTransport(httpx.AsyncHTTPTransport):
+    """Async transport that reports to a `PoolStats`."""
+
+    def __init__(self, stats: PoolStats, **options):
+        super().__init__(**options)
+        self.stats = stats
+
+    async def handle_async_request(self, request):
+        tracer = self.stats.track()
+        request.extensions['trace'] = tracer.atrace
+        try:
+            return await super().handle_async_request(request)
+        except httpx.PoolTimeout:
+            self.stats.timed_out()
+            tracer.finish()
+            raise
+        except BaseException:
+            tracer.finish()
+            raise
+
+    def open_connections(self) -> int:
+        return len(getattr(self._pool, 'connections', ()))
+
+
+# =============================================================================
+# POOL
+# =============================================================================
+
+class ClientPool:
+    """
+    Connection settings shared by blocking and async OpenAI clients.
+
+    Args:
+        max_connections: Most connections open at once; further requests
+            wait up to `pool_timeout` for one to free up.
+        max_keepalive: Idle connections kept open for reuse.
+        keepalive_expiry: Seconds an idle connection is kept.
+        connect_timeout: Seconds to establish a connection.
+        read_timeout: Seconds to wait for each chunk of the response.
+        write_timeout: Seconds to send the request.
+        pool_timeout: Seconds to wait for a free connection.
+        http2: Negotiate HTTP/2; None enables it when `h2` is installed.
+    """
+
+    def __init__(self, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive: int = DEFAULT_MAX_KEEPALIVE,
+                 keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 write_timeout: float = DEFAULT_WRITE_TIMEOUT,
+                 pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+                 http2: bool | None = None):
+        if max_connections < 1:
+            raise ValueError("A pool needs at least one connection")
+        if http2 is None:
+            http2 = http2_available()
+        elif http2 and not http2_available():
+            raise ValueError("HTTP/2 requires the h2 package (pip install 'httpx[http2]')")
+
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=min(max_keepalive, max_connections),
+                                   keepalive_expiry=keepalive_expiry)
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, read=read_timeout,
+                                     write=write_timeout, pool=pool_timeout)
+        self.http2 = bool(http2)
+        self.counters = PoolStats()
+        self._lock = threading.Lock()
+        self._clients = {}
+        self._transports = weakref.WeakSet()
+
+    def _transport_options(self) -> dict:
+        return {'limits': self.limits, 'http2': self.http2}
+
+    def client(self, **options):
+        """
+        Return the shared blocking client for these client options.
+
+        Args:
+            **options: Passed to `OpenAI()` (e.g. api_key, base_url, max_retries).
+
+        Returns:
+            An `OpenAI` client using this pool; the same one for equal options.
+        """
+        from openai import OpenAI
+
+        key = tuple(sorted(options.items()))
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                transport = _PooledTransport(self.counters, **self._transport_options())
+                self._transports.add(transport)
+                client = self._clients[key] = OpenAI(
+                    http_client=httpx.Client(transport=transport, timeout=self.timeout),
+                    timeout=self.timeout, **options)
+        return client
+
+    def async_client(self, **options):
+        """
+        Build an async client with this pool's settings.
+
+        Connections of async clients belong to the event loop they were opened
+        on, so each call returns a new client; close it with `await
+        client.close()` before its loop ends. Its statistics are shared.
+
+        Args:
+            **options: Passed to `AsyncOpenAI()`.
+
+        Returns:
+            A new `AsyncOpenAI` client.
+        """
+        from openai import AsyncOpenAI
+
+        transport = _AsyncPooledTransport(self.counters, **self._transport_options())
+        self._transports.add(transport)
+        return AsyncOpenAI(
+            http_client=httpx.AsyncClient(transport=transport, timeout=self.timeout),
+            timeout=self.timeout, **options)
+
+    def stats(self) -> dict:
+        """
+        Snapshot pool utilization.
+
+        Returns:
+            requests, connections_opened, reused (requests that got a pooled
+            connection), reuse_ratio, in_flight, peak_in_flight,
+            connections_open (across live clients), max_connections,
+            utilization (peak in flight over max_connections), pool_timeouts
+            and http2.
+        """
+        counters = self.counters
+        reused = max(0, counters.requests - counters.connections_opened)
+        max_connections = self.limits.max_connections
+        return {
+            'requests': counters.requests,
+            'connections_opened': counters.connections_opened,
+            'reused': reused,
+            'reuse_ratio': reused / counters.requests if counters.requests else 0.0,
+            'in_flight': counters.in_flight,
+            'peak_in_flight': counters.peak_in_flight,
+            'connections_open': sum(t.open_connections() for t in list(self._transports)),
+            'max_connections': max_connections,
+            'utilization': counters.peak_in_flight / max_connections,
+            'pool_timeouts': counters.pool_timeouts,
+            'http2': self.http2,
+        }
+
+    def close(self) -> None:
+        """Close the shared blocking clients and their connections."""
+        with self._lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# =============================================================================
+# PROCESS-WIDE POOLS
+# =============================================================================
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_pool(**options) -> ClientPool:
+    """
+    Return the process-wide pool for these settings, creating it on first use.
+
+    Args:
+        **options: `ClientPool` arguments; equal settings share one pool.
+    """
+    key = tuple(sorted(options.items()))
+    with _POOLS_LOCK:
+        pool = _POOLS.get(key)
+        if pool is None:
+            pool = _POOLS[key] = ClientPool(**options)
+    return pool
+
+
+def pool_stats() -> list[dict]:
+    """Utilization of every process-wide pool (see `ClientPool.stats`)."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    return [pool.stats() for pool in pools]
+
+
+@atexit.register
+def close_pools() -> None:
+    """Close every process-wide pool; registered to run at interpreter exit."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.close()
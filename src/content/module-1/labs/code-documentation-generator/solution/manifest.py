@@ -0,0 +1,342 @@
+"""
+Incremental Re-Documentation
+
+Keeps a function-level manifest of previous documentation runs so a rerun
+only sends new or changed functions to the model. For every function the
+manifest records its qualified name, a hash of its source (plus model and
+prompt settings), the documented output and its validation score.
+
+Changed files are found one of three ways:
+
+    hash   read every file and compare function hashes (always correct)
+    mtime  skip files whose modification time and size are unchanged
+    git    skip files that `git diff` reports as untouched since the commit
+           of the last run, and that are not untracked
+
+Within a file that may have changed, function hashes decide what is resent,
+so editing one function in a 300-function module costs one request.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import tempfile
+
+from async_engine import AsyncDocumentationEngine, run_engine
+from doc_cache import cache_key
+from doc_generator import MAX_TOKENS, TEMPERATURE
+from extractor import discover_files, iter_source_functions
+
+MANIFEST_VERSION = 1
+
+CHANGE_MODES = ('hash', 'mtime', 'git')
+
+# Files scanned concurrently; requests are limited by the engine's concurrency
+DEFAULT_FILE_CONCURRENCY = 8
+
+
+# =============================================================================
+# FUNCTION EXTRACTION
+# =============================================================================
+
+def extract_qualified_functions(source: str) -> list[tuple[str, str]]:
+    """
+    Extract every function with its qualified name, in source order.
+
+    Redefinitions in the same scope (property setters, overloads) get a
+    `#2`, `#3`, ... suffix so each keeps its own manifest entry.
+
+    Args:
+        source: The Python module source code.
+
+    Returns:
+        A list of (qualified name, function source) tuples.
+    """
+    seen = {}
+    functions = []
+    for qualname, code in iter_source_functions(source):
+        seen[qualname] = seen.get(qualname, 0) + 1
+        if seen[qualname] > 1:
+            qualname = f"{qualname}#{seen[qualname]}"
+        functions.append((qualname, code))
+    return functions
+
+
+# =============================================================================
+# MANIFEST
+# =============================================================================
+
+class Manifest:
+    """
+    Function-level record of documentation produced by earlier runs.
+
+    Stored as JSON:
+
+        {"version": 1, "commit": ..., "files": {path: {"mtime_ns", "size",
+            "functions": {qualname: {"hash", "documented", "score"}}}}}
+
+    `commit` is the git HEAD when the last `--changed-by git` run started.
+    A file with functions that failed to document, or that could not be
+    read or parsed, is stored with null `mtime_ns` and `size`, so no change
+    mode skips it until it succeeds.
+
+    Args:
+        path: JSON file holding the manifest. Created on first save.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.files = {}
+        self.commit = None
+
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.files = data['files']
+                self.commit = data.get('commit')
+
+    def file_entry(self, path: str) -> dict | None:
+        return self.files.get(_normalize_path(path))
+
+    def is_complete(self, path: str) -> bool:
+        """Return True if every function of the file was documented last time."""
+        entry = self.file_entry(path)
+        return entry is not None and entry['mtime_ns'] is not None
+
+    def is_unchanged_on_disk(self, path: str) -> bool:
+        """Return True if the file's mtime and size match the manifest."""
+        if not self.is_complete(path):
+            return False
+        entry = self.file_entry(path)
+        stat = os.stat(path)
+        return entry['mtime_ns'] == stat.st_mtime_ns and entry['size'] == stat.st_size
+
+    def update_file(self, path: str, functions: dict,
+                    stat: os.stat_result | None = None) -> None:
+        """
+        Replace a file's entry, dropping functions that no longer exist.
+
+        Args:
+            path: The file.
+            functions: Its documented functions by qualified name.
+            stat: The file's stat, taken before its source was read so it
+                describes the content `functions` came from. None if some
+                functions failed and were left out; the file is then
+                rescanned next time.
+        """
+        self.files[_normalize_path(path)] = {
+            'mtime_ns': stat.st_mtime_ns if stat is not None else None,
+            'size': stat.st_size if stat is not None else None,
+            'functions': functions
+        }
+
+    def prune_missing(self) -> int:
+        """Drop entries for files that were deleted. Returns how many."""
+        missing = [path for path in self.files if not os.path.exists(path)]
+        for path in missing:
+            del self.files[path]
+        return len(missing)
+
+    def save(self) -> None:
+        """Write the manifest atomically so an interrupted run never corrupts it."""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION, 'commit': self.commit,
+                           'files': self.files}, f)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def _normalize_path(path: str) -> str:
+    return os.path.normpath(path)
+
+
+def _git(*args: str, cwd: str = '.') -> list[str]:
+    output = subprocess.run(['git', *args], cwd=cwd, check=True,
+                            capture_output=True, text=True).stdout
+    return [line for line in output.splitlines() if line]
+
+
+def git_head(cwd: str = '.') -> str:
+    """
+    Commit id of the repository's HEAD.
+
+    Raises:
+        subprocess.CalledProcessError: If git fails (e.g. not a repository).
+    """
+    return _git('rev-parse', 'HEAD', cwd=cwd)[0]
+
+
+def git_changed_files(since: str = 'HEAD', cwd: str = '.') -> set[str]:
+    """
+    List files changed relative to a git revision, including untracked ones.
+
+    Args:
+        since: Revision to diff the working tree against.
+        cwd: Directory inside the repository.
+
+    Returns:
+        Real paths of every modified, added or untracked file.
+
+    Raises:
+        subprocess.CalledProcessError: If git fails (e.g. not a repository).
+    """
+    root = _git('rev-parse', '--show-toplevel', cwd=cwd)[0]
+    changed = _git('diff', '--name-only', since, cwd=cwd)
+    untracked = _git('ls-files', '--others', '--exclude-standard', '--full-name', cwd=cwd)
+    return {os.path.realpath(os.path.join(root, path)) for path in changed + untracked}
+
+
+# =============================================================================
+# INCREMENTAL RUN
+# =============================================================================
+
+async def document_incremental(targets: list[str], manifest: Manifest,
+                               engine: AsyncDocumentationEngine,
+                               changed_by: str = 'hash', since: str | None = None,
+                               file_concurrency: int = DEFAULT_FILE_CONCURRENCY) -> dict:
+    """
+    Re-document only the functions that changed since the last run.
+
+    Files are processed concurrently and share the engine's request limit.
+    Functions whose request fails are left out of the manifest, and their
+    file is marked incomplete, so they are retried next time. A file that
+    cannot be read or parsed is marked incomplete and reported in `errors`;
+    the rest of the run continues. The manifest is saved even if the run is
+    interrupted, keeping the files finished so far.
+
+    Args:
+        targets: File paths, directory paths or glob patterns.
+        manifest: Manifest from previous runs; updated in place.
+        engine: Engine used for the functions that need documentation.
+        changed_by: How to find candidate files: "hash", "mtime" or "git".
+        since: Git revision to diff against when `changed_by` is "git".
+            Defaults to the commit recorded by the last git run; without
+            one, every file is scanned.
+        file_concurrency: Number of files processed at once.
+
+    Returns:
+        Counters describing how much work was skipped and done, plus the
+        `errors` of files that could not be processed.
+    """
+    if changed_by not in CHANGE_MODES:
+        raise ValueError(f"changed_by must be one of {CHANGE_MODES}")
+
+    git_changed = None
+    if changed_by == 'git':
+        head = git_head()
+        if since is not None:
+            git_changed = git_changed_files(since)
+        elif manifest.commit is not None:
+            try:
+                git_changed = git_changed_files(manifest.commit)
+            except subprocess.CalledProcessError:
+                # The recorded commit is gone (e.g. rebased away): scan everything
+                git_changed = None
+
+    stats = {
+        'files_scanned': 0, 'files_skipped': 0, 'functions_reused': 0,
+        'functions_documented': 0, 'functions_failed': 0, 'files_failed': 0,
+        'files_removed': 0, 'errors': {}
+    }
+    requests = asyncio.Semaphore(engine.concurrency)
+
+    async def document(code: str) -> dict:
+        async with requests:
+            return await engine.document(code)
+
+    async def update(path: str) -> None:
+        entry = manifest.file_entry(path)
+        if manifest.is_complete(path) and (
+            (changed_by == 'mtime' and manifest.is_unchanged_on_disk(path)) or
+            (git_changed is not None and os.path.realpath(path) not in git_changed)
+        ):
+            stats['files_skipped'] += 1
+            return
+
+        stats['files_scanned'] += 1
+        previous = entry['functions'] if entry else {}
+        try:
+            # Stat first: a file edited mid-run must not get the new stat with old hashes
+            with open(path, 'r', encoding='utf-8') as f:
+                stat = os.fstat(f.fileno())
+                source = f.read()
+            extracted = extract_qualified_functions(source)
+        except (OSError, UnicodeDecodeError, SyntaxError, ValueError) as e:
+            stats['files_failed'] += 1
+            stats['errors'][path] = f"{type(e).__name__}: {e}"
+            manifest.update_file(path, previous)
+            return
+
+        functions = {}
+        stale = []
+        for qualname, code in extracted:
+            digest = cache_key(code, engine.model, TEMPERATURE, MAX_TOKENS)
+            known = previous.get(qualname)
+            if known is not None and known['hash'] == digest:
+                functions[qualname] = known
+                stats['functions_reused'] += 1
+            else:
+                stale.append((qualname, code, digest))
+
+        results = await asyncio.gather(*(document(code) for _, code, _ in stale))
+        failed = 0
+        for (qualname, _, digest), result in zip(stale, results):
+            if result['error']:
+                failed += 1
+                continue
+            functions[qualname] = {
+                'hash': digest,
+                'documented': result['documented'],
+                'score': result['validation']['score']
+            }
+        stats['functions_failed'] += failed
+        stats['functions_documented'] += len(stale) - failed
+        manifest.update_file(path, functions, stat if not failed else None)
+
+    files = discover_files(targets)
+
+    async def worker() -> None:
+        for path in files:
+            await update(path)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(file_concurrency)))
+        stats['files_removed'] = manifest.prune_missing()
+        if changed_by == 'git':
+            manifest.commit = head
+    finally:
+        manifest.save()
+    return stats
+
+
+def update_manifest(targets: list[str], manifest_path: str, changed_by: str = 'hash',
+                    since: str | None = None, **engine_options) -> dict:
+    """
+    Synchronous entry point for incremental documentation.
+
+    Args:
+        targets: File paths, directory paths or glob patterns.
+        manifest_path: JSON manifest to read and update.
+        changed_by: How to find candidate files: "hash", "mtime" or "git".
+        since: Git revision to diff against when `changed_by` is "git";
+            defaults to the commit recorded by the last git run.
+        **engine_options: Passed through to `AsyncDocumentationEngine`.
+
+    Returns:
+        Counters describing how much work was skipped and done.
+
+    Example:
+        >>> update_manifest(["src/"], "docs_manifest.json", changed_by="git")
+        {'files_scanned': 3, 'files_skipped': 410, 'functions_reused': 41, ...}
+    """
+    manifest = Manifest(manifest_path)
+    engine = AsyncDocumentationEngine(**engine_options)
+    return run_engine(engine,
+                      document_incremental(targets, manifest, engine, changed_by, since))
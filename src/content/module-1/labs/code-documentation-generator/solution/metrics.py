@@ -0,0 +1,244 @@
+"""
+Pipeline Instrumentation
+
+Stage timers, counters and latency histograms for the documentation
+pipeline, so regressions show up when prompts or models change. Every stage
+of `document_file`/`main` records into the process-wide `METRICS` registry:
+
+    parse     ast.parse (per top-level statement when extracting lazily)
+    segment   slicing function source out of the file
+    network   the chat completions round-trip (labelled by model)
+    clean     clean_code_output
+    validate  validate_documentation
+
+Counters track prompt/completion tokens per model, cache hits and misses,
+and rate-limit retries; gauges hold current levels such as HTTP requests in
+flight. Everything can be exported as JSON or in the
+Prometheus text exposition format.
+
+Example:
+    >>> with METRICS.timer("parse"):
+    ...     tree = ast.parse(source)
+    >>> METRICS.count("prompt_tokens", 812, model="gpt-4-turbo")
+    >>> print(METRICS.to_prometheus())
+"""
+
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Samples kept per histogram; older samples are reservoir-sampled beyond this
+MAX_SAMPLES = 10_000
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _Histogram:
+    """Latency samples for one (stage, model) pair, bounded by reservoir sampling."""
+
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = []
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(value)
+        else:
+            slot = random.randrange(self.count)
+            if slot < MAX_SAMPLES:
+                self.samples[slot] = value
+
+    def quantiles(self) -> dict:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in QUANTILES}
+
+
+class Metrics:
+    """
+    Thread-safe registry of stage timings and counters.
+
+    Timings are keyed by stage and model (empty for stages that do not talk
+    to a model); counters and gauges are keyed by name and model.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+
+    def observe(self, stage: str, seconds: float, model: str = "") -> None:
+        """Record one duration for a stage."""
+        with self._lock:
+            histogram = self._histograms.get((stage, model))
+            if histogram is None:
+                histogram = self._histograms[(stage, model)] = _Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str, model: str = ""):
+        """Time the enclosed block as one observation of `stage`."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, model)
+
+    def count(self, name: str, value: float = 1, model: str = "") -> None:
+        """Increase a counter."""
+        with self._lock:
+            key = (name, model)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, model: str = "") -> None:
+        """Set a gauge to its current value."""
+        with self._lock:
+            self._gauges[(name, model)] = value
+
+    def record_usage(self, response, model: str) -> None:
+        """Count prompt and completion tokens reported by an API response."""
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+        self.count('prompt_tokens', usage.prompt_tokens or 0, model)
+        self.count('completion_tokens', usage.completion_tokens or 0, model)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    # -------------------------------------------------------------------------
+    # Export
+    # -------------------------------------------------------------------------
+
+    def to_dict(self) -> dict:
+        """
+        Snapshot all metrics.
+
+        Returns:
+            {"stages": [{stage, model, count, total, p50, p95, p99}, ...],
+             "counters": [{name, model, value}, ...],
+             "gauges": [{name, model, value}, ...]} with times in seconds.
+        """
+        with self._lock:
+            histograms = [(key, h.count, h.total, h.quantiles())
+                          for key, h in sorted(self._histograms.items())]
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+
+        return {
+            'stages': [
+                {
+                    'stage': stage, 'model': model, 'count': count, 'total': total,
+                    'p50': q[0.5], 'p95': q[0.95], 'p99': q[0.99]
+                }
+                for (stage, model), count, total, q in histograms
+            ],
+            'counters': [
+                {'name': name, 'model': model, 'value': value}
+                for (name, model), value in counters
+            ],
+            'gauges': [
+                {'name': name, 'model': model, 'value': value}
+                for (name, model), value in gauges
+            ]
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Render metrics in the Prometheus text exposition format."""
+        snapshot = self.to_dict()
+        lines = [
+            "# HELP docgen_stage_seconds Time spent per pipeline stage.",
+            "# TYPE docgen_stage_seconds summary",
+        ]
+        for entry in snapshot['stages']:
+            labels = _labels(stage=entry['stage'], model=entry['model'])
+            for q in QUANTILES:
+                quantile_labels = _labels(stage=entry['stage'], model=entry['model'],
+                                          quantile=str(q))
+                lines.append(f"docgen_stage_seconds{quantile_labels} {entry[f'p{round(q * 100)}']}")
+            lines.append(f"docgen_stage_seconds_sum{labels} {entry['total']}")
+            lines.append(f"docgen_stage_seconds_count{labels} {entry['count']}")
+
+        names = sorted({entry['name'] for entry in snapshot['counters']})
+        for name in names:
+            lines.append(f"# TYPE docgen_{name}_total counter")
+            for entry in snapshot['counters']:
+                if entry['name'] == name:
+                    lines.append(f"docgen_{name}_total{_labels(model=entry['model'])} "
+                                 f"{entry['value']}")
+
+        for name in sorted({entry['name'] for entry in snapshot['gauges']}):
+            lines.append(f"# TYPE docgen_{name} gauge")
+            for entry in snapshot['gauges']:
+                if entry['name'] == name:
+                    lines.append(f"docgen_{name}{_labels(model=entry['model'])} {entry['value']}")
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str) -> None:
+        """Write metrics to `path`: Prometheus text for .prom/.txt, JSON otherwise."""
+        text = self.to_prometheus() if path.endswith(('.prom', '.txt')) else self.to_json()
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def summary(self) -> str:
+        """Human-readable table of stage latencies, slowest total first."""
+        stages = sorted(self.to_dict()['stages'], key=lambda e: e['total'], reverse=True)
+        lines = [f"{'stage':<10} {'model':<16} {'count':>7} {'total':>9} "
+                 f"{'p50':>9} {'p95':>9} {'p99':>9}"]
+        for e in stages:
+            lines.append(f"{e['stage']:<10} {e['model'] or '-':<16} {e['count']:>7} "
+                         f"{e['total']:>8.3f}s {e['p50'] * 1000:>7.2f}ms "
+                         f"{e['p95'] * 1000:>7.2f}ms {e['p99'] * 1000:>7.2f}ms")
+        return '\n'.join(lines)
+
+
+def _labels(**labels: str) -> str:
+    parts = [f'{key}="{_escape(value)}"' for key, value in labels.items() if value]
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Process-wide registry used by the pipeline
+METRICS = Metrics()
+
+
+def profile_call(func, *args, output=None, limit: int = 25, **kwargs):
+    """
+    Run `func` under cProfile and print the top functions by cumulative time.
+
+    Args:
+        func: Callable to profile.
+        output: Stream for the summary. Defaults to standard error.
+        limit: Number of functions to list.
+
+    Returns:
+        Whatever `func` returns.
+    """
+    import cProfile
+    import pstats
+    import sys
+
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        stats = pstats.Stats(profiler, stream=output or sys.stderr)
+        stats.sort_stats('cumulative').print_stats(limit)
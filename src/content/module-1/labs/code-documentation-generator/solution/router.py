@@ -0,0 +1,309 @@
+"""
+Multi-Model Routing and Hedged Requests
+
+Sending every function to the premium model pays premium prices and
+latency for one-line getters. The router picks a model per function instead:
+
+- `ModelRouter.models` starts at the cheapest tier whose limits the function
+  fits (cyclomatic complexity and length, from the AST) and yields the next
+  tier up whenever the caller reports, through `should_escalate`, that
+  `validate_documentation` scored the answer below the threshold.
+- `hedged` bounds tail latency: once a request has been outstanding for
+  longer than the model's recent p95 latency, an identical request is sent
+  and whichever answer arrives first is used; the other is cancelled.
+  Thresholds are kept per model and request size, and at most 10% of
+  requests are duplicated, while the slowest ones no longer set the pace.
+
+Token counters in `METRICS` are kept per model, so `estimate_cost` can price
+a run. `bench_routing.py` measures throughput, cost and tail latency against
+the fake backend.
+
+Example:
+    >>> router = ModelRouter(tiers=("gpt-4o-mini", "gpt-4-turbo"))
+    >>> for model in router.models(code):
+    ...     documented = generate_documentation(code, model=model)
+    ...     if not router.should_escalate(validate_documentation(documented), model):
+    ...         break
+"""
+
+import ast
+import asyncio
+import math
+import textwrap
+import time
+from collections import deque
+
+from metrics import METRICS
+from triage import DEFAULT_MIN_SCORE, complexity
+
+# Models from cheapest to most capable
+DEFAULT_TIERS = ("gpt-4o-mini", "gpt-4-turbo")
+
+# USD per million (prompt, completion) tokens, for cost reports
+PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4-turbo': (10.00, 30.00),
+    'gpt-4': (30.00, 60.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+}
+
+# What each tier is trusted with: a function above these limits starts one
+# tier up per multiple
+DEFAULT_MAX_COMPLEXITY = 5
+DEFAULT_MAX_LINES = 40
+
+# Hedging: latency quantile that triggers a duplicate, and the samples
+# needed before hedging starts
+HEDGE_QUANTILE = 0.95
+HEDGE_WINDOW = 500
+HEDGE_MIN_SAMPLES = 20
+
+# Most requests per key that may be duplicated, so a burst of slow responses
+# (or a threshold learned from the first, fastest completions) cannot double load
+HEDGE_BUDGET = 0.1
+
+# Seconds between threshold checks while the tracker is warming up
+HEDGE_POLL = 0.05
+
+
+# =============================================================================
+# ROUTING
+# =============================================================================
+
+class ModelRouter:
+    """
+    Choose a model per function and escalate on poor validation scores.
+
+    Args:
+        tiers: Models from cheapest to most capable.
+        max_complexity: Largest cyclomatic complexity the first tier gets;
+            each further multiple moves a function one tier up.
+        max_lines: Longest function (in lines) the first tier gets, likewise.
+        escalate_below: Validation score under which the next tier is tried.
+    """
+
+    def __init__(self, tiers: tuple[str, ...] = DEFAULT_TIERS,
+                 max_complexity: int = DEFAULT_MAX_COMPLEXITY,
+                 max_lines: int = DEFAULT_MAX_LINES,
+                 escalate_below: int = DEFAULT_MIN_SCORE):
+        if not tiers:
+            raise ValueError("At least one model tier is required")
+        self.tiers = tuple(tiers)
+        self.max_complexity = max_complexity
+        self.max_lines = max_lines
+        self.escalate_below = escalate_below
+
+    def choose(self, code: str) -> int:
+        """
+        Pick the starting tier for a function.
+
+        Args:
+            code: The function source.
+
+        Returns:
+            The index in `tiers`; code that does not parse goes to the top tier.
+        """
+        try:
+            tree = ast.parse(textwrap.dedent(code))
+        except SyntaxError:
+            return len(self.tiers) - 1
+        func = next((node for node in tree.body
+                     if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))), None)
+        score = complexity(func) if func is not None else 1
+        lines = code.count('\n') + 1
+        load = max(math.ceil(score / self.max_complexity), math.ceil(lines / self.max_lines))
+        return min(len(self.tiers) - 1, max(0, load - 1))
+
+    def models(self, code: str):
+        """Yield the starting model for `code`, then each model to escalate to."""
+        yield from self.tiers[self.choose(code):]
+
+    def should_escalate(self, validation: dict, model: str) -> bool:
+        """
+        Decide whether an answer from `model` is worth retrying one tier up.
+
+        Args:
+            validation: The `validate_documentation` result for the answer.
+            model: The model that produced it.
+
+        Returns:
+            True if a more capable tier exists and the score is too low.
+        """
+        if model == self.tiers[-1] or validation['score'] >= self.escalate_below:
+            return False
+        METRICS.count("escalations", model=model)
+        return True
+
+
+def route_documentation(code: str, router: ModelRouter, generate=None, **options) -> dict:
+    """
+    Document a function with the cheapest model that does it well.
+
+    Args:
+        code: The function source.
+        router: Chooses the models to try.
+        generate: Blocking generator; defaults to
+            `doc_generator.generate_documentation`.
+        **options: Passed to `generate` (e.g. cache, scheduler, client).
+
+    Returns:
+        The `documented` code, its `validation` and the `model` that wrote it.
+    """
+    import doc_generator
+    generate = generate or doc_generator.generate_documentation
+
+    for model in router.models(code):
+        documented = generate(code, model=model, **options)
+        validation = doc_generator.validate_documentation(documented)
+        if not router.should_escalate(validation, model):
+            break
+    return {'documented': documented, 'validation': validation, 'model': model}
+
+
+def estimate_cost(snapshot: dict | None = None) -> dict:
+    """
+    Price the tokens counted so far.
+
+    Args:
+        snapshot: A `Metrics.to_dict()` snapshot; defaults to `METRICS`.
+
+    Returns:
+        USD per model, for models listed in `PRICES`.
+    """
+    snapshot = snapshot or METRICS.to_dict()
+    costs = {}
+    for entry in snapshot['counters']:
+        price = PRICES.get(entry['model'])
+        if price is None or entry['name'] not in ('prompt_tokens', 'completion_tokens'):
+            continue
+        rate = price[0] if entry['name'] == 'prompt_tokens' else price[1]
+        costs[entry['model']] = costs.get(entry['model'], 0.0) + entry['value'] * rate / 1e6
+    return costs
+
+
+# =============================================================================
+# HEDGING
+# =============================================================================
+
+class LatencyTracker:
+    """
+    Rolling latency windows that set the hedging delay.
+
+    Windows are kept per key, normally a model and request size class, so a
+    large function's normal generation time is not mistaken for a stall.
+
+    Args:
+        quantile: Latency quantile after which a request is hedged.
+        window: Recent samples kept per model.
+        min_samples: Samples needed before hedging starts.
+        budget: Largest share of requests per key that may be hedged.
+    """
+
+    def __init__(self, quantile: float = HEDGE_QUANTILE, window: int = HEDGE_WINDOW,
+                 min_samples: int = HEDGE_MIN_SAMPLES, budget: float = HEDGE_BUDGET):
+        self.quantile = quantile
+        self.window = window
+        self.min_samples = min_samples
+        self.budget = budget
+        self._samples = {}
+        self._thresholds = {}
+        self._requests = {}
+        self._hedges = {}
+
+    def request(self, key) -> None:
+        """Count a request that may later be hedged."""
+        self._requests[key] = self._requests.get(key, 0) + 1
+
+    def allow_hedge(self, key) -> bool:
+        """Spend one hedge from the budget if any is left."""
+        hedges = self._hedges.get(key, 0)
+        if hedges + 1 > self.budget * self._requests.get(key, 0):
+            return False
+        self._hedges[key] = hedges + 1
+        return True
+
+    def observe(self, key, seconds: float) -> None:
+        """Record how long a completed attempt under `key` took."""
+        samples = self._samples.get(key)
+        if samples is None:
+            samples = self._samples[key] = deque(maxlen=self.window)
+        samples.append(seconds)
+        # Recomputed every few samples rather than sorting on every request
+        if len(samples) >= self.min_samples and len(samples) % 10 == 0:
+            ordered = sorted(samples)
+            self._thresholds[key] = ordered[min(len(ordered) - 1,
+                                                int(self.quantile * len(ordered)))]
+
+    def threshold(self, key) -> float | None:
+        """Seconds after which a request under `key` is hedged, or None while warming up."""
+        return self._thresholds.get(key)
+
+
+async def hedged(call, model: str, tracker: LatencyTracker, size: int | None = None):
+    """
+    Await `call()`, duplicating it if it outlasts the p95 latency of similar requests.
+
+    Args:
+        call: Zero-argument function returning a new awaitable request. It is
+            called again for the duplicate, which should therefore take its
+            own concurrency slot and rate limit budget.
+        model: Model the request goes to.
+        tracker: Latency history. Every completed attempt is recorded in it,
+            and a primary cancelled because its duplicate won is recorded at
+            the hedge trigger time: it took at least that long, and leaving
+            it out would let the slowest requests drop from the window.
+        size: Expected completion tokens (e.g. `max_tokens`); requests are
+            compared within power-of-two size classes.
+
+    Returns:
+        The first successful response.
+
+    Raises:
+        Exception: What an attempt raised, when every attempt failed.
+    """
+    key = (model, size.bit_length() if size else 0)
+
+    async def attempt():
+        start = time.perf_counter()
+        response = await call()
+        tracker.observe(key, time.perf_counter() - start)
+        return response
+
+    tracker.request(key)
+    start = time.perf_counter()
+    primary = asyncio.ensure_future(attempt())
+    pending = {primary}
+    trigger = None
+    try:
+        while True:
+            # Requests sent before the tracker warmed up re-check periodically
+            delay = tracker.threshold(key)
+            remaining = HEDGE_POLL if delay is None else delay - (time.perf_counter() - start)
+            if remaining <= 0:
+                if tracker.allow_hedge(key):
+                    METRICS.count("hedged_requests", model=model)
+                    trigger = time.perf_counter() - start
+                    pending.add(asyncio.ensure_future(attempt()))
+                break
+            done, _ = await asyncio.wait(pending, timeout=remaining)
+            if done:
+                break
+
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # Both attempts may finish in the same wait; any success beats a failure
+            succeeded = [task for task in done if task.exception() is None]
+            if succeeded:
+                winner = primary if primary in succeeded else succeeded[0]
+                if winner is not primary:
+                    METRICS.count("hedge_wins", model=model)
+                return winner.result()
+            if not pending:
+                raise (primary if primary in done else done.pop()).exception()
+    finally:
+        for task in pending:
+            task.cancel()
+            if task is primary and trigger is not None:
+                # Censored: the primary took at least as long as the hedge trigger
+                tracker.observe(key, trigger)
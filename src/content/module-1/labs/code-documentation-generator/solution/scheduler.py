@@ -0,0 +1,425 @@
+"""
+Rate-Limit-Aware Request Scheduler
+
+A shared scheduler for every LLM call in the lab tooling. At scale, naive
+concurrency trips the provider's limits and the resulting 429s waste both
+time and quota. The scheduler keeps sustained throughput just under the
+limits instead:
+
+- Token buckets for requests per minute and tokens per minute. Each
+  request's token cost is estimated from its prompt length up front and
+  corrected with the reported usage afterwards.
+- Shortest-job-first dispatch among waiting async requests, so small
+  functions are not stuck behind huge ones.
+- On a 429, every request pauses for the server's retry-after (or an
+  exponential backoff with jitter), and the request rate is halved. It
+  recovers gradually as requests succeed again.
+- Errors the SDK would retry itself (408, 409, 5xx and connection errors)
+  are retried with backoff for that request alone, without slowing the
+  others.
+
+Construct OpenAI clients with `max_retries=0` when using the scheduler, so
+retries are budgeted here rather than hidden inside the SDK; the engines and
+`doc_generator.py --rpm/--tpm` do so for the clients they build.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+
+from metrics import METRICS
+
+DEFAULT_RPM = 500
+DEFAULT_TPM = 150_000
+DEFAULT_MAX_RETRIES = 6
+
+# Never let adaptive backoff push the request rate below this share of the limit
+MIN_RATE_FACTOR = 0.1
+
+# Share of the configured rate regained after each successful request
+RECOVERY_STEP = 0.05
+
+# Statuses retried besides 429 and 5xx: request timeouts and lock conflicts
+TRANSIENT_STATUSES = (408, 409)
+
+
+class RateLimitExceeded(RuntimeError):
+    """Raised when a request is still rate limited after every retry."""
+
+
+# =============================================================================
+# TOKEN BUCKET
+# =============================================================================
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` units, refilled continuously.
+
+    Args:
+        capacity: Maximum burst size (one minute's worth for RPM/TPM limits).
+        per_second: Refill rate.
+    """
+
+    def __init__(self, capacity: float, per_second: float):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float | None = None) -> float:
+        """Seconds until `amount` units are available (0 if available now)."""
+        self._refill(time.monotonic() if now is None else now)
+        # A request larger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.per_second
+
+    def consume(self, amount: float) -> None:
+        """Take `amount` units; the level may go negative to record debt."""
+        self._refill(time.monotonic())
+        self.level -= amount
+
+    def refund(self, amount: float) -> None:
+        """Return units, e.g. when actual usage was below the estimate."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+# =============================================================================
+# SCHEDULER
+# =============================================================================
+
+class RateLimitScheduler:
+    """
+    Share request and token budgets between all LLM calls of a process.
+
+    Args:
+        rpm: Requests per minute allowed by the provider.
+        tpm: Tokens per minute allowed by the provider.
+        max_retries: Retries after a 429 or transient error before giving up.
+        base_delay: First backoff delay when the server sends no retry-after.
+        max_delay: Upper bound on any single backoff.
+        burst_seconds: How many seconds of budget may be spent at once.
+            Providers allow a full minute; lower values smooth traffic.
+
+    Example:
+        >>> scheduler = RateLimitScheduler(rpm=500, tpm=150_000)
+        >>> engine = AsyncDocumentationEngine(
+        ...     client=AsyncOpenAI(max_retries=0), scheduler=scheduler)
+        >>> documented = generate_documentation(code, scheduler=scheduler)
+    """
+
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 base_delay: float = 1.0, max_delay: float = 60.0,
+                 burst_seconds: float = 60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.requests = TokenBucket(rpm / 60 * burst_seconds, rpm / 60)
+        self.tokens = TokenBucket(tpm / 60 * burst_seconds, tpm / 60)
+        self.rate_factor = 1.0
+        self.paused_until = 0.0
+
+        self.stats = {'requests': 0, 'rate_limited': 0, 'transient_errors': 0, 'retries': 0,
+                      'waited': 0.0}
+
+        self._lock = threading.Lock()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._loop = None
+        self._wakeup = None
+        self._dispatcher = None
+
+    # -------------------------------------------------------------------------
+    # Budget accounting (shared by the sync and async paths)
+    # -------------------------------------------------------------------------
+
+    def _wait_time(self, cost: int) -> float:
+        """Seconds until a request of `cost` tokens may start."""
+        now = time.monotonic()
+        with self._lock:
+            return max(self.paused_until - now,
+                       self.requests.wait_time(1, now),
+                       self.tokens.wait_time(cost, now))
+
+    def _consume(self, cost: int) -> None:
+        with self._lock:
+            self.requests.consume(1)
+            self.tokens.consume(cost)
+            self.stats['requests'] += 1
+
+    def _record_success(self, estimated: int, response) -> None:
+        """Correct the token estimate and slowly restore the request rate."""
+        usage = getattr(response, 'usage', None)
+        with self._lock:
+            if usage is not None and getattr(usage, 'total_tokens', None) is not None:
+                self.tokens.refund(estimated - usage.total_tokens)
+            if self.rate_factor < 1.0:
+                self.rate_factor = min(1.0, self.rate_factor + RECOVERY_STEP)
+                self.requests.per_second = self.rpm / 60 * self.rate_factor
+
+    def _backoff(self, error: Exception, attempt: int) -> float:
+        """The server's retry-after, or exponential backoff with full jitter."""
+        delay = retry_after(error)
+        if delay is None:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return min(delay, self.max_delay)
+
+    def _record_transient(self, error: Exception, attempt: int) -> float:
+        """Count a transient failure and return this request's backoff delay."""
+        METRICS.count("transient_retries")
+        with self._lock:
+            self.stats['transient_errors'] += 1
+        return self._backoff(error, attempt)
+
+    def _record_rate_limit(self, error: Exception, attempt: int) -> float:
+        """Pause everyone, halve the request rate, and return the backoff delay."""
+        delay = self._backoff(error, attempt)
+
+        METRICS.count("rate_limit_retries")
+        with self._lock:
+            self.stats['rate_limited'] += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor / 2)
+            self.requests.per_second = self.rpm / 60 * self.rate_factor
+            # Drain the burst allowance so requests resume at the reduced rate
+            self.requests.level = min(self.requests.level, 1)
+        return delay
+
+    # -------------------------------------------------------------------------
+    # Sync path
+    # -------------------------------------------------------------------------
+
+    def call(self, request, estimated_tokens: int):
+        """
+        Run a blocking request within the budgets, retrying on 429 and transient errors.
+
+        Args:
+            request: Zero-argument callable performing the API call.
+            estimated_tokens: Estimated prompt plus completion tokens.
+
+        Returns:
+            The request's return value.
+
+        Raises:
+            RateLimitExceeded: If the request is still rate limited after
+                `max_retries` retries.
+            Exception: The request's own error if it is not retryable, or
+                still transient after `max_retries` retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            while (wait := self._wait_time(estimated_tokens)) > 0:
+                self.stats['waited'] += wait
+                time.sleep(wait)
+            self._consume(estimated_tokens)
+
+            try:
+                response = request()
+            except Exception as e:
+                if is_rate_limit(e):
+                    self._record_rate_limit(e, attempt)
+                elif is_transient(e) and attempt < self.max_retries:
+                    time.sleep(self._record_transient(e, attempt))
+                else:
+                    raise
+                self.stats['retries'] += 1
+                continue
+
+            self._record_success(estimated_tokens, response)
+            return response
+
+        raise RateLimitExceeded(f"Still rate limited after {self.max_retries} retries")
+
+    # -------------------------------------------------------------------------
+    # Async path
+    # -------------------------------------------------------------------------
+
+    async def run(self, request, estimated_tokens: int):
+        """
+        Run an async request within the budgets, retrying on 429 and transient errors.
+
+        Waiting requests are dispatched shortest first.
+
+        Args:
+            request: Zero-argument callable returning an awaitable API call.
+            estimated_tokens: Estimated prompt plus completion tokens.
+
+        Returns:
+            The request's result.
+
+        Raises:
+            RateLimitExceeded: If the request is still rate limited after
+                `max_retries` retries.
+            Exception: The request's own error if it is not retryable, or
+                still transient after `max_retries` retries.
+        """
+        for attempt in range(self.max_retries + 1):
+            await self._admit(estimated_tokens)
+            try:
+                response = await request()
+            except Exception as e:
+                if is_rate_limit(e):
+                    self._record_rate_limit(e, attempt)
+                elif is_transient(e) and attempt < self.max_retries:
+                    await asyncio.sleep(self._record_transient(e, attempt))
+                else:
+                    raise
+                self.stats['retries'] += 1
+                continue
+
+            self._record_success(estimated_tokens, response)
+            return response
+
+        raise RateLimitExceeded(f"Still rate limited after {self.max_retries} retries")
+
+    async def _admit(self, cost: int) -> None:
+        """Queue by cost and wait until the dispatcher grants this request."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # Queue state is bound to one event loop (e.g. one asyncio.run)
+            self._loop, self._heap = loop, []
+            self._wakeup, self._dispatcher = asyncio.Event(), None
+
+        granted = loop.create_future()
+        heapq.heappush(self._heap, (cost, next(self._sequence), granted))
+        self._wakeup.set()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = loop.create_task(self._dispatch())
+
+        await granted
+
+    async def _dispatch(self) -> None:
+        """Grant queued requests in cost order as the budgets allow."""
+        while self._heap:
+            cost, _, granted = self._heap[0]
+            if granted.cancelled():
+                heapq.heappop(self._heap)
+                continue
+
+            wait = self._wait_time(cost)
+            if wait > 0:
+                self.stats['waited'] += wait
+                # Wake early if a cheaper request arrives in the meantime
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            self._consume(cost)
+            granted.set_result(None)
+            # Let the granted request start before dispatching the next one
+            await asyncio.sleep(0)
+
+
+# =============================================================================
+# HELPERS
+# =============================================================================
+
+def _status_code(error: Exception) -> int | None:
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def is_rate_limit(error: Exception) -> bool:
+    """Return True for HTTP 429 errors from the OpenAI SDK or similar clients."""
+    return _status_code(error) == 429
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Return True for failures the OpenAI SDK would retry, other than 429.
+
+    These are 408, 409 and 5xx responses, and connection errors (the SDK's
+    `APIConnectionError`, including its own timeouts). A timeout imposed by
+    the caller, such as the engine's `asyncio.wait_for`, is not retried.
+    """
+    status = _status_code(error)
+    if status is not None:
+        return status in TRANSIENT_STATUSES or status >= 500
+    if isinstance(error, ConnectionError):
+        return True
+    try:
+        from openai import APIConnectionError
+    except ImportError:
+        return False
+    return isinstance(error, APIConnectionError)
+
+
+def retry_after(error: Exception) -> float | None:
+    """
+    Read the server's requested delay from a 429 response.
+
+    Understands `retry-after-ms`, `retry-after` in seconds, and OpenAI's
+    `x-ratelimit-reset-requests`/`x-ratelimit-reset-tokens` durations
+    such as "1s", "250ms" or "6m0s".
+
+    Returns:
+        Seconds to wait, or None if the response carries no hint.
+    """
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get('retry-after')
+    if value is not None:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+
+    resets = [_parse_duration(headers.get(name))
+              for name in ('x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens')]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+def _parse_duration(value: str | None) -> float | None:
+    if not value:
+        return None
+    parts = _DURATION_PATTERN.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+
+
+def create_scheduler(rpm: int | None = None, tpm: int | None = None) -> RateLimitScheduler | None:
+    """
+    Build a scheduler from command line limits.
+
+    Args:
+        rpm: Requests per minute, or None for `DEFAULT_RPM`.
+        tpm: Tokens per minute, or None for `DEFAULT_TPM`.
+
+    Returns:
+        A `RateLimitScheduler`, or None when neither limit is given.
+    """
+    if rpm is None and tpm is None:
+        return None
+    return RateLimitScheduler(rpm=rpm or DEFAULT_RPM, tpm=tpm or DEFAULT_TPM)
+
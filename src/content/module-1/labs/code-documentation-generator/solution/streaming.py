@@ -0,0 +1,341 @@
+"""
+Streaming Documentation Output
+
+Streams documented code token by token for editor integrations, where users
+watch the docs appear live. Markdown fences are stripped incrementally, and
+the signature line and docstring opening are checked as soon as they arrive
+so clearly malformed output (prose, missing docstring) is cancelled early
+instead of paying for the whole completion budget.
+
+Requests are sized with `token_budget.plan_request` like every other call
+site. A function too large for the model is trimmed first; its output is
+then held back and yielded in one piece, with the original body restored,
+once complete. The concatenated stream is always identical to what
+`generate_documentation` returns for the same completion.
+"""
+
+import io
+import re
+import tokenize
+
+import doc_generator
+from doc_generator import MAX_TOKENS, TEMPERATURE, build_messages, clean_code_output
+from token_budget import plan_request, restore_body
+
+OPENING_FENCE = "```python"
+
+# Characters that `clean_code_output` may remove from the end of the output
+_TRAILING_PATTERN = re.compile(r'[\s`]*\Z')
+
+# Valid first lines of a documented function
+_SIGNATURE_START = re.compile(r'(?:@|def\s|async\s+def\s|class\s)')
+
+# Lines the model may put before the function: imports for its annotations and comments
+_PREAMBLE_LINE = re.compile(r'(?:#|import\s|from\s+[\w.]+\s+import\s)')
+
+# Unfinished lines that may still turn into a preamble line
+_PREAMBLE_START = re.compile(r'(?:#|import|from)')
+
+# Tokens that carry no code
+_NON_CODE_TOKENS = {tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT,
+                    tokenize.DEDENT, tokenize.ENDMARKER}
+
+# A docstring opening, with an optional string prefix
+_DOCSTRING_START = re.compile(r'[rRuU]?("""|\'\'\')')
+
+
+class MalformedOutputError(ValueError):
+    """Raised when streamed output clearly is not a documented function."""
+
+
+# =============================================================================
+# INCREMENTAL CLEANUP
+# =============================================================================
+
+class FenceStripper:
+    """
+    Incremental equivalent of `clean_code_output`.
+
+    Leading whitespace and a ```` ```python ```` fence are dropped before any
+    text is emitted. Trailing whitespace and backticks are held back until
+    more code follows them, since they may belong to the closing fence.
+
+    Example:
+        >>> stripper = FenceStripper()
+        >>> stripper.feed("```python\\ndef f():") + stripper.feed(" pass\\n```")
+        'def f(): pass'
+        >>> stripper.finish()
+        ''
+    """
+
+    def __init__(self):
+        self.raw = []
+        self.emitted = 0
+        self.started = False
+        self.pending = ""
+
+    def feed(self, text: str) -> str:
+        """Accept the next chunk of raw output and return the text safe to emit."""
+        self.raw.append(text)
+        self.pending += text
+
+        if not self.started:
+            head = self.pending.lstrip()
+            if len(head) < len(OPENING_FENCE) and OPENING_FENCE.startswith(head):
+                return ""
+            if head.startswith(OPENING_FENCE):
+                head = head[len(OPENING_FENCE):]
+                if not head:
+                    return ""
+                head = head[1:] if head[0] == '\n' else head
+            head = head.lstrip()
+            if not head:
+                return ""
+            self.started = True
+            self.pending = head
+
+        cut = _TRAILING_PATTERN.search(self.pending).start()
+        ready, self.pending = self.pending[:cut], self.pending[cut:]
+        self.emitted += len(ready)
+        return ready
+
+    def finish(self) -> str:
+        """Return whatever remains once the stream has ended."""
+        cleaned = clean_code_output(''.join(self.raw))
+        return cleaned[self.emitted:]
+
+
+class StreamValidator:
+    """
+    Check the structure of streamed code as early as possible.
+
+    After any leading imports, comments and blank lines, the first line must
+    start a function definition (a decorator, `def`, `async def` or an
+    enclosing `class`), and the first statement after the function
+    signature must open a docstring. Call `finish` when the stream ends, so
+    output that stops before reaching a docstring is rejected too.
+
+    Raises:
+        MalformedOutputError: From `feed` as soon as either check fails, or
+            from `finish` if the output ended before both passed.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.checked_start = False
+        self.docstring_checked = False
+        self.scan_from = 0
+        self.in_import = False
+        self.depth = 0
+        self.in_signature = False
+        self.signature_done = False
+
+    def feed(self, text: str) -> None:
+        """Validate the cleaned text received so far."""
+        if self.docstring_checked:
+            return
+        self.text += text
+
+        if not self.checked_start and not self._check_start():
+            return
+
+        self._scan_lines()
+
+    def finish(self) -> None:
+        """Give the verdict on the complete output, once the stream has ended."""
+        if self.docstring_checked:
+            return
+        # The last line is complete now
+        self.feed('\n')
+        if not self.checked_start:
+            raise MalformedOutputError("Output does not contain a function definition")
+        if not self.signature_done:
+            raise MalformedOutputError("Output ends inside the function signature")
+        if not self.docstring_checked:
+            raise MalformedOutputError("Output ends before the function's docstring")
+
+    def _check_start(self) -> bool:
+        """Skip leading imports, comments and blank lines; check the line after them."""
+        while True:
+            end = self.text.find('\n', self.scan_from)
+            line = self.text[self.scan_from:] if end == -1 else self.text[self.scan_from:end]
+            stripped = line.strip()
+
+            if end == -1 and (self.in_import or len(stripped) < 10
+                              or _PREAMBLE_START.match(stripped)):
+                # Wait for the rest of the line
+                return False
+            if self.in_import:
+                # Inside `from module import (...)`
+                self.in_import = ')' not in stripped
+            elif not stripped or _PREAMBLE_LINE.match(stripped):
+                self.in_import = (not stripped.startswith('#') and '(' in stripped
+                                  and ')' not in stripped)
+            elif not _SIGNATURE_START.match(stripped):
+                raise MalformedOutputError(
+                    f"Output does not start with a function definition: {stripped[:40]!r}"
+                )
+            else:
+                self.checked_start = True
+                return True
+            self.scan_from = end + 1
+
+    def _scan_lines(self) -> None:
+        """Walk complete lines to find the signature end and the docstring."""
+        while True:
+            end = self.text.find('\n', self.scan_from)
+            line = self.text[self.scan_from:] if end == -1 else self.text[self.scan_from:end]
+            stripped = line.strip()
+
+            if self.signature_done:
+                if not stripped or stripped.startswith('#'):
+                    # Blank and comment lines may come before the docstring
+                    if end == -1:
+                        return
+                elif len(stripped) >= 4 or end != -1:
+                    if not _DOCSTRING_START.match(stripped):
+                        raise MalformedOutputError(
+                            "Function body does not start with a docstring"
+                        )
+                    self.docstring_checked = True
+                    return
+                else:
+                    return
+            elif end == -1:
+                return
+            else:
+                self._signature_line(stripped)
+
+            self.scan_from = end + 1
+
+    def _signature_line(self, stripped: str) -> None:
+        """Track brackets across a (possibly multi-line) signature."""
+        if not self.in_signature:
+            if not re.match(r'(?:async\s+)?def\s', stripped):
+                return
+            self.in_signature = True
+
+        # Tokenized, so brackets in defaults and trailing comments are not mistaken for code
+        tokens = _code_tokens(stripped)
+        self.depth += sum(token in ('(', '[', '{') for token in tokens) \
+            - sum(token in (')', ']', '}') for token in tokens)
+        if self.depth > 0:
+            return
+        if tokens and tokens[-1] == ':':
+            self.signature_done = True
+        else:
+            raise MalformedOutputError("Function body is on the signature line")
+
+
+def _code_tokens(line: str) -> list[str]:
+    """The code tokens of one line, without comments; a line of a longer statement is fine."""
+    tokens = []
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(line).readline):
+            if token.type not in _NON_CODE_TOKENS:
+                tokens.append(token.string)
+    except tokenize.TokenError:
+        # The line ends inside brackets or a string: keep the tokens before that
+        pass
+    return tokens
+
+
+# =============================================================================
+# STREAMING GENERATION
+# =============================================================================
+
+def stream_documentation(code: str, model: str = "gpt-4-turbo", cache=None,
+                         validate: bool = True, scheduler=None, client=None):
+    """
+    Generate documentation for a function, yielding text as it arrives.
+
+    Args:
+        code: The Python function source code as a string.
+        model: The OpenAI model to use for generation. Defaults to "gpt-4-turbo".
+        cache: Optional `DocumentationCache`. A hit is yielded in one piece,
+            and complete streams are stored in it.
+        validate: Cancel the request as soon as the output is clearly not a
+            documented function.
+        scheduler: Optional `RateLimitScheduler` that admits the request and
+            retries it on rate limit errors.
+        client: OpenAI-compatible client. Defaults to the module client.
+
+    Yields:
+        Chunks of documented code with markdown fences removed; a trimmed
+        function is yielded in one piece once complete.
+
+    Raises:
+        ValueError: If the provided code is empty.
+        MalformedOutputError: If validation fails; the request is cancelled.
+        token_budget.PromptTooLarge: If the function cannot be trimmed to
+            fit the model's context window.
+
+    Example:
+        >>> for chunk in stream_documentation("def add(a, b): return a + b"):
+        ...     print(chunk, end="", flush=True)
+    """
+    if not code or not code.strip():
+        raise ValueError("Code cannot be empty")
+
+    if cache is not None:
+        cached = cache.get(code, model, TEMPERATURE, MAX_TOKENS)
+        if cached is not None:
+            yield cached
+            return
+
+    plan = plan_request(code, model)
+    messages = build_messages(plan['code'])
+    client = client or doc_generator.get_client()
+
+    def request():
+        return client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=TEMPERATURE,
+            max_tokens=plan['max_tokens'],
+            stream=True
+        )
+
+    if scheduler is None:
+        stream = request()
+    else:
+        stream = scheduler.call(request, plan['prompt_tokens'] + plan['max_tokens'])
+
+    stripper = FenceStripper()
+    validator = StreamValidator() if validate else None
+    # A trimmed function's output is still validated as it arrives, but only
+    # yielded once its original body can be restored
+    live = not plan['trimmed']
+    try:
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            ready = stripper.feed(text)
+            if ready:
+                if validator:
+                    validator.feed(ready)
+                if live:
+                    yield ready
+
+        rest = stripper.finish()
+        if validator:
+            if rest:
+                validator.feed(rest)
+            validator.finish()
+        if rest and live:
+            yield rest
+    finally:
+        # Closing the response stops token generation on early exit
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+
+    result = clean_code_output(''.join(stripper.raw))
+    if not live:
+        result = restore_body(code, result)
+        yield result
+    if cache is not None:
+        cache.put(code, model, TEMPERATURE, MAX_TOKENS, result)
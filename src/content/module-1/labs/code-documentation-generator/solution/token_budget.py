@@ -0,0 +1,395 @@
+"""
+Token Budgeting
+
+Sizes every documentation request before it is sent. A fixed
+`max_tokens=2000` over-reserves output for small functions (which counts
+against TPM limits) and truncates large ones, while huge functions blow the
+context window and only fail after a long round-trip. Here:
+
+- Tokens are counted locally with the model's tiktoken encoding when
+  tiktoken is installed (the encoder is loaded once per model), falling back
+  to the four-characters-per-token estimate.
+- `max_tokens` is sized from the function: the documented function repeats
+  the code and adds a docstring and type hints.
+- Functions too large for the model are shrunk before the call: long
+  literals are elided first, then the deepest blocks are collapsed to `...`
+  while control flow headers and `raise` statements are kept. The model
+  documents the trimmed function and its signature and docstring are
+  spliced back onto the original body.
+- Functions that cannot be shrunk enough are rejected with `PromptTooLarge`.
+
+Example:
+    >>> plan = plan_request(code, "gpt-4-turbo")
+    >>> plan['max_tokens'], plan['trimmed']
+    (612, False)
+"""
+
+import ast
+import copy
+import textwrap
+from functools import lru_cache
+
+from doc_generator import SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, estimate_tokens
+
+# Context window per model family (prompt plus completion)
+CONTEXT_WINDOWS = {
+    'gpt-4-turbo': 128_000,
+    'gpt-4o': 128_000,
+    'gpt-4o-mini': 128_000,
+    'gpt-4': 8_192,
+    'gpt-3.5-turbo': 16_385,
+}
+DEFAULT_CONTEXT_WINDOW = 8_192
+
+# Largest completion each model will produce
+MAX_OUTPUT_TOKENS = {
+    'gpt-4-turbo': 4_096,
+    'gpt-4o': 16_384,
+    'gpt-4o-mini': 16_384,
+    'gpt-4': 8_192,
+    'gpt-3.5-turbo': 4_096,
+}
+DEFAULT_MAX_OUTPUT_TOKENS = 4_096
+
+# Functions above this many tokens are trimmed even if the window allows
+# them, to keep the cost of a single request bounded
+MAX_INPUT_TOKENS = 6_000
+
+# Completion sizing: the documented function repeats the code (plus type
+# hints) and adds a docstring
+OUTPUT_GROWTH = 1.2
+DOCSTRING_ALLOWANCE = 400
+MIN_COMPLETION_TOKENS = 256
+
+# Literal elision thresholds
+MAX_LITERAL_CHARS = 200
+MAX_LITERAL_ITEMS = 8
+
+
+class PromptTooLarge(ValueError):
+    """Raised when a function cannot be shrunk to fit the model's budget."""
+
+
+# =============================================================================
+# COUNTING
+# =============================================================================
+
+@lru_cache(maxsize=None)
+def get_encoder(model: str):
+    """
+    Load the tiktoken encoding for a model once.
+
+    Returns:
+        The encoding, or None if tiktoken is not installed or its encoding
+        files cannot be loaded (e.g. offline without a tiktoken cache).
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4-turbo") -> int:
+    """Count tokens with the model's encoding, or estimate them without one."""
+    encoder = get_encoder(model)
+    if encoder is None:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=None)
+def prompt_overhead(model: str) -> int:
+    """Tokens used by the prompt templates and chat framing, excluding the code."""
+    framing = 4 * 2 + 3  # per-message and reply priming tokens
+    return count_tokens(SYSTEM_PROMPT, model) + \
+        count_tokens(USER_PROMPT_TEMPLATE.format(code=""), model) + framing
+
+
+def completion_budget(code_tokens: int, model: str = "gpt-4-turbo") -> int:
+    """
+    Size `max_tokens` for documenting a function of `code_tokens` tokens.
+
+    Returns:
+        The completion budget, capped at the model's output limit.
+    """
+    needed = max(MIN_COMPLETION_TOKENS, int(code_tokens * OUTPUT_GROWTH) + DOCSTRING_ALLOWANCE)
+    return min(needed, MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS))
+
+
+def input_limit(model: str = "gpt-4-turbo", max_input_tokens: int = MAX_INPUT_TOKENS) -> int:
+    """Largest function, in tokens, that can be documented without truncation."""
+    window = CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+    max_output = MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS)
+    by_window = (window - prompt_overhead(model) - DOCSTRING_ALLOWANCE) / (1 + OUTPUT_GROWTH)
+    by_output = (max_output - DOCSTRING_ALLOWANCE) / OUTPUT_GROWTH
+    return int(min(max_input_tokens, by_window, by_output))
+
+
+# =============================================================================
+# PLANNING
+# =============================================================================
+
+def plan_request(code: str, model: str = "gpt-4-turbo",
+                 max_input_tokens: int = MAX_INPUT_TOKENS) -> dict:
+    """
+    Decide what to send for one function and how much output to reserve.
+
+    Args:
+        code: The Python function source code.
+        model: The model the request goes to.
+        max_input_tokens: Cost cap on the function size in tokens.
+
+    Returns:
+        A dictionary with the code to send, its token count, the prompt
+        token count, max_tokens, and whether the code was trimmed.
+
+    Raises:
+        PromptTooLarge: If the function cannot be trimmed below the limit.
+    """
+    limit = input_limit(model, max_input_tokens)
+    code_tokens = count_tokens(code, model)
+    trimmed = False
+
+    if code_tokens > limit:
+        code = trim_source(code, limit, model)
+        code_tokens = count_tokens(code, model)
+        trimmed = True
+
+    return {
+        'code': code,
+        'code_tokens': code_tokens,
+        'prompt_tokens': prompt_overhead(model) + code_tokens,
+        'max_tokens': completion_budget(code_tokens, model),
+        'trimmed': trimmed,
+    }
+
+
+def estimate_budget(sources: list[str], model: str = "gpt-4-turbo",
+                    max_input_tokens: int = MAX_INPUT_TOKENS) -> dict:
+    """
+    Budget a batch of functions ahead of time without calling the model.
+
+    Returns:
+        Totals of prompt tokens and reserved completion tokens, plus the
+        number of functions that would be trimmed or rejected.
+    """
+    totals = {'functions': len(sources), 'prompt_tokens': 0, 'max_completion_tokens': 0,
+              'trimmed': 0, 'rejected': 0}
+    for code in sources:
+        try:
+            plan = plan_request(code, model, max_input_tokens)
+        except PromptTooLarge:
+            totals['rejected'] += 1
+            continue
+        totals['prompt_tokens'] += plan['prompt_tokens']
+        totals['max_completion_tokens'] += plan['max_tokens']
+        totals['trimmed'] += plan['trimmed']
+    return totals
+
+
+# =============================================================================
+# TRIMMING
+# =============================================================================
+
+def trim_source(code: str, limit: int, model: str = "gpt-4-turbo") -> str:
+    """
+    Shrink a function to at most `limit` tokens, keeping what documentation needs.
+
+    Long literals are elided first; then blocks are collapsed from the
+    deepest level up. The signature, any existing docstring, control flow
+    down to the remaining depth and all `raise` statements survive.
+
+    Raises:
+        PromptTooLarge: If even the bare signature exceeds the limit, or the
+            code cannot be parsed.
+    """
+    try:
+        tree = ast.parse(textwrap.dedent(code))
+    except SyntaxError as e:
+        raise PromptTooLarge(f"Cannot trim unparsable code: {e}") from e
+
+    tree = _LiteralElider().visit(tree)
+    trimmed = ast.unparse(tree)
+    if count_tokens(trimmed, model) <= limit:
+        return trimmed
+
+    for depth in range(_depth(tree), -1, -1):
+        trimmed = ast.unparse(_BlockCollapser(depth).visit(copy.deepcopy(tree)))
+        if count_tokens(trimmed, model) <= limit:
+            return trimmed
+
+    raise PromptTooLarge(f"Function needs more than {limit} tokens even with its body elided")
+
+
+class _LiteralElider(ast.NodeTransformer):
+    """Replace long strings and big container literals with short placeholders (not docstrings)."""
+
+    def __init__(self):
+        self.docstrings = set()
+
+    def _visit_docstring_owner(self, node):
+        self.docstrings.update(id(stmt.value) for stmt in _docstring_stmt(node.body))
+        return self.generic_visit(node)
+
+    visit_Module = visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = \
+        _visit_docstring_owner
+
+    def visit_Constant(self, node):
+        if id(node) in self.docstrings:
+            return node
+        if isinstance(node.value, str) and len(node.value) > MAX_LITERAL_CHARS:
+            return ast.copy_location(ast.Constant(node.value[:40] + '...'), node)
+        if isinstance(node.value, bytes) and len(node.value) > MAX_LITERAL_CHARS:
+            return ast.copy_location(ast.Constant(node.value[:40] + b'...'), node)
+        return node
+
+    def _shorten(self, node, field: str):
+        self.generic_visit(node)
+        items = getattr(node, field)
+        if len(items) > MAX_LITERAL_ITEMS:
+            setattr(node, field, items[:3] + [ast.Constant(...)])
+        return node
+
+    def visit_List(self, node):
+        return self._shorten(node, 'elts')
+
+    def visit_Tuple(self, node):
+        return self._shorten(node, 'elts')
+
+    def visit_Set(self, node):
+        return self._shorten(node, 'elts')
+
+    def visit_Dict(self, node):
+        self.generic_visit(node)
+        if len(node.keys) > MAX_LITERAL_ITEMS:
+            node.keys = node.keys[:3] + [ast.Constant(...)]
+            node.values = node.values[:3] + [ast.Constant(...)]
+        return node
+
+
+_BLOCK_FIELDS = ('body', 'orelse', 'finalbody')
+
+
+class _BlockCollapser(ast.NodeTransformer):
+    """Collapse statement blocks nested deeper than `max_depth` into `...` plus their raises."""
+
+    def __init__(self, max_depth: int):
+        self.max_depth = max_depth
+        self.depth = -1
+
+    def _visit_block_owner(self, node):
+        self.depth += 1
+        for field in _BLOCK_FIELDS:
+            block = getattr(node, field, None)
+            if block:
+                setattr(node, field, self._block(block))
+        if isinstance(node, ast.Try):
+            for handler in node.handlers:
+                handler.body = self._block(handler.body)
+        elif isinstance(node, ast.Match):
+            for case in node.cases:
+                case.body = self._block(case.body)
+        self.depth -= 1
+        return node
+
+    def _block(self, block: list) -> list:
+        docstring = _docstring_stmt(block)
+        if self.depth >= self.max_depth:
+            raises = []
+            for stmt in block:
+                for child in ast.walk(stmt):
+                    if isinstance(child, ast.Raise) and len(raises) < 5 and \
+                            ast.dump(child) not in {ast.dump(r) for r in raises}:
+                        raises.append(child)
+            return docstring + [ast.Expr(ast.Constant(...))] + raises
+        return [self.visit(stmt) for stmt in block]
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_ClassDef = _visit_block_owner
+    visit_If = visit_For = visit_AsyncFor = visit_While = _visit_block_owner
+    visit_With = visit_AsyncWith = visit_Try = visit_Match = _visit_block_owner
+    visit_TryStar = _visit_block_owner
+
+
+def _docstring_stmt(block: list) -> list:
+    first = block[0] if block else None
+    if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) \
+            and isinstance(first.value.value, str):
+        return [first]
+    return []
+
+
+def _depth(tree: ast.AST) -> int:
+    """Deepest nesting of statement blocks below the module."""
+    def walk(node, depth):
+        deepest = depth
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.stmt) and any(getattr(child, f, None)
+                                                   for f in _BLOCK_FIELDS + ('handlers', 'cases')):
+                deepest = max(deepest, walk(child, depth + 1))
+            else:
+                deepest = max(deepest, walk(child, depth))
+        return deepest
+    return walk(tree, -1)
+
+
+# =============================================================================
+# SPLICING
+# =============================================================================
+
+def restore_body(original: str, documented: str) -> str:
+    """
+    Put the original body back under a documented (trimmed) function's signature and docstring.
+
+    Args:
+        original: The full, untrimmed function source.
+        documented: The model's documentation of the trimmed function.
+
+    Returns:
+        The documented signature and docstring followed by the original body,
+        or `documented` unchanged if either side cannot be parsed.
+    """
+    try:
+        doc_func = _first_function(ast.parse(documented))
+        orig_func = _first_function(ast.parse(textwrap.dedent(original)))
+    except SyntaxError:
+        return documented
+    if doc_func is None or orig_func is None:
+        return documented
+
+    doc_lines = documented.splitlines(keepends=True)
+    orig_lines = textwrap.dedent(original).splitlines(keepends=True)
+
+    docstring = _docstring_stmt(doc_func.body)
+    body = orig_func.body[len(_docstring_stmt(orig_func.body)):]
+    if not body or body[0].lineno == orig_func.lineno:
+        return documented
+
+    start = (doc_func.decorator_list[0].lineno if doc_func.decorator_list else doc_func.lineno) - 1
+    end = (docstring[0].end_lineno if docstring else doc_func.body[0].lineno - 1)
+    header = doc_lines[start:end]
+
+    if docstring:
+        # Re-indent the docstring to the original body's indentation
+        line = orig_lines[body[0].lineno - 1]
+        indent = line[:len(line) - len(line.lstrip())]
+        doc_indent = ' ' * docstring[0].col_offset
+        first = docstring[0].lineno - 1 - start
+        header[first:] = [indent + text[len(doc_indent):] if text.startswith(doc_indent) else text
+                          for text in header[first:]]
+
+    result = ''.join(header + orig_lines[body[0].lineno - 1:orig_func.end_lineno])
+    return result.rstrip('\n')
+
+
+def _first_function(tree: ast.Module):
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return node
+    return None
@@ -0,0 +1,157 @@
+"""
+Documentation Triage
+
+A local pre-pass that decides which functions are worth a model call. Every
+function's existing docstring and annotations are scored on the AST with the
+same checks and penalties as `validate_documentation`, without reparsing and
+without touching the network:
+
+- Functions that already pass validation with at least `min_score` are
+  skipped; on a mature codebase that is most of them.
+- The rest are queued by priority: public API first (no `_private` name in
+  the qualified name and not nested inside another function), then by
+  cyclomatic complexity, most complex first, then in source order.
+
+`check_files` uses the same scoring as a validate-only pass, e.g. in a
+pre-commit hook: it never imports a model SDK.
+
+Example:
+    >>> queue, skipped = triage_file("service.py", min_score=90)
+    >>> [item['name'] for item in queue[:3]]
+    ['Client.request', 'Client.retry', 'parse_response']
+"""
+
+import ast
+
+from doc_generator import assess_function
+from extractor import discover_files, iter_file_nodes
+from metrics import METRICS
+
+# Default cutoff: every required check passes, at most the Raises and
+# Example suggestions are missing
+DEFAULT_MIN_SCORE = 90
+
+# Nodes that add a decision point to a function's control flow
+_BRANCH_TYPES = (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler,
+                 ast.With, ast.AsyncWith, ast.Assert, ast.comprehension, ast.match_case)
+
+_SCOPE_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+
+
+def complexity(func: ast.AST) -> int:
+    """
+    Cyclomatic complexity of a function, not counting nested definitions.
+
+    Args:
+        func: A `FunctionDef` or `AsyncFunctionDef` node.
+
+    Returns:
+        One plus the number of decision points in the function's own body.
+    """
+    score = 1
+    stack = list(func.body)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, _BRANCH_TYPES):
+            score += 1
+            if isinstance(node, ast.comprehension):
+                score += len(node.ifs)
+        elif isinstance(node, ast.BoolOp):
+            score += len(node.values) - 1
+        if not isinstance(node, _SCOPE_TYPES):
+            stack.extend(ast.iter_child_nodes(node))
+    return score
+
+
+def is_public(qualname: str) -> bool:
+    """Return True unless some part of the name is `_private` (dunders are public)."""
+    return not any(part.startswith('_') and not part.endswith('__')
+                   for part in qualname.split('.'))
+
+
+def should_skip(assessment: dict, min_score: int | None) -> bool:
+    """Return True if existing documentation is good enough to skip the model call."""
+    return min_score is not None and assessment['valid'] and assessment['score'] >= min_score
+
+
+def triage_nodes(functions,
+                 min_score: int | None = DEFAULT_MIN_SCORE) -> tuple[list[dict], list[dict]]:
+    """
+    Score functions locally and split them into a work queue and a skip list.
+
+    Args:
+        functions: (qualified name, function node, function source) tuples
+            in source order, as yielded by `extractor.iter_file_nodes`.
+        min_score: Skip functions whose existing documentation passes
+            validation with at least this score; None queues everything.
+
+    Returns:
+        A (queue, skipped) tuple. Each item has `name`, `source`,
+        `assessment` (the local validation result), `public` and
+        `complexity`; the queue is in priority order, the skip list in
+        source order.
+    """
+    queue, skipped = [], []
+    function_names = set()
+
+    for index, (qualname, node, source) in enumerate(functions):
+        with METRICS.timer("triage"):
+            # Functions come in source order, so an enclosing function is
+            # always seen before anything nested inside it
+            nested = qualname.rpartition('.')[0] in function_names
+            function_names.add(qualname)
+            item = {
+                'name': qualname,
+                'source': source,
+                'assessment': assess_function(node),
+                'public': is_public(qualname) and not nested,
+                'complexity': complexity(node),
+                'index': index,
+            }
+
+        if should_skip(item['assessment'], min_score):
+            METRICS.count("functions_skipped")
+            skipped.append(item)
+        else:
+            queue.append(item)
+
+    queue.sort(key=lambda item: (not item['public'], -item['complexity'], item['index']))
+    return queue, skipped
+
+
+def triage_file(path: str,
+                min_score: int | None = DEFAULT_MIN_SCORE) -> tuple[list[dict], list[dict]]:
+    """
+    Triage every function in a file (see `triage_nodes`).
+
+    Raises:
+        SyntaxError: If the file is not valid Python.
+    """
+    return triage_nodes(iter_file_nodes(path), min_score)
+
+
+def check_files(targets: list[str], min_score: int = DEFAULT_MIN_SCORE) -> list[dict]:
+    """
+    Find functions whose existing documentation scores below `min_score`.
+
+    Args:
+        targets: File paths, directory paths or glob patterns.
+        min_score: Lowest passing validation score.
+
+    Returns:
+        One entry per failing function, in file and source order, with
+        `path`, `name`, `score` and `issues`; a file that does not parse is
+        reported once with name None.
+    """
+    failures = []
+    for path in discover_files(targets):
+        try:
+            queue, _ = triage_file(path, min_score)
+        except (SyntaxError, ValueError, OSError) as e:
+            failures.append({'path': path, 'name': None, 'score': 0, 'issues': [str(e)]})
+            continue
+        for item in sorted(queue, key=lambda item: item['index']):
+            failures.append({'path': path, 'name': item['name'],
+                             'score': item['assessment']['score'],
+                             'issues': item['assessment']['issues']})
+    return failures
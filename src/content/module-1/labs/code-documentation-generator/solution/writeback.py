@@ -0,0 +1,633 @@
+"""
+Docstring Write-Back
+
+Applies generated documentation to source files in place. Replacing whole
+functions would also apply anything the model changed in the code itself,
+so only these spans are patched, at the byte offsets the extractor's AST
+gives for the original file:
+
+- the docstring literal, replaced or inserted as the first statement
+- each parameter the model annotated that had no annotation
+- the return annotation, when the function had none
+
+Annotations may only use names the file can resolve: builtins, names bound
+at module level before the function and `typing` names, for which an import
+is added. Names bound later in the file or only under `if TYPE_CHECKING:`
+are written as a string annotation, unless the file already has
+`from __future__ import annotations`. Any other annotation is left out
+rather than risk a NameError at import time.
+
+Every file is read and parsed exactly once. The extraction pass that feeds
+triage (see `triage.py`) also records a few offsets per function, so no
+syntax tree is kept while requests are in flight. All edits to a file are
+applied to its buffer together and written with one atomic replace, and a
+unified diff of each file is emitted for review.
+
+Usage:
+    python writeback.py src/ --diff          # print the diff, change nothing
+    python writeback.py src/ --min-score 90  # patch files, skipping documented functions
+"""
+
+import ast
+import asyncio
+import builtins
+import difflib
+import io
+import os
+import sys
+import tempfile
+import textwrap
+import tokenize
+import typing
+
+from async_engine import AsyncDocumentationEngine, run_engine
+from extractor import discover_files, iter_buffer_chunks, iter_qualified, line_offsets
+from metrics import METRICS
+from triage import triage_nodes
+
+_FUNCTION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef)
+_SCOPE_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+
+_BUILTIN_NAMES = frozenset(dir(builtins))
+_TYPING_NAMES = frozenset(typing.__all__)
+
+# Files patched concurrently; requests are limited by the engine's concurrency
+DEFAULT_FILE_CONCURRENCY = 8
+
+
+# =============================================================================
+# SCANNING
+# =============================================================================
+
+def scan_buffer(buffer: bytes,
+                min_score: int | None = None) -> tuple[list, list, list[dict], dict]:
+    """
+    Triage a file's functions and record where their edits would go.
+
+    Args:
+        buffer: The file contents.
+        min_score: Skip functions already documented with at least this score.
+
+    Returns:
+        A (queue, skipped, spans, module) tuple: the triage queue and skip
+        list (see `triage.triage_nodes`), the spans of every function,
+        indexed by each triage item's `index`, and the module-level facts
+        from `_module_statement` used to resolve annotations.
+    """
+    spans = []
+    module = {'names': {}, 'type_names': set(), 'star_import': False,
+              'future_annotations': False, 'header': True, 'import_end': None,
+              'typing_import_end': None}
+
+    def functions():
+        for tree, locate in iter_buffer_chunks(buffer):
+            for statement in tree.body:
+                _module_statement(statement, locate, module)
+            for qualname, node in iter_qualified(tree.body, []):
+                spans.append(function_spans(node, locate, buffer))
+                start, end = spans[-1]['start'], spans[-1]['end']
+                yield qualname, node, buffer[start:end].decode('utf-8')
+
+    queue, skipped = triage_nodes(functions(), min_score)
+    return queue, skipped, spans, module
+
+
+def _module_statement(statement: ast.stmt, locate, module: dict) -> None:
+    """
+    Record the names a top-level statement binds and where imports can go.
+
+    `module['names']` maps each name bound at runtime to the offset where
+    the first statement binding it ends; names bound only under
+    `if TYPE_CHECKING:` go to `module['type_names']` instead.
+    """
+    bound_at = locate(statement.end_lineno, statement.end_col_offset)
+    stack = [(statement, False)]
+    while stack:
+        node, type_only = stack.pop()
+        names = []
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == '*':
+                    module['star_import'] = True
+                else:
+                    names.append(alias.asname or alias.name.split('.')[0])
+            if (isinstance(node, ast.ImportFrom) and node.module == '__future__'
+                    and any(alias.name == 'annotations' for alias in node.names)):
+                module['future_annotations'] = True
+        elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            names.append(node.id)
+        elif isinstance(node, _SCOPE_TYPES) and not isinstance(node, ast.Lambda):
+            names.append(node.name)
+        for name in names:
+            if type_only:
+                module['type_names'].add(name)
+            else:
+                module['names'].setdefault(name, bound_at)
+        if isinstance(node, _SCOPE_TYPES):
+            continue
+        if isinstance(node, ast.If) and _is_type_checking(node.test):
+            stack.extend((child, True) for child in node.body)
+            stack.extend((child, type_only) for child in node.orelse)
+            continue
+        stack.extend((child, type_only) for child in ast.iter_child_nodes(node))
+
+    # Imports are added after the leading block of imports (and docstring)
+    is_import = isinstance(statement, (ast.Import, ast.ImportFrom))
+    is_docstring = (isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant)
+                    and isinstance(statement.value.value, str))
+    if module['header'] and (is_import or is_docstring):
+        module['import_end'] = locate(statement.end_lineno, statement.end_col_offset)
+    else:
+        module['header'] = False
+
+    if (isinstance(statement, ast.ImportFrom) and statement.module == 'typing'
+            and statement.level == 0 and statement.lineno == statement.end_lineno
+            and module['typing_import_end'] is None):
+        module['typing_import_end'] = locate(statement.end_lineno, statement.end_col_offset)
+
+
+def _is_type_checking(test: ast.expr) -> bool:
+    """Whether an `if` test is `TYPE_CHECKING` or `typing.TYPE_CHECKING`."""
+    if isinstance(test, ast.Attribute):
+        return test.attr == 'TYPE_CHECKING'
+    return isinstance(test, ast.Name) and test.id == 'TYPE_CHECKING'
+
+
+def function_spans(func: ast.AST, locate, buffer: bytes) -> dict:
+    """
+    Record the offsets needed to patch one function's documentation.
+
+    Args:
+        func: The function node.
+        locate: Maps the node's (lineno, col_offset) positions to buffer offsets.
+        buffer: The file contents.
+
+    Returns:
+        The function's `name` and absolute byte offsets: its `start` and
+        `end`, its `body` start, the existing `docstring` literal span (or
+        None) and every parameter's name `end` and default start, plus the
+        body `indent` and whether it already has a return annotation.
+    """
+    first = func.body[0]
+    body = locate(first.lineno, first.col_offset)
+    indent = buffer[locate(first.lineno, 0):body]
+    # A body on the signature's line (`def f(): return 1`) has no indentation of its own
+    inline = bool(indent.strip())
+    if inline:
+        indent = buffer[locate(func.lineno, 0):locate(func.lineno, func.col_offset)] + b'    '
+
+    docstring = None
+    if (isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant)
+            and isinstance(first.value.value, str)):
+        docstring = (body, locate(first.end_lineno, first.end_col_offset))
+
+    args = func.args
+    positional = [*args.posonlyargs, *args.args]
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    params = {}
+    for arg, default in [*zip(positional, defaults), *zip(args.kwonlyargs, args.kw_defaults),
+                         *((arg, None) for arg in (args.vararg, args.kwarg) if arg is not None)]:
+        params[arg.arg] = {
+            'end': locate(arg.end_lineno, arg.end_col_offset),
+            'annotated': arg.annotation is not None,
+            'default': locate(default.lineno, default.col_offset) if default is not None else None,
+        }
+
+    return {
+        'name': func.name,
+        'start': locate(func.lineno, func.col_offset),
+        'end': locate(func.end_lineno, func.end_col_offset),
+        'body': body,
+        'inline': inline,
+        'indent': indent,
+        'docstring': docstring,
+        'params': params,
+        'returns': func.returns is not None,
+    }
+
+
+# =============================================================================
+# EDITS
+# =============================================================================
+
+def plan_edits(buffer: bytes, spans: dict, documented: str,
+               module: dict) -> tuple[list[tuple[int, int, bytes]], set[str]]:
+    """
+    Compute the docstring and annotation edits for one function.
+
+    Args:
+        buffer: The original file contents.
+        spans: The function's spans from `function_spans`.
+        documented: The documented function returned by the model.
+        module: Module-level facts from `scan_buffer`.
+
+    Returns:
+        (start, end, replacement) edits against `buffer`, empty when the
+        model's output has nothing to apply, and the `typing` names the
+        added annotations need imported.
+
+    Raises:
+        SyntaxError: If the documented code is not valid Python.
+    """
+    new = documented.encode('utf-8')
+    try:
+        tree = ast.parse(new)
+    except SyntaxError:
+        new = textwrap.dedent(documented).encode('utf-8')
+        tree = ast.parse(new)
+    func = next((node for node in ast.walk(tree)
+                 if isinstance(node, _FUNCTION_TYPES) and node.name == spans['name']), None)
+    if func is None:
+        return [], set()
+
+    offsets = line_offsets(new)
+
+    def segment(node: ast.AST) -> bytes:
+        return new[offsets[node.lineno - 1] + node.col_offset:
+                   offsets[node.end_lineno - 1] + node.end_col_offset]
+
+    edits = []
+    imports = set()
+
+    def resolve(annotation: ast.AST) -> bytes | None:
+        resolved = _annotation_imports(annotation, module, spans['start'])
+        text = segment(annotation)
+        if resolved is None or b'\n' in text:
+            return None
+        needed, deferred = resolved
+        if deferred and not module['future_annotations']:
+            # A forward reference: evaluated only by get_type_hints, not at import
+            if b"'" in text or b'"' in text or b'\\' in text:
+                return None
+            text = b"'" + text + b"'"
+        imports.update(needed)
+        return text
+
+    first = func.body[0]
+    if (isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant)
+            and isinstance(first.value.value, str)):
+        source_indent = new[offsets[first.lineno - 1]:offsets[first.lineno - 1] + first.col_offset]
+        literal = _reindent(segment(first), source_indent, spans['indent'])
+        if spans['docstring'] is not None:
+            start, end = spans['docstring']
+            if buffer[start:end] != literal:
+                edits.append((start, end, literal))
+        elif spans['inline']:
+            start = spans['body']
+            while buffer[start - 1:start] in (b' ', b'\t'):
+                start -= 1
+            edits.append((start, spans['body'],
+                          b'\n' + spans['indent'] + literal + b'\n' + spans['indent']))
+        else:
+            # Directly under the signature, above any leading comments
+            _, colon = _signature_positions(buffer, spans)
+            line_start = buffer.find(b'\n', colon) + 1 if colon is not None else 0
+            if not 0 < line_start <= spans['body']:
+                line_start = spans['body'] - len(spans['indent'])
+            edits.append((line_start, line_start, spans['indent'] + literal + b'\n'))
+
+    documented_args = {arg.arg: arg for arg in ast.walk(func.args) if isinstance(arg, ast.arg)}
+    for param, span in spans['params'].items():
+        arg = documented_args.get(param)
+        if span['annotated'] or arg is None or arg.annotation is None:
+            continue
+        annotation = resolve(arg.annotation)
+        if annotation is None:
+            continue
+        gap = buffer[span['end']:span['default']] if span['default'] is not None else b''
+        if gap.strip() == b'=' and b'\n' not in gap:
+            edits.append((span['end'], span['default'], b': ' + annotation + b' = '))
+        else:
+            edits.append((span['end'], span['end'], b': ' + annotation))
+
+    if not spans['returns'] and func.returns is not None:
+        close, _ = _signature_positions(buffer, spans)
+        annotation = resolve(func.returns) if close is not None else None
+        if annotation is not None:
+            edits.append((close, close, b' -> ' + annotation))
+
+    return edits, imports
+
+
+def import_edit(buffer: bytes, module: dict, names: set[str]) -> tuple[int, int, bytes]:
+    """
+    Edit that imports `names` from typing, extending an existing import if possible.
+
+    Args:
+        buffer: The original file contents.
+        module: Module-level facts from `scan_buffer`.
+        names: The typing names to import.
+    """
+    listed = ', '.join(sorted(names)).encode()
+    end = module['typing_import_end']
+    if end is not None:
+        if buffer[end - 1:end] == b')':
+            end -= 1
+        return (end, end, b', ' + listed)
+
+    if module['import_end'] is not None:
+        position = buffer.find(b'\n', module['import_end'])
+        position = len(buffer) if position == -1 else position + 1
+    else:
+        # Top of the file, below a shebang or encoding comment
+        position = 0
+        while buffer.startswith(b'#', position):
+            position = buffer.find(b'\n', position) + 1 or len(buffer)
+    prefix = b'' if position == 0 or buffer[position - 1:position] == b'\n' else b'\n'
+    return (position, position, prefix + b'from typing import ' + listed + b'\n')
+
+
+def _annotation_imports(annotation: ast.AST, module: dict,
+                        position: int) -> tuple[set[str], bool] | None:
+    """
+    Check the names an annotation uses against a function starting at `position`.
+
+    Returns:
+        The typing names the annotation needs imported and whether it uses
+        a name only bound after `position` or under TYPE_CHECKING, so it
+        must not be evaluated at import time; None if it uses a name the
+        file lacks.
+    """
+    needed = set()
+    deferred = False
+    for node in ast.walk(annotation):
+        if not isinstance(node, ast.Name):
+            continue
+        bound_at = module['names'].get(node.id)
+        if node.id in _BUILTIN_NAMES or module['star_import']:
+            continue
+        if bound_at is not None and bound_at <= position:
+            continue
+        if bound_at is not None or node.id in module['type_names']:
+            deferred = True
+        elif node.id in _TYPING_NAMES:
+            needed.add(node.id)
+        else:
+            return None
+    return needed, deferred
+
+
+def apply_edits(buffer: bytes, edits: list[tuple[int, int, bytes]]) -> bytes:
+    """
+    Apply non-overlapping (start, end, replacement) edits in one pass.
+
+    Raises:
+        ValueError: If two edits overlap.
+    """
+    pieces = []
+    position = 0
+    for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1])):
+        if start < position:
+            raise ValueError(f"Overlapping edits at byte {start}")
+        pieces += [buffer[position:start], replacement]
+        position = end
+    pieces.append(buffer[position:])
+    return b''.join(pieces)
+
+
+def _reindent(literal: bytes, source_indent: bytes, indent: bytes) -> bytes:
+    """Move a docstring literal's continuation lines to the target indentation."""
+    lines = literal.split(b'\n')
+    for i in range(1, len(lines)):
+        line = lines[i]
+        if not line.strip():
+            lines[i] = b''
+        elif line.startswith(source_indent):
+            lines[i] = indent + line[len(source_indent):]
+    return b'\n'.join(lines)
+
+
+def _signature_positions(buffer: bytes, spans: dict) -> tuple[int | None, int | None]:
+    """
+    Find the end of a function's parameter list and of its signature.
+
+    The header is tokenized rather than searched, so parentheses and colons
+    inside defaults, annotations, strings and comments are skipped.
+
+    Returns:
+        Offsets just after the `)` closing the parameters and just after
+        the `:` ending the signature; None where not found.
+    """
+    header = buffer[spans['start']:spans['body']].decode('utf-8')
+    lines = header.splitlines(keepends=True)
+
+    def offset(position: tuple[int, int]) -> int:
+        row, col = position
+        prefix = ''.join(lines[:row - 1]) + lines[row - 1][:col]
+        return spans['start'] + len(prefix.encode('utf-8'))
+
+    depth, close = 0, None
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(header).readline):
+            if token.type != tokenize.OP:
+                continue
+            if token.string in '([{':
+                depth += 1
+            elif token.string in ')]}':
+                depth -= 1
+                if depth == 0 and close is None:
+                    close = offset(token.end)
+            elif token.string == ':' and depth == 0 and close is not None:
+                return close, offset(token.end)
+    except (tokenize.TokenError, IndentationError):
+        pass
+    return close, None
+
+
+# =============================================================================
+# FILES
+# =============================================================================
+
+def unified_diff(path: str, old: bytes, new: bytes) -> str:
+    """Unified diff between two versions of a file (git-style labels for relative paths)."""
+    before, after = (path, path) if os.path.isabs(path) else (f"a/{path}", f"b/{path}")
+    return ''.join(difflib.unified_diff(
+        old.decode('utf-8').splitlines(keepends=True),
+        new.decode('utf-8').splitlines(keepends=True),
+        before, after))
+
+
+def write_atomic(path: str, data: bytes, expected: os.stat_result) -> None:
+    """
+    Replace a file's contents in one step, keeping its permissions.
+
+    Raises:
+        RuntimeError: If the file changed on disk since it was read.
+    """
+    stat = os.stat(path)
+    if (stat.st_mtime_ns, stat.st_size) != (expected.st_mtime_ns, expected.st_size):
+        raise RuntimeError("File changed on disk during the run")
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, stat.st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+async def apply_file(path: str, engine: AsyncDocumentationEngine, requests: asyncio.Semaphore,
+                     min_score: int | None = None, write: bool = True) -> dict:
+    """
+    Document one file and patch the results into it.
+
+    Args:
+        path: The Python file.
+        engine: Engine used to document the queued functions.
+        requests: Shared semaphore bounding requests across all files.
+        min_score: Skip functions already documented with at least this score.
+        write: Write the patched file; otherwise only compute the diff.
+
+    Returns:
+        A report with the file's `path`, counts of `edited`, `unchanged`,
+        `skipped` and `failed` functions, its `diff` and an `error` message
+        if the file could not be processed.
+    """
+    report = {'path': path, 'edited': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0,
+              'diff': '', 'error': None}
+    try:
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            buffer = f.read()
+        queue, skipped, spans, module = scan_buffer(buffer, min_score)
+    except (OSError, UnicodeDecodeError, SyntaxError, ValueError) as e:
+        report['error'] = f"{type(e).__name__}: {e}"
+        return report
+    report['skipped'] = len(skipped)
+
+    async def document(code: str) -> dict:
+        async with requests:
+            return await engine.document(code)
+
+    results = await asyncio.gather(*(document(item['source']) for item in queue))
+
+    edits, imports = [], set()
+    for item, result in zip(queue, results):
+        try:
+            if result['error']:
+                raise ValueError(result['error'])
+            function_edits, needed = plan_edits(buffer, spans[item['index']],
+                                                result['documented'], module)
+        except (SyntaxError, ValueError):
+            report['failed'] += 1
+            continue
+        report['edited' if function_edits else 'unchanged'] += 1
+        edits += function_edits
+        imports |= needed
+
+    if not edits:
+        return report
+    if imports:
+        edits.append(import_edit(buffer, module, imports))
+
+    with METRICS.timer("write"):
+        try:
+            patched = apply_edits(buffer, edits)
+            report['diff'] = unified_diff(path, buffer, patched)
+            if write:
+                write_atomic(path, patched, stat)
+        except (OSError, RuntimeError, ValueError) as e:
+            report['error'] = f"{type(e).__name__}: {e}"
+    return report
+
+
+async def apply_tree(targets: list[str], engine: AsyncDocumentationEngine,
+                     min_score: int | None = None, write: bool = True, diff_stream=None,
+                     file_concurrency: int = DEFAULT_FILE_CONCURRENCY) -> dict:
+    """
+    Document and patch every Python file under `targets`.
+
+    Args:
+        targets: File paths, directory paths or glob patterns.
+        engine: Engine used for the LLM stage; its `concurrency` bounds the
+            requests in flight across all files.
+        min_score: Skip functions already documented with at least this score.
+        write: Write patched files; otherwise only produce diffs.
+        diff_stream: Text stream that receives each file's diff as it finishes.
+        file_concurrency: Number of files processed at once.
+
+    Returns:
+        Totals over all files, plus the `errors` of files that failed.
+    """
+    requests = asyncio.Semaphore(engine.concurrency)
+    files = discover_files(targets)
+    totals = {'files': 0, 'files_changed': 0, 'edited': 0, 'unchanged': 0, 'skipped': 0,
+              'failed': 0, 'errors': {}}
+
+    async def worker() -> None:
+        for path in files:
+            report = await apply_file(path, engine, requests, min_score, write)
+            totals['files'] += 1
+            totals['files_changed'] += bool(report['diff']) and not report['error']
+            for key in ('edited', 'unchanged', 'skipped', 'failed'):
+                totals[key] += report[key]
+            if report['error']:
+                totals['errors'][path] = report['error']
+            if diff_stream is not None and report['diff']:
+                diff_stream.write(report['diff'])
+                diff_stream.flush()
+
+    await asyncio.gather(*(worker() for _ in range(file_concurrency)))
+    return totals
+
+
+def apply_documentation(targets: list[str], min_score: int | None = None, write: bool = True,
+                        diff_stream=sys.stdout, **engine_options) -> dict:
+    """
+    Synchronous entry point for write-back.
+
+    Args:
+        targets: File paths, directory paths or glob patterns.
+        min_score: Skip functions already documented with at least this score.
+        write: Write patched files; otherwise only print diffs.
+        diff_stream: Where to write the unified diff; None to suppress it.
+        **engine_options: Passed through to `AsyncDocumentationEngine`.
+
+    Returns:
+        Totals over all files (see `apply_tree`).
+
+    Example:
+        >>> apply_documentation(["src/"], min_score=90, write=False)
+        {'files': 412, 'files_changed': 37, 'edited': 95, ...}
+    """
+    engine = AsyncDocumentationEngine(**engine_options)
+    return run_engine(engine, apply_tree(targets, engine, min_score, write, diff_stream))
+
+
+# =============================================================================
+# CLI INTERFACE
+# =============================================================================
+
+def main():
+    """Patch generated docstrings into files from the command line."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("targets", nargs="+", help="Python files, directories or globs")
+    parser.add_argument("--diff", action="store_true",
+                        help="Print the unified diff without changing any file")
+    parser.add_argument("--min-score", type=int,
+                        help="Skip functions already documented with at least this score")
+    parser.add_argument("--model", default="gpt-4-turbo")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    totals = apply_documentation(args.targets, min_score=args.min_score, write=not args.diff,
+                                 model=args.model, concurrency=args.concurrency)
+    _print_totals(totals, write=not args.diff)
+
+
+def _print_totals(totals: dict, write: bool) -> None:
+    verb = "Patched" if write else "Would patch"
+    print(f"{verb} {totals['edited']} functions in {totals['files_changed']} of "
+          f"{totals['files']} files ({totals['unchanged']} unchanged, {totals['skipped']} "
+          f"skipped, {totals['failed']} failed)", file=sys.stderr)
+    for path, error in totals['errors'].items():
+        print(f"  {path}: {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
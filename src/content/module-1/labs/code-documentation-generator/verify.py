@@ -4,18 +4,41 @@ Verification script for Code Documentation Generator lab.
 
 This script tests the student's solution against the sample functions
 and validates the output meets quality standards.
+
+Usage:
+    python verify.py [path_to_doc_generator.py]
+    python verify.py --batch submissions/ --report cohort.csv --jobs 16
+
+    python verify.py --batch submissions/ --fixtures fixtures.jsonl --fixture-mode replay
+
+Batch mode grades a directory of submissions (either `<student>.py` files or
+`<student>/doc_generator.py` folders), each in its own worker process with
+CPU, memory and wall-clock limits, and writes one consolidated report.
+
+With --fixtures, model calls are recorded to or replayed from a fixture store
+(see llm_fixtures.py), so regrading is deterministic and needs no API calls.
 """
 
 import sys
 import os
 import importlib.util
+from concurrent.futures import ThreadPoolExecutor
 
 # Minimum passing score
 PASSING_SCORE = 70
 
+# Default limits for each submission in batch mode
+DEFAULT_TIMEOUT = 300      # wall-clock seconds
+DEFAULT_CPU_SECONDS = 120
+DEFAULT_MEMORY_MB = 2048
+
 
 def load_module(module_path: str):
     """Dynamically load a Python module from a file path."""
+    # Let the solution import its sibling modules
+    directory = os.path.dirname(os.path.abspath(module_path))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
     spec = importlib.util.spec_from_file_location("student_solution", module_path)
     module = importlib.util.module_from_spec(spec)
     spec.loader.exec_module(module)
@@ -46,10 +69,22 @@ def test_documentation_generation(module) -> tuple[int, list[str]]:
     except AttributeError:
         return 0, ["✗ generate_documentation function not found"]
     
-    for code, description in test_cases:
+    def generate(code):
+        try:
+            return generate_func(code), None
+        except Exception as e:
+            return None, e
+    
+    # Each test case is an independent API call, so run them concurrently
+    with ThreadPoolExecutor(max_workers=len(test_cases)) as pool:
+        outcomes = list(pool.map(generate, [code for code, _ in test_cases]))
+    
+    for (code, description), (result, error) in zip(test_cases, outcomes):
+        if error is not None:
+            results.append(f"✗ {description}: Error - {str(error)}")
+            continue
+        
         try:
-            result = generate_func(code)
-            
             # Check for basic quality indicators
             has_docstring = '"""' in result or "'''" in result
             has_type_hints = '->' in result
@@ -121,11 +156,12 @@ def test_validation_function(module) -> tuple[int, list[str]]:
     return score, results
 
 
-def run_verification(solution_path: str) -> dict:
+def run_verification(solution_path: str, verbose: bool = True) -> dict:
     """Run all verification tests on the student solution."""
-    print(f"\n{'='*60}")
-    print("CODE DOCUMENTATION GENERATOR - LAB VERIFICATION")
-    print('='*60)
+    log = print if verbose else _silent
+    log(f"\n{'='*60}")
+    log("CODE DOCUMENTATION GENERATOR - LAB VERIFICATION")
+    log('='*60)
     
     total_score = 0
     all_results = []
@@ -135,11 +171,12 @@ def run_verification(solution_path: str) -> dict:
         module = load_module(solution_path)
         all_results.append("✓ Solution file loaded successfully")
     except Exception as e:
-        print(f"✗ Failed to load solution: {e}")
-        return {'passed': False, 'score': 0, 'details': [str(e)]}
+        log(f"✗ Failed to load solution: {e}")
+        return {'passed': False, 'score': 0,
+                'details': [f"✗ Failed to load solution: {type(e).__name__}: {e}"]}
     
     # Test 1: Check required functions exist
-    print("\n1. Checking required functions...")
+    log("\n1. Checking required functions...")
     for func_name in ['generate_documentation', 'validate_documentation']:
         passed, msg = test_function_exists(module, func_name)
         all_results.append(msg)
@@ -147,29 +184,29 @@ def run_verification(solution_path: str) -> dict:
             total_score += 5
     
     # Test 2: Test documentation generation
-    print("\n2. Testing documentation generation...")
+    log("\n2. Testing documentation generation...")
     gen_score, gen_results = test_documentation_generation(module)
     total_score += gen_score
     all_results.extend(gen_results)
     
     # Test 3: Test validation function
-    print("\n3. Testing validation function...")
+    log("\n3. Testing validation function...")
     val_score, val_results = test_validation_function(module)
     total_score += val_score
     all_results.extend(val_results)
     
     # Print results
-    print("\n" + "="*60)
-    print("RESULTS")
-    print("="*60)
+    log("\n" + "="*60)
+    log("RESULTS")
+    log("="*60)
     
     for result in all_results:
-        print(f"  {result}")
+        log(f"  {result}")
     
-    print("\n" + "="*60)
-    print(f"FINAL SCORE: {total_score}/100")
-    print(f"STATUS: {'PASSED' if total_score >= PASSING_SCORE else 'NEEDS WORK'}")
-    print("="*60 + "\n")
+    log("\n" + "="*60)
+    log(f"FINAL SCORE: {total_score}/100")
+    log(f"STATUS: {'PASSED' if total_score >= PASSING_SCORE else 'NEEDS WORK'}")
+    log("="*60 + "\n")
     
     return {
         'passed': total_score >= PASSING_SCORE,
@@ -179,17 +216,277 @@ def run_verification(solution_path: str) -> dict:
     }
 
 
-if __name__ == "__main__":
-    # Default to looking for solution in current directory
-    if len(sys.argv) > 1:
-        solution_path = sys.argv[1]
+def verify_with_fixtures(solution_path: str, fixtures: str, mode: str = "auto",
+                         verbose: bool = True) -> dict:
+    """
+    Run `run_verification` with model calls recorded to or replayed from a fixture store.
+    
+    Args:
+        solution_path: Path to the student's doc_generator.py.
+        fixtures: Fixture file (JSON Lines).
+        mode: "record", "replay" or "auto" (see llm_fixtures.py).
+        verbose: Print the verification report.
+    
+    Returns:
+        The verification result plus a 'fixtures' entry with replay stats
+        and the mismatch report for unrecorded requests.
+    """
+    from llm_fixtures import FixtureStore
+    
+    store = FixtureStore(fixtures, mode=mode)
+    with store.installed():
+        result = run_verification(solution_path, verbose=verbose)
+    result['fixtures'] = {'stats': store.stats, 'mismatches': store.mismatch_report()}
+    return result
+
+
+def _silent(*args, **kwargs):
+    """Stand-in for print when output is suppressed."""
+
+
+# =============================================================================
+# BATCH GRADING
+# =============================================================================
+
+def find_submissions(directory: str) -> list[tuple[str, str]]:
+    """
+    List the submissions in a cohort directory.
+    
+    Args:
+        directory: Folder holding `<student>.py` files and/or
+            `<student>/doc_generator.py` folders.
+    
+    Returns:
+        Sorted (submission name, solution path) pairs.
+    """
+    submissions = []
+    for entry in sorted(os.listdir(directory)):
+        path = os.path.join(directory, entry)
+        if os.path.isdir(path):
+            solution = os.path.join(path, "doc_generator.py")
+            if os.path.isfile(solution):
+                submissions.append((entry, solution))
+        elif entry.endswith(".py"):
+            submissions.append((entry[:-3], path))
+    return submissions
+
+
+def _limit_resources(cpu_seconds: int, memory_mb: int) -> None:
+    """Apply CPU and address-space limits to the current process (POSIX only)."""
+    if os.name != "posix":
+        return
+    import resource
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds))
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def grade_submission(name: str, solution_path: str, timeout: float = DEFAULT_TIMEOUT,
+                     cpu_seconds: int = DEFAULT_CPU_SECONDS,
+                     memory_mb: int = DEFAULT_MEMORY_MB, fixtures: str | None = None,
+                     fixture_mode: str = "auto") -> dict:
+    """
+    Grade one submission in an isolated worker process.
+    
+    The worker re-runs this script in worker mode from the submission's own
+    directory, so a crash, hang or memory blow-up only loses that submission.
+    
+    Args:
+        name: Submission name used in the report.
+        solution_path: Path to the submission's doc_generator.py.
+        timeout: Wall-clock limit in seconds.
+        cpu_seconds: CPU time limit in seconds.
+        memory_mb: Address-space limit in megabytes.
+        fixtures: Optional fixture store for the submission's model calls.
+        fixture_mode: "record", "replay" or "auto".
+    
+    Returns:
+        The report row: name, path, status ("graded", "timeout" or
+        "crashed"), score, passed, elapsed and details, plus
+        fixture_misses and mismatches when fixtures are used.
+    """
+    import json
+    import signal
+    import subprocess
+    import time
+    
+    solution_path = os.path.abspath(solution_path)
+    row = {'name': name, 'path': solution_path, 'status': 'graded', 'score': 0,
+           'passed': False, 'elapsed': 0.0, 'details': []}
+    
+    command = [sys.executable, os.path.abspath(__file__), "--worker", solution_path,
+               "--cpu-seconds", str(cpu_seconds), "--memory-mb", str(memory_mb)]
+    if fixtures:
+        command += ["--fixtures", os.path.abspath(fixtures), "--fixture-mode", fixture_mode]
+    
+    # The worker applies its own resource limits: a preexec_fn is not safe
+    # while other grading threads are running. Its own session lets a
+    # timeout also stop anything the submission spawned.
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command,
+        cwd=os.path.dirname(solution_path),
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        start_new_session=True
+    )
+    try:
+        stdout, stderr = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        if os.name == "posix":
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.communicate()
+        row.update(status='timeout', details=[f"✗ Timed out after {timeout:.0f}s"])
+    else:
+        lines = stdout.strip().splitlines()
+        try:
+            result = json.loads(lines[-1])
+        except (IndexError, ValueError):
+            reason = stderr.strip().splitlines()[-1] if stderr.strip() else \
+                f"exit code {process.returncode}"
+            row.update(status='crashed', details=[f"✗ Worker crashed: {reason}"])
+        else:
+            row.update(score=result['score'], passed=result['passed'],
+                       details=result['details'])
+            if 'fixtures' in result:
+                mismatches = result['fixtures']['mismatches']
+                row.update(fixture_misses=len(mismatches), mismatches=mismatches)
+    row['elapsed'] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def grade_cohort(directory: str, jobs: int | None = None, **limits) -> list[dict]:
+    """
+    Grade every submission in a directory, `jobs` workers at a time.
+    
+    Args:
+        directory: Cohort directory (see `find_submissions`).
+        jobs: Concurrent worker processes. Defaults to twice the CPU count,
+            since workers mostly wait on the API.
+        **limits: `timeout`, `cpu_seconds`, `memory_mb`, `fixtures` and
+            `fixture_mode` for each worker.
+    
+    Returns:
+        One report row per submission, in submission order.
+    """
+    submissions = find_submissions(directory)
+    jobs = jobs or 2 * (os.cpu_count() or 1)
+    
+    rows = []
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(grade_submission, name, path, **limits)
+                   for name, path in submissions]
+        for number, future in enumerate(futures, 1):
+            row = future.result()
+            rows.append(row)
+            print(f"[{number}/{len(futures)}] {row['name']}: {row['status']}, "
+                  f"{row['score']}/100 ({row['elapsed']:.1f}s)")
+    return rows
+
+
+def write_report(rows: list[dict], path: str) -> None:
+    """Write batch results as CSV (for a .csv path) or JSON."""
+    if path.endswith(".csv"):
+        import csv
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['name', 'path', 'status', 'score',
+                                                   'passed', 'elapsed', 'fixture_misses',
+                                                   'details'], extrasaction='ignore')
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({**row, 'details': ' | '.join(row['details'])})
     else:
-        solution_path = "doc_generator.py"
+        import json
+        summary = {
+            'submissions': len(rows),
+            'passed': sum(1 for row in rows if row['passed']),
+            'passing_score': PASSING_SCORE,
+            'fixture_misses': sum(row.get('fixture_misses', 0) for row in rows),
+        }
+        with open(path, 'w') as f:
+            json.dump({'summary': summary, 'results': rows}, f, indent=2, ensure_ascii=False)
+
+
+def _run_worker(solution_path: str, fixtures: str | None, fixture_mode: str,
+                cpu_seconds: int, memory_mb: int) -> None:
+    """Worker mode: grade one submission and print the result as JSON on the last line."""
+    import contextlib
+    import json
+    
+    # Before the submission is imported, so it runs under the limits from its first line
+    _limit_resources(cpu_seconds, memory_mb)
     
+    # Keep whatever the submission prints off the result channel
+    with contextlib.redirect_stdout(sys.stderr):
+        if fixtures:
+            result = verify_with_fixtures(solution_path, fixtures, fixture_mode, verbose=False)
+        else:
+            result = run_verification(solution_path, verbose=False)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Verify Code Documentation Generator solutions")
+    parser.add_argument("solution", nargs="?", default="doc_generator.py",
+                        help="Path to doc_generator.py (default: ./doc_generator.py)")
+    parser.add_argument("--batch", metavar="DIR",
+                        help="Grade every submission in DIR in isolated workers")
+    parser.add_argument("--report", metavar="PATH", default="grading_report.json",
+                        help="Batch mode: consolidated report (.csv or .json)")
+    parser.add_argument("--jobs", type=int,
+                        help="Batch mode: concurrent workers (default: 2x CPU count)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Batch mode: wall-clock seconds per submission")
+    parser.add_argument("--cpu-seconds", type=int, default=DEFAULT_CPU_SECONDS,
+                        help="Batch mode: CPU seconds per submission")
+    parser.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB,
+                        help="Batch mode: memory limit per submission")
+    parser.add_argument("--fixtures", metavar="PATH",
+                        help="Record/replay model calls with this fixture store")
+    parser.add_argument("--fixture-mode", choices=["record", "replay", "auto"], default="auto",
+                        help="replay: never call the model; record: always call and save; "
+                             "auto: replay what is recorded, record the rest")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        _run_worker(args.solution, args.fixtures, args.fixture_mode, args.cpu_seconds,
+                    args.memory_mb)
+        sys.exit(0)
+    
+    if args.batch:
+        rows = grade_cohort(args.batch, jobs=args.jobs, timeout=args.timeout,
+                            cpu_seconds=args.cpu_seconds, memory_mb=args.memory_mb,
+                            fixtures=args.fixtures, fixture_mode=args.fixture_mode)
+        write_report(rows, args.report)
+        passed = sum(1 for row in rows if row['passed'])
+        print(f"\n{passed}/{len(rows)} submissions passed; report written to {args.report}")
+        misses = sum(row.get('fixture_misses', 0) for row in rows)
+        if misses:
+            print(f"{misses} model requests had no fixture; see 'mismatches' in the JSON report")
+        sys.exit(0)
+    
+    solution_path = args.solution
     if not os.path.exists(solution_path):
         print(f"Error: Solution file not found at '{solution_path}'")
         print("Usage: python verify.py <path_to_doc_generator.py>")
         sys.exit(1)
     
-    result = run_verification(solution_path)
+    if args.fixtures:
+        result = verify_with_fixtures(solution_path, args.fixtures, args.fixture_mode)
+        stats = result['fixtures']['stats']
+        print(f"Fixtures: {stats['replayed']} replayed, {stats['recorded']} recorded, "
+              f"{stats['missed']} missing")
+        for mismatch in result['fixtures']['mismatches']:
+            print(f"\n  No fixture for {mismatch['key'][:12]} ({mismatch['model']})")
+            if mismatch['diff']:
+                print(f"  Closest recording {mismatch['nearest'][:12]}; prompt diff:")
+                print('\n'.join(f"    {line}" for line in mismatch['diff'].splitlines()))
+            if mismatch.get('changed_parameters'):
+                print(f"  Changed parameters: {', '.join(mismatch['changed_parameters'])}")
+    else:
+        result = run_verification(solution_path)
     sys.exit(0 if result['passed'] else 1)
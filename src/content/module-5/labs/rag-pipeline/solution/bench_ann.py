@@ -0,0 +1,134 @@
+"""
+Benchmark: IVF-PQ approximate search vs exact search.
+
+Embeds a synthetic corpus of chunks built from the sample documents (the
+`bench_bm25` corpus: a few sample-doc lines per chunk plus a unique revision
+tag) and, for each corpus size, reports:
+
+- embedding and build (training + encoding) time;
+- exact `VectorIndex` latency, one query at a time;
+- recall@k against exact search, and p50/p99 latency, for a grid of
+  query-time `probes` and `rerank` settings. Many synthetic chunks share
+  all but their revision tag, so exact scores are often nearly tied;
+  "tied" recall also counts a result whose exact score equals the k-th
+  best within float32 precision;
+- index memory: compressed codes vs the full float32 vectors;
+- save time, size on disk, and memory-mapped load and first-query time.
+
+Queries are held-out chunks from the same distribution plus the
+`bench_chunking` questions.
+
+Usage:
+    python bench_ann.py
+    python bench_ann.py --sizes 100000 1000000 --lists 1024 --subspaces 32
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from ann_index import DEFAULT_LISTS, DEFAULT_SUBSPACES, DEFAULT_TRAIN_SIZE, IVFPQIndex
+from bench_bm25 import corpus
+from bench_chunking import QUESTIONS
+from embeddings import HashingEmbedder
+from vector_index import VectorIndex
+
+EMBED_BLOCK = 10_000
+HELD_OUT_QUERIES = 200
+PROBES = (4, 16, 64)
+RERANK = (0, 4, 16)
+
+
+def latencies(search, queries: np.ndarray) -> tuple[np.ndarray, np.ndarray, float, float]:
+    """(scores, ids, p50 ms, p99 ms), searching one query at a time."""
+    results, times = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.append(search(query))
+        times.append(time.perf_counter() - started)
+    scores = np.vstack([scores for scores, _ in results])
+    ids = np.vstack([ids for _, ids in results])
+    return (scores, ids, *np.percentile(times, [50, 99]) * 1000)
+
+
+def recall(found: np.ndarray, expected: np.ndarray) -> float:
+    """Mean share of each query's exact top k that was found."""
+    return float(np.mean([len(np.intersect1d(a, b)) / len(b)
+                          for a, b in zip(found, expected)]))
+
+
+def tied_recall(matrix: np.ndarray, queries: np.ndarray, found: np.ndarray,
+                kth: np.ndarray) -> float:
+    """Share of results scoring at least the exact k-th best (within float32 precision)."""
+    scores = np.einsum('qkd,qd->qk', matrix[found], queries)
+    return float(np.mean(scores >= kth[:, None] - 1e-6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the IVF-PQ vector index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000],
+                        help="Corpus sizes in chunks")
+    parser.add_argument("--lists", type=int, default=DEFAULT_LISTS)
+    parser.add_argument("--subspaces", type=int, default=DEFAULT_SUBSPACES)
+    parser.add_argument("-k", type=int, default=10, help="Results per query")
+    args = parser.parse_args()
+
+    embedder = HashingEmbedder()
+    queries = embedder.embed_documents(corpus(HELD_OUT_QUERIES, seed=1)
+                                       + [question for question, _, _ in QUESTIONS])
+    for size in args.sizes:
+        # Small corpora train on all their vectors; otherwise the index would stay exact
+        index = IVFPQIndex(embedder.dim, lists=args.lists, subspaces=args.subspaces,
+                           train_size=min(size, DEFAULT_TRAIN_SIZE))
+        texts = corpus(size)
+        embedding = building = 0.0
+        for start in range(0, size, EMBED_BLOCK):
+            started = time.perf_counter()
+            vectors = embedder.embed_documents(texts[start:start + EMBED_BLOCK])
+            embedding += time.perf_counter() - started
+            started = time.perf_counter()
+            index.add(vectors)
+            building += time.perf_counter() - started
+        del texts
+        print(f"\n{size:,} chunks: embedded in {embedding:.0f} s, index built in "
+              f"{building:.0f} s ({index.lists} lists, {index.subspaces} bytes per code)")
+        print(f"  memory: {index.nbytes / 2**20:.1f} MiB index "
+              f"({index.nbytes / size:.0f} B/vector) + {index.matrix.nbytes / 2**20:.0f} MiB "
+              f"vectors for re-ranking")
+
+        exact = VectorIndex.from_matrix(index.matrix)
+        best, expected, p50, p99 = latencies(lambda query: exact.search(query, args.k),
+                                             queries)
+        print(f"  {'search':<24} {'recall':>7} {'tied':>6} {'p50':>8} {'p99':>8}")
+        print(f"  {'exact':<24} {1:>7.3f} {1:>6.3f} {p50:>5.2f} ms {p99:>5.2f} ms")
+        for probes in PROBES:
+            for rerank in RERANK:
+                _, found, p50, p99 = latencies(
+                    lambda query: index.search(query, args.k, probes=probes, rerank=rerank),
+                    queries)
+                name = f"probes={probes} rerank={rerank}"
+                tied = tied_recall(index.matrix, queries, found, best[:, -1])
+                print(f"  {name:<24} {recall(found, expected):>7.3f} {tied:>6.3f} "
+                      f"{p50:>5.2f} ms {p99:>5.2f} ms")
+
+        with tempfile.TemporaryDirectory() as directory:
+            started = time.perf_counter()
+            index.save(directory)
+            saved = time.perf_counter() - started
+            on_disk = sum(entry.stat().st_size for entry in os.scandir(directory))
+            started = time.perf_counter()
+            loaded = IVFPQIndex.load(directory)
+            opened = time.perf_counter() - started
+            started = time.perf_counter()
+            loaded.search(queries[0], args.k)
+            first = time.perf_counter() - started
+            print(f"  save: {saved:.2f} s, {on_disk / 2**20:.0f} MiB on disk; "
+                  f"mmap load: {opened * 1000:.1f} ms, first query: {first * 1000:.1f} ms")
+            del loaded
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark: BM25 top-k with block-max/MaxScore pruning vs exhaustive scoring.
+
+Builds a `BM25Index` over a synthetic corpus of short chunks (lines of the
+sample documents, each tagged with a revision number so no two are equal)
+and reports, for each corpus size:
+
+- build time and index bytes per posting;
+- p50/p99 search latency for a set of questions, pruned (`search`) vs
+  exhaustive (every matching document scored, as `rank_bm25` does), after
+  checking that both return the same top-k scores;
+- adding 10,000 documents in one batch, deleting 10,000 and compacting;
+- adding 10,000 documents one at a time, each followed by a search (the
+  unsealed buffer is searched directly, so this must not rewrite segments);
+- save/load time and file size.
+
+Usage:
+    python bench_bm25.py
+    python bench_bm25.py --sizes 100000 1000000 2000000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from bench_chunking import QUESTIONS
+from bm25 import BM25Index
+from rag_pipeline import sample_documents
+
+UPDATE_DOCS = 10_000
+
+
+def corpus(count: int, seed: int = 0) -> list[str]:
+    """`count` chunks, each a few sample document lines plus a unique revision tag."""
+    lines = [line for document in sample_documents()
+             for line in document['page_content'].splitlines() if line.strip()]
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(lines, k=rng.randint(1, 4))) + f" revision {i}"
+            for i in range(count)]
+
+
+def exhaustive(index: BM25Index, query: str, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """Top k by scoring every document in the index."""
+    scores = index.score(query, np.arange(index.size))
+    ids = np.flatnonzero(scores)
+    ids = ids[np.lexsort((ids, -scores[ids]))[:k]]
+    return scores[ids], ids
+
+
+def latencies(search, queries: list[str], k: int, repeat: int) -> tuple[float, float]:
+    """(p50, p99) milliseconds per query."""
+    times = []
+    for _ in range(repeat):
+        for query in queries:
+            started = time.perf_counter()
+            search(query, k)
+            times.append(time.perf_counter() - started)
+    return tuple(np.percentile(times, [50, 99]) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BM25 index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000],
+                        help="Corpus sizes in chunks")
+    parser.add_argument("-k", type=int, default=10, help="Results per query")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the questions")
+    args = parser.parse_args()
+
+    queries = [question for question, _, _ in QUESTIONS]
+    for size in args.sizes:
+        texts = corpus(size + 2 * UPDATE_DOCS)
+        index = BM25Index()
+        started = time.perf_counter()
+        index.add(texts[:size])
+        index.compact()
+        build = time.perf_counter() - started
+        postings = sum(len(segment) for segment in index.segments)
+        print(f"\n{size:,} chunks: built in {build:.1f} s, {postings:,} postings, "
+              f"{index.nbytes / postings:.1f} bytes per posting")
+
+        for query in queries:
+            pruned, expected = index.search(query, args.k), exhaustive(index, query, args.k)
+            if not np.allclose(pruned[0], expected[0], rtol=1e-9, atol=0):
+                raise AssertionError(f"Pruned search differs for {query!r}")
+
+        print(f"  {'search':<12} {'p50':>8} {'p99':>8}")
+        for name, search in (('pruned', index.search),
+                             ('exhaustive', lambda query, k: exhaustive(index, query, k))):
+            p50, p99 = latencies(search, queries, args.k,
+                                 args.repeat if name == 'pruned' else 1)
+            print(f"  {name:<12} {p50:>5.2f} ms {p99:>5.2f} ms")
+        slowest = max(queries, key=lambda query: latencies(index.search, [query], args.k, 3)[0])
+        print(f"  slowest query: {slowest!r}")
+
+        started = time.perf_counter()
+        index.add(texts[size:size + UPDATE_DOCS])
+        index.search(queries[0], args.k)
+        added = time.perf_counter() - started
+        started = time.perf_counter()
+        index.delete(np.arange(0, size, size // UPDATE_DOCS)[:UPDATE_DOCS])
+        index.search(queries[0], args.k)
+        deleted = time.perf_counter() - started
+        print(f"  add {UPDATE_DOCS:,}: {added * 1000:.0f} ms, delete {UPDATE_DOCS:,}: "
+              f"{deleted * 1000:.0f} ms")
+
+        searches = []
+        started = time.perf_counter()
+        for i, text in enumerate(texts[size + UPDATE_DOCS:]):
+            index.add([text])
+            search_started = time.perf_counter()
+            index.search(queries[i % len(queries)], args.k)
+            searches.append(time.perf_counter() - search_started)
+        interleaved = time.perf_counter() - started
+        for query in queries:
+            if not np.allclose(index.search(query, args.k)[0],
+                               exhaustive(index, query, args.k)[0], rtol=1e-9, atol=0):
+                raise AssertionError(f"Search with buffered documents differs for {query!r}")
+        p50, p99 = np.percentile(searches, [50, 99]) * 1000
+        print(f"  add one + search, x{UPDATE_DOCS:,}: {interleaved:.1f} s, search p50 "
+              f"{p50:.2f} ms / p99 {p99:.2f} ms, {len(index.segments)} segments")
+
+        started = time.perf_counter()
+        index.compact()
+        print(f"  compact: {time.perf_counter() - started:.2f} s")
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bm25.npz")
+            started = time.perf_counter()
+            index.save(path)
+            saved = time.perf_counter() - started
+            started = time.perf_counter()
+            BM25Index.load(path)
+            loaded = time.perf_counter() - started
+            print(f"  save: {saved:.2f} s, load: {loaded:.2f} s, "
+                  f"{os.path.getsize(path) / 2**20:.1f} MiB on disk")
+
+
+if __name__ == "__main__":
+    main()
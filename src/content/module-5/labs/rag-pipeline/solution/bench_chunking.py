@@ -0,0 +1,147 @@
+"""
+Benchmark: recursive character splitting vs structure-aware markdown chunking.
+
+Speed and memory, on a synthetic corpus built from the sample documents
+(`ingest.synthetic_documents`):
+
+    recursive    split_text (1000/200 overlap), chunks kept as copied strings
+                 in {"page_content", "metadata"} dicts, as the lab stores them
+    markdown     split_markdown, chunks kept as offsets in a ChunkStore
+                 alongside the document text
+
+Retrieval quality, on the sample documents themselves, for questions whose
+answer is one known section: hit@1 (the top chunk overlaps the answer
+section) and precision@3 (the share of the characters in the top three
+chunks that belong to the answer section, i.e. how much of the context an
+LLM would be given is on topic).
+
+Usage:
+    python bench_chunking.py
+    python bench_chunking.py --documents 100000
+"""
+
+import argparse
+import re
+import time
+import tracemalloc
+
+from chunking import ChunkStore, split_markdown
+from ingest import synthetic_documents
+from rag_pipeline import (CHUNK_OVERLAP, CHUNK_SIZE, DocumentIndexer, HybridRetriever,
+                          sample_documents, split_text)
+
+# Questions and the (source, section heading) holding their answer
+QUESTIONS = [
+    ("How do I reset my password?", "user_guide.md", "Resetting Your Password"),
+    ("How long does my password need to be?", "user_guide.md", "Password Requirements"),
+    ("How do I enable two-factor authentication?", "user_guide.md",
+     "Two-Factor Authentication"),
+    ("How do I sign up and verify my email?", "user_guide.md", "Account Setup"),
+    ("How do I change my display name or profile picture?", "user_guide.md",
+     "Profile Settings"),
+    ("Who can see my profile?", "user_guide.md", "Privacy Controls"),
+    ("What are the API rate limits?", "api_reference.md", "Rate Limits"),
+    ("How do I generate an API key?", "api_reference.md", "Getting an API Key"),
+    ("How do I authenticate API requests?", "api_reference.md", "Authentication"),
+    ("How do I create a new project through the API?", "api_reference.md", "POST /projects"),
+    ("What does error code 403 mean?", "api_reference.md", "Error Handling"),
+    ("Can I get a refund?", "faq.md", "Can I get a refund?"),
+    ("How do I cancel my subscription?", "faq.md", "How do I cancel my subscription?"),
+    ("Is my data encrypted?", "faq.md", "Is my data secure?"),
+    ("Is there an app for Android or iPhone?", "faq.md", "Do you support mobile devices?"),
+    ("Which tools can I integrate with?", "faq.md", "Can I integrate with other tools?"),
+    ("What is the support phone number?", "faq.md", "How do I contact support?"),
+]
+
+_HEADING = re.compile(r'^(#{1,6})[ \t]+(.+?)[ \t]*$', re.MULTILINE)
+
+
+def section_span(text: str, title: str) -> tuple[int, int]:
+    """Offsets of the section headed `title`, up to the next heading of its level or above."""
+    headings = list(_HEADING.finditer(text))
+    for i, heading in enumerate(headings):
+        if heading.group(2) == title:
+            level = len(heading.group(1))
+            end = next((later.start() for later in headings[i + 1:]
+                        if len(later.group(1)) <= level), len(text))
+            return heading.start(), end
+    raise ValueError(f"No section {title!r}")
+
+
+def split_recursive(documents) -> list[dict]:
+    chunks = []
+    for name, text in documents:
+        for number, piece in enumerate(split_text(text, CHUNK_SIZE, CHUNK_OVERLAP)):
+            chunks.append({'page_content': piece, 'metadata': {'source': name, 'chunk': number}})
+    return chunks
+
+
+def split_into_store(documents) -> ChunkStore:
+    store = ChunkStore()
+    for name, text in documents:
+        document = store.add_document(text, {'source': name})
+        for number, (start, end, headings) in enumerate(split_markdown(text, CHUNK_SIZE)):
+            store.add(document, start, end, number, headings)
+    return store
+
+
+def measure(split, count: int) -> tuple[int, float, int, int]:
+    """(chunks, seconds, bytes held, characters) for splitting `count` synthetic documents."""
+    characters = sum(len(text) for _, text in synthetic_documents(count))
+    started = time.perf_counter()
+    chunks = split(synthetic_documents(count))
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    chunks = split(synthetic_documents(count))
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(chunks), seconds, held, characters
+
+
+def retrieval_quality(chunker: str, k: int = 3) -> tuple[float, float, int]:
+    """(hit@1, precision@k, chunks) over `QUESTIONS` for an indexer using `chunker`."""
+    indexer = DocumentIndexer(chunker=chunker)
+    documents = sample_documents()
+    indexer.index_documents(documents)
+    texts = {document['metadata']['source']: document['page_content'] for document in documents}
+
+    retriever = HybridRetriever(indexer)
+    results = retriever.retrieve_batch([question for question, _, _ in QUESTIONS], k=k)
+    hits, relevant, total = 0, 0, 0
+    for (_, source, title), chunks in zip(QUESTIONS, results):
+        start, end = section_span(texts[source], title)
+        for rank, chunk in enumerate(chunks):
+            metadata = chunk['metadata']
+            overlap = 0
+            if metadata['source'] == source:
+                overlap = max(0, min(end, metadata['end']) - max(start, metadata['start']))
+            hits += rank == 0 and overlap > 0
+            relevant += overlap
+            total += metadata['end'] - metadata['start']
+    return hits / len(QUESTIONS), relevant / total, len(indexer.chunks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark markdown chunking")
+    parser.add_argument("--documents", type=int, default=20_000,
+                        help="Synthetic documents for the speed and memory comparison")
+    args = parser.parse_args()
+
+    print(f"{'splitter':<10} {'chunks':>9} {'chunks/s':>9} {'MB/s':>6} {'held':>9} "
+          f"{'per chunk':>10} {'held/text':>10}")
+    for name, split in (('recursive', split_recursive), ('markdown', split_into_store)):
+        chunks, seconds, held, characters = measure(split, args.documents)
+        print(f"{name:<10} {chunks:>9,} {chunks / seconds:>9.0f} "
+              f"{characters / seconds / 1e6:>6.1f} "
+              f"{held / 2**20:>5.0f} MiB {held / chunks:>8.0f} B {held / characters:>9.2f}x")
+
+    print(f"\n{len(QUESTIONS)} questions over the sample docs\n")
+    print(f"{'chunker':<10} {'chunks':>7} {'hit@1':>6} {'precision@3':>12}")
+    for chunker in ('recursive', 'markdown'):
+        hit, precision, chunks = retrieval_quality(chunker)
+        print(f"{chunker:<10} {chunks:>7} {hit:>6.0%} {precision:>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
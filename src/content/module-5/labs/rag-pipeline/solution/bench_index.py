@@ -0,0 +1,119 @@
+"""
+Benchmark: vector search throughput and memory per chunk.
+
+Builds a `VectorIndex` of 1k, 100k and 1M chunks and measures queries/s for
+
+    loop        one matrix-vector product and a full argsort per query
+                (the straightforward implementation)
+    search x1   VectorIndex.search, one query at a time
+    search x32  VectorIndex.search, 32 queries per matrix multiply
+
+The 1k index holds real embeddings of sample-doc chunks, built through
+`DocumentIndexer`, so its memory figure includes chunk text, metadata and
+the BM25 postings. Larger indexes are filled with random unit vectors: exact
+search cost depends only on the number and dimension of the vectors, not
+their values. The 1M index needs about 1 GiB at the default 256 dimensions.
+
+Usage:
+    python bench_index.py
+    python bench_index.py --sizes 1000 100000 --dim 384 --seconds 2
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from embeddings import DEFAULT_DIM, HashingEmbedder
+from rag_pipeline import DocumentIndexer, sample_documents
+from vector_index import VectorIndex, normalize_rows
+
+QUERIES = [
+    "How do I reset my password?",
+    "What are the API rate limits?",
+    "How do I enable two-factor authentication?",
+    "Can I export my data?",
+]
+
+FILL_BLOCK = 100_000
+
+
+def real_index(size: int, dim: int) -> tuple[DocumentIndexer, int]:
+    """Index sample-doc chunks, repeated until there are `size`; returns (indexer, bytes)."""
+    indexer = DocumentIndexer(HashingEmbedder(dim), chunk_size=300, chunk_overlap=50)
+    documents = sample_documents()
+    tracemalloc.start()
+    copy = 0
+    while len(indexer.chunks) < size:
+        batch = [{'page_content': f"{doc['page_content']}\n\nrevision {copy}",
+                  'metadata': {**doc['metadata'], 'copy': copy}} for doc in documents]
+        indexer.index_documents(batch)
+        copy += 1
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return indexer, used
+
+
+def random_index(size: int, dim: int, rng: np.random.Generator) -> VectorIndex:
+    index = VectorIndex(dim, capacity=size)
+    for start in range(0, size, FILL_BLOCK):
+        index.add(rng.standard_normal((min(FILL_BLOCK, size - start), dim), dtype=np.float32))
+    return index
+
+
+def loop_search(index: VectorIndex, queries: np.ndarray, k: int) -> None:
+    for query in normalize_rows(queries):
+        scores = index.matrix @ query
+        np.argsort(-scores)[:k]
+
+
+def throughput(run, queries: np.ndarray, batch: int, seconds: float) -> float:
+    """Queries/s of `run(batch_of_queries)` over about `seconds` of wall time."""
+    done, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds or done == 0:
+        offset = (done % len(queries))
+        run(np.roll(queries, -offset, axis=0)[:batch])
+        done += batch
+    return done / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the in-memory vector index")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=1.0,
+                        help="Time spent measuring each mode")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embedder = HashingEmbedder(args.dim)
+    queries = embedder.embed_documents(QUERIES * 16)
+
+    print(f"dim {args.dim}, k {args.k}\n")
+    print(f"{'chunks':>9} {'build':>7} {'loop':>9} {'search x1':>10} {'search x32':>11} "
+          f"{'vectors/chunk':>14} {'total/chunk':>12}")
+    for size in args.sizes:
+        started = time.perf_counter()
+        if size <= 10_000:
+            indexer, used = real_index(size, args.dim)
+            index = indexer.index
+            total = f"{used / len(index):>10.0f} B"
+        else:
+            index = random_index(size, args.dim, rng)
+            total = f"{'-':>12}"
+        build = time.perf_counter() - started
+
+        loop = throughput(lambda batch: loop_search(index, batch, args.k), queries, 1,
+                          args.seconds)
+        single = throughput(lambda batch: index.search(batch, args.k), queries, 1, args.seconds)
+        batched = throughput(lambda batch: index.search(batch, args.k), queries, 32,
+                             args.seconds)
+        print(f"{len(index):>9,} {build:>6.1f}s {loop:>7.0f}/s {single:>8.0f}/s "
+              f"{batched:>9.0f}/s {index.nbytes / len(index):>12.0f} B {total}")
+        del index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark: eager loading vs streaming ingestion at growing corpus sizes.
+
+Synthesizes markdown corpora from the sample documents (see
+`ingest.synthesize_corpus`) and ingests each in a fresh process with
+
+    eager        DocumentIndexer.load_documents + index_documents
+    streaming    IngestionPipeline into the same in-memory index
+    discard      IngestionPipeline with a sink that drops the vectors
+
+reporting chunks/s and the process's peak memory. `discard` isolates the
+pipeline's own footprint, which should stay flat as the corpus grows;
+`streaming` adds the index's per-chunk cost; `eager` also holds the whole
+corpus text and all chunks before embedding.
+
+Usage:
+    python bench_ingest.py
+    python bench_ingest.py --sizes 1000 10000 --corpus /tmp/corpus
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from ingest import IngestionPipeline, synthesize_corpus
+
+MODES = ('eager', 'streaming', 'discard')
+
+
+def measure(mode: str, corpus: str) -> dict:
+    """Ingest `corpus` in this process; returns chunks, seconds and peak MiB."""
+    from rag_pipeline import DocumentIndexer
+
+    indexer = DocumentIndexer()
+    started = time.perf_counter()
+    if mode == 'eager':
+        indexer.index_documents(indexer.load_documents(corpus))
+        chunks = len(indexer.chunks)
+    else:
+        sink = (lambda batch, vectors: None) if mode == 'discard' else None
+        stats = IngestionPipeline(indexer, sink=sink).run([corpus])
+        chunks = stats['stages'][-1]['items']
+    return {'chunks': chunks, 'seconds': time.perf_counter() - started,
+            'peak_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark streaming corpus ingestion")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2_000, 20_000, 100_000],
+                        help="Corpus sizes in files")
+    parser.add_argument("--corpus", help="Directory for the synthetic corpora "
+                                         "(default: a temporary directory)")
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "CORPUS"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(*args.measure)))
+        return
+
+    root = args.corpus or tempfile.mkdtemp(prefix="rag-corpus-")
+    print(f"{'files':>8} {'chars':>6} {'mode':<10} {'chunks':>8} {'chunks/s':>9} {'peak':>9}")
+    for size in args.sizes:
+        corpus = os.path.join(root, str(size))
+        characters = synthesize_corpus(corpus, size)
+        for mode in MODES:
+            output = subprocess.run([sys.executable, __file__, "--measure", mode, corpus],
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output)
+            print(f"{size:>8,} {characters / 1e6:>5.0f}M {mode:<10} {result['chunks']:>8,} "
+                  f"{result['chunks'] / result['seconds']:>9.0f} "
+                  f"{result['peak_mib']:>6.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,560 @@
+"""
+BM25 Inverted Index
+
+An Okapi BM25 keyword index built for top-k retrieval over millions of
+chunks, replacing the lab's `rank_bm25.BM25Okapi` (which scores every
+document in Python on every query and is rebuilt whenever the corpus
+changes).
+
+Layout:
+
+- Postings are NumPy arrays grouped by term and sorted by document id
+  (int32 ids, float32 term frequencies); document lengths are one float32
+  array. Scores are computed from these at query time, so corpus-wide
+  statistics (document count, average length, document frequencies) can
+  change without touching the postings.
+- Document ids are split into ranges of `RANGE_SIZE`. For every term and
+  range the index keeps the largest term frequency and smallest document
+  length, which give an upper bound on the term's BM25 contribution to any
+  document in the range.
+
+Top-k search combines block-max and MaxScore pruning:
+
+1. the bounds of the query's terms are summed per range, and the ranges
+   with the highest bounds are scored exactly, which sets a k-th score to
+   beat;
+2. ranges whose bound cannot beat it are skipped;
+3. query terms whose bounds together cannot beat it are non-essential: only
+   documents with an essential term are candidates, and the non-essential
+   terms are looked up (by binary search) only for candidates whose range
+   bounds leave them a chance.
+
+Results are those of exhaustive scoring. Frequent terms such as "how" or
+"my" are usually non-essential, so their long posting lists are never read
+in full.
+
+Updates are log-structured:
+
+- `add` buffers new documents, which become an immutable segment every
+  `SEGMENT_DOCS` documents; until then searches scan the buffer's postings
+  for the query terms. `MERGE_FACTOR` segments of the same size tier are
+  merged into one, so there are O(log n) segments, each posting is
+  rewritten O(log n) times, and nothing is rebuilt.
+- `delete` marks documents in a bitmap and updates the document count and
+  average length at once. As in Lucene, document frequencies still count
+  deleted documents until their segment is merged or `compact` is called.
+
+`save` writes one compressed .npz file: delta-encoded document ids,
+16-bit term frequencies and the vocabulary as a single byte string.
+
+Example:
+    >>> index = BM25Index()
+    >>> ids = index.add(["Reset your password", "API rate limits"])
+    >>> scores, ids = index.search("password reset", k=5)
+"""
+
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from embeddings import tokenize
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Documents per range; each term keeps score bounds per range it occurs in
+RANGE_SIZE = 256
+
+# Buffered documents that become a segment
+SEGMENT_DOCS = 50_000
+
+# Segments of one size tier that are merged into a segment of the next tier
+MERGE_FACTOR = 4
+
+# Segments of up to this many documents are in the lowest tier; tier t holds
+# segments of MIN_TIER_DOCS * MERGE_FACTOR**t documents or more
+MIN_TIER_DOCS = 1024
+
+# Most promising ranges scored first to set the score to beat
+FIRST_RANGES = 16
+
+FORMAT_VERSION = 1
+
+
+def _ragged(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of `np.arange(s, e)` for each (s, e) pair, without a Python loop."""
+    lengths = ends - starts
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(int(lengths.sum()))
+
+
+def _top(scores: np.ndarray, ids: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """The `k` best (scores, ids), best first, ties by lower id."""
+    if len(scores) > k:
+        keep = np.argpartition(-scores, k - 1)[:k]
+        scores, ids = scores[keep], ids[keep]
+    order = np.lexsort((ids, -scores))
+    return scores[order], ids[order]
+
+
+class _Segment:
+    """
+    Immutable postings of a set of documents, grouped by term.
+
+    Term i of the segment (global id `term_ids[i]`) has postings
+    `docs[offsets[i]:offsets[i + 1]]` and score ranges
+    `range_ids[term_ranges[i]:term_ranges[i + 1]]`; range j covers postings
+    `range_bounds[j]:range_bounds[j + 1]`.
+    """
+
+    def __init__(self, terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+                 lengths: np.ndarray, documents: int):
+        # Documents covered, including those without postings; sets the merge tier
+        self.documents = documents
+        order = np.lexsort((docs, terms))
+        terms = terms[order]
+        self.docs = docs[order].astype(np.int32)
+        self.tfs = tfs[order].astype(np.float32)
+
+        new_term = np.empty(len(terms), dtype=bool)
+        new_term[0] = True
+        np.not_equal(terms[1:], terms[:-1], out=new_term[1:])
+        term_starts = np.flatnonzero(new_term)
+        self.term_ids = terms[term_starts].astype(np.int32)
+        self.offsets = np.append(term_starts, len(terms))
+
+        ranges = self.docs // RANGE_SIZE
+        new_range = new_term.copy()
+        new_range[1:] |= ranges[1:] != ranges[:-1]
+        range_starts = np.flatnonzero(new_range)
+        self.range_ids = ranges[range_starts]
+        self.range_bounds = np.append(range_starts, len(terms))
+        self.range_max_tf = np.maximum.reduceat(self.tfs, range_starts)
+        self.range_min_length = np.minimum.reduceat(lengths[self.docs], range_starts)
+        self.term_ranges = np.searchsorted(range_starts, self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in (
+            self.docs, self.tfs, self.term_ids, self.offsets, self.range_ids,
+            self.range_bounds, self.range_max_tf, self.range_min_length, self.term_ranges))
+
+    def find(self, term: int) -> int:
+        """Position of global term id `term` in this segment, or -1."""
+        # Needles of the array's dtype, or NumPy casts (copies) the whole array
+        i = int(np.searchsorted(self.term_ids, np.int32(term)))
+        return i if i < len(self.term_ids) and self.term_ids[i] == term else -1
+
+    def triples(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(term id, doc id, tf) of every posting."""
+        return np.repeat(self.term_ids, np.diff(self.offsets)), self.docs, self.tfs
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a segmented inverted index with block-max top-k pruning.
+
+    Documents get consecutive ids starting at 0, in the order they are added.
+
+    Args:
+        k1: Term frequency saturation.
+        b: Document length normalization.
+        segment_docs: Buffered documents that become a segment.
+    """
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B,
+                 segment_docs: int = SEGMENT_DOCS):
+        self.k1 = k1
+        self.b = b
+        self.segment_docs = segment_docs
+        self.vocabulary = {}
+        self.segments = []
+        self.size = 0
+        self.live = 0
+        self._total_length = 0.0
+        self._lengths = np.zeros(1024, dtype=np.float32)
+        self._deleted = np.zeros(1024, dtype=bool)
+        # Unsealed postings: term id -> (doc ids, tfs), in document order
+        self._buffer = {}
+        self._buffer_start = 0
+
+    def __len__(self) -> int:
+        """Number of documents not deleted."""
+        return self.live
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of postings, range bounds and per-document arrays (not the vocabulary)."""
+        return (sum(segment.nbytes for segment in self.segments)
+                + sum(8 * len(docs) for docs, _ in self._buffer.values())
+                + self._lengths[:self.size].nbytes + self._deleted[:self.size].nbytes)
+
+    # -------------------------------------------------------------------------
+    # Updates
+    # -------------------------------------------------------------------------
+
+    def add(self, texts: list[str]) -> np.ndarray:
+        """
+        Index texts.
+
+        Returns:
+            Their document ids, continuing from the last id assigned.
+        """
+        first = self.size
+        self._reserve(first + len(texts))
+        buffer = self._buffer
+        vocabulary = self.vocabulary
+        for doc, text in enumerate(texts, first):
+            counts = Counter(tokenize(text))
+            for token, count in counts.items():
+                term = vocabulary.get(token)
+                if term is None:
+                    term = vocabulary[token] = len(vocabulary)
+                postings = buffer.get(term)
+                if postings is None:
+                    postings = buffer[term] = (array('i'), array('f'))
+                postings[0].append(doc)
+                postings[1].append(count)
+            length = sum(counts.values())
+            self._lengths[doc] = length
+            self._total_length += length
+
+        self.size += len(texts)
+        self.live += len(texts)
+        if self.size - self._buffer_start >= self.segment_docs:
+            self._seal()
+        return np.arange(first, self.size)
+
+    def delete(self, ids) -> int:
+        """
+        Delete documents; they are never returned again.
+
+        Args:
+            ids: Document ids; unknown or already deleted ids are ignored.
+
+        Returns:
+            The number of documents deleted.
+        """
+        ids = np.unique(np.asarray(ids, dtype=np.int64))
+        ids = ids[(ids >= 0) & (ids < self.size)]
+        ids = ids[~self._deleted[ids]]
+        self._deleted[ids] = True
+        self.live -= len(ids)
+        self._total_length -= float(self._lengths[ids].sum())
+        return len(ids)
+
+    def compact(self) -> None:
+        """Merge everything into one segment, dropping deleted documents' postings."""
+        self._seal()
+        if self.segments and (len(self.segments) > 1 or self._deleted[:self.size].any()):
+            self.segments = [segment for segment in [self._merged(self.segments)] if segment]
+
+    def _reserve(self, size: int) -> None:
+        if size > len(self._lengths):
+            capacity = max(size, 2 * len(self._lengths))
+            self._lengths = np.concatenate(
+                [self._lengths, np.zeros(capacity - len(self._lengths), dtype=np.float32)])
+            self._deleted = np.concatenate(
+                [self._deleted, np.zeros(capacity - len(self._deleted), dtype=bool)])
+
+    def _seal(self) -> None:
+        """Turn buffered postings into a segment and merge small segments."""
+        documents = self.size - self._buffer_start
+        self._buffer_start = self.size
+        if not self._buffer:
+            return
+        docs, tfs = array('i'), array('f')
+        for term_docs, term_tfs in self._buffer.values():
+            docs.extend(term_docs)
+            tfs.extend(term_tfs)
+        terms = np.repeat(np.fromiter(self._buffer, dtype=np.int32, count=len(self._buffer)),
+                          [len(term_docs) for term_docs, _ in self._buffer.values()])
+        segment = _Segment(terms, np.array(docs, dtype=np.int32),
+                           np.array(tfs, dtype=np.float32), self._lengths, documents)
+        self._buffer = {}
+        self.segments.append(segment)
+
+        # Tiered merging: MERGE_FACTOR segments of a tier become one of the next
+        while len(self.segments) >= MERGE_FACTOR:
+            tail = self.segments[-MERGE_FACTOR:]
+            if len({self._tier(segment) for segment in tail}) > 1:
+                break
+            merged = self._merged(tail)
+            self.segments[-MERGE_FACTOR:] = [merged] if merged else []
+
+    @staticmethod
+    def _tier(segment: _Segment) -> int:
+        """floor(log(documents / MIN_TIER_DOCS)) in base MERGE_FACTOR, at least 0."""
+        tier, size = 0, MIN_TIER_DOCS * MERGE_FACTOR
+        while segment.documents >= size:
+            tier, size = tier + 1, size * MERGE_FACTOR
+        return tier
+
+    def _merged(self, segments: list) -> _Segment | None:
+        terms, docs, tfs = (np.concatenate(column) for column in
+                            zip(*(segment.triples() for segment in segments)))
+        keep = ~self._deleted[docs]
+        if not keep.any():
+            return None
+        return _Segment(terms[keep], docs[keep], tfs[keep], self._lengths,
+                        sum(segment.documents for segment in segments))
+
+    # -------------------------------------------------------------------------
+    # Search
+    # -------------------------------------------------------------------------
+
+    def _postings(self, query: str) -> tuple[list[tuple], list[tuple]]:
+        """
+        Postings of the query terms.
+
+        Returns:
+            (lists, buffered): (term, idf, segment, segment term position)
+            for each query term and segment holding it, and (term, idf,
+            docs, tfs) for each query term in the unsealed buffer.
+        """
+        terms = {self.vocabulary[token] for token in tokenize(query)
+                 if token in self.vocabulary}
+        lists, buffered = [], []
+        for term in sorted(terms):
+            found = [(segment, segment.find(term)) for segment in self.segments]
+            found = [(segment, i) for segment, i in found if i >= 0]
+            docs, tfs = self._buffer.get(term, ((), ()))
+            frequency = min(sum(int(segment.offsets[i + 1] - segment.offsets[i])
+                                for segment, i in found) + len(docs), self.live)
+            idf = float(np.log(1 + (self.live - frequency + 0.5) / (frequency + 0.5)))
+            lists.extend((term, idf, segment, i) for segment, i in found)
+            if len(docs):
+                buffered.append((term, idf, np.array(docs, dtype=np.int32),
+                                 np.array(tfs, dtype=np.float32)))
+        return lists, buffered
+
+    def _term_scores(self, idf: float, tfs: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+        norm = self.k1 * (1 - self.b + self.b * lengths / np.float32(self._average_length()))
+        return idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+    def _average_length(self) -> float:
+        return max(self._total_length / self.live, 1.0) if self.live else 1.0
+
+    def search(self, query: str, k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Top `k` documents for `query` by BM25 score.
+
+        Returns:
+            (scores, ids), best first, only documents sharing a term with
+            the query. Identical to exhaustive scoring, except that documents
+            tied with the k-th score may be swapped for one another.
+        """
+        lists, buffered = self._postings(query)
+        if k < 1 or not (lists or buffered):
+            return np.empty(0), np.empty(0, dtype=np.int64)
+        scores, ids = self._search_segments(lists, k)
+        if not buffered:
+            return scores, ids
+
+        # Buffered documents are few: score them all
+        docs = np.concatenate([docs for _, _, docs, _ in buffered])
+        partial = np.concatenate([self._term_scores(idf, tfs, self._lengths[docs])
+                                  for _, idf, docs, tfs in buffered])
+        totals = np.bincount(docs - self._buffer_start, partial.astype(np.float64))
+        hits = np.flatnonzero(totals)
+        buffered_ids = hits + self._buffer_start
+        live = ~self._deleted[buffered_ids]
+        return _top(np.concatenate([scores, totals[hits][live]]),
+                    np.concatenate([ids, buffered_ids[live]]), k)
+
+    def _search_segments(self, lists: list[tuple], k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Top `k` over the sealed segments; see `search`."""
+        if not lists:
+            return np.empty(0), np.empty(0, dtype=np.int64)
+
+        # Upper bound of every range: the sum of its terms' bounds
+        upper = np.zeros((self.size + RANGE_SIZE - 1) // RANGE_SIZE)
+        bounds = []
+        for _, idf, segment, i in lists:
+            r0, r1 = segment.term_ranges[i], segment.term_ranges[i + 1]
+            bound = self._term_scores(idf, segment.range_max_tf[r0:r1],
+                                      segment.range_min_length[r0:r1])
+            upper[segment.range_ids[r0:r1]] += bound
+            bounds.append(bound)
+
+        # The most promising ranges, scored exactly, give a k-th score to beat
+        first = np.flatnonzero(upper)
+        if len(first) > FIRST_RANGES:
+            first = first[np.argpartition(-upper[first], FIRST_RANGES)[:FIRST_RANGES]]
+        best_scores, best_ids = _top(*self._score_ranges(lists, np.sort(first)), k)
+        threshold = best_scores[-1] if len(best_scores) == k else 0.0
+        alive = upper > threshold
+        alive[first] = False
+        if not alive.any():
+            return best_scores, best_ids
+
+        # MaxScore: the lowest-scoring terms whose maxima together cannot beat
+        # the threshold are non-essential; a document needs an essential term
+        maxima = {}
+        for (term, _, segment, i), bound in zip(lists, bounds):
+            ranges = segment.range_ids[segment.term_ranges[i]:segment.term_ranges[i + 1]]
+            maxima[term] = max(maxima.get(term, 0.0),
+                               float(bound[alive[ranges]].max(initial=0.0)))
+        non_essential, total = set(), 0.0
+        for term in sorted(maxima, key=maxima.get):
+            total += maxima[term]
+            if total > threshold:
+                break
+            non_essential.add(term)
+        if len(non_essential) == len(maxima):
+            return best_scores, best_ids
+
+        # Candidates: essential postings in ranges still alive, with partial scores
+        docs, partial = [], []
+        rest = np.zeros_like(upper)
+        for (term, idf, segment, i), bound in zip(lists, bounds):
+            r0, r1 = segment.term_ranges[i], segment.term_ranges[i + 1]
+            if term in non_essential:
+                rest[segment.range_ids[r0:r1]] += bound
+                continue
+            start, end = segment.offsets[i], segment.offsets[i + 1]
+            postings = np.flatnonzero(alive[segment.docs[start:end] // RANGE_SIZE]) + start
+            docs.append(segment.docs[postings])
+            partial.append(self._term_scores(idf, segment.tfs[postings],
+                                             self._lengths[docs[-1]]))
+        docs, partial = np.concatenate(docs), np.concatenate(partial).astype(np.float64)
+        if len(maxima) - len(non_essential) > 1:
+            order = np.argsort(docs, kind='stable')
+            docs, partial = docs[order], partial[order]
+            starts = np.flatnonzero(np.diff(docs, prepend=-1))
+            docs, partial = docs[starts], np.add.reduceat(partial, starts)
+
+        # Only candidates that could still beat the threshold need the rest of their score
+        keep = (partial + rest[docs // RANGE_SIZE] > threshold) & ~self._deleted[docs]
+        docs, partial = docs[keep], partial[keep]
+        for term, idf, segment, i in lists:
+            if term in non_essential:
+                partial += self._lookup(idf, segment, i, docs)
+
+        return _top(np.concatenate([best_scores, partial]),
+                    np.concatenate([best_ids, docs]), k)
+
+    def _score_ranges(self, lists: list[tuple], ranges: np.ndarray) -> tuple:
+        """Exact scores of the live documents in sorted `ranges` that match the query."""
+        scores = np.zeros(len(ranges) * RANGE_SIZE)
+        for _, idf, segment, i in lists:
+            r0, r1 = segment.term_ranges[i], segment.term_ranges[i + 1]
+            term_ranges = segment.range_ids[r0:r1]
+            found = np.minimum(np.searchsorted(term_ranges, ranges.astype(np.int32)),
+                               len(term_ranges) - 1)
+            matched = np.flatnonzero(term_ranges[found] == ranges)
+            if not len(matched):
+                continue
+            spans = r0 + found[matched]
+            starts, ends = segment.range_bounds[spans], segment.range_bounds[spans + 1]
+            postings = _ragged(starts, ends)
+            docs = segment.docs[postings]
+            slots = np.repeat(matched, ends - starts) * RANGE_SIZE + docs % RANGE_SIZE
+            scores[slots] += self._term_scores(idf, segment.tfs[postings], self._lengths[docs])
+
+        ids = (ranges[:, None] * RANGE_SIZE + np.arange(RANGE_SIZE)).ravel()
+        hits = np.flatnonzero(scores)
+        ids = ids[hits]
+        live = ~self._deleted[ids]
+        return scores[hits][live], ids[live]
+
+    def _lookup(self, idf: float, segment: _Segment, i: int, ids: np.ndarray) -> np.ndarray:
+        """One term's contribution to the scores of `ids` (zero where it does not occur)."""
+        start, end = segment.offsets[i], segment.offsets[i + 1]
+        docs = segment.docs[start:end]
+        found = np.minimum(np.searchsorted(docs, ids.astype(np.int32)), len(docs) - 1)
+        hit = np.flatnonzero(docs[found] == ids)
+        scores = np.zeros(len(ids))
+        scores[hit] = self._term_scores(idf, segment.tfs[start + found[hit]],
+                                        self._lengths[ids[hit]])
+        return scores
+
+    def score(self, query: str, ids) -> np.ndarray:
+        """BM25 scores of the given documents for `query` (zero for deleted or unmatched ones)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        scores = np.zeros(len(ids))
+        lists, buffered = self._postings(query)
+        for _, idf, segment, i in lists:
+            scores += self._lookup(idf, segment, i, ids)
+        in_buffer = np.flatnonzero(ids >= self._buffer_start)
+        for _, idf, docs, tfs in buffered:
+            # Buffered postings are in document order
+            found = np.minimum(np.searchsorted(docs, ids[in_buffer]), len(docs) - 1)
+            match = docs[found] == ids[in_buffer]
+            hit = in_buffer[match]
+            scores[hit] += self._term_scores(idf, tfs[found[match]], self._lengths[ids[hit]])
+        scores[self._deleted[ids]] = 0.0
+        return scores
+
+    # -------------------------------------------------------------------------
+    # Persistence
+    # -------------------------------------------------------------------------
+
+    def save(self, path: str) -> None:
+        """
+        Compact the index and write it to `path` as a compressed .npz file.
+
+        Document ids are stored as gaps within each term's postings in the
+        narrowest unsigned type that fits, term frequencies as uint16.
+        """
+        self.compact()
+        if self.segments:
+            segment = self.segments[0]
+            term_ids, docs, tfs, offsets = (segment.term_ids, segment.docs, segment.tfs,
+                                            segment.offsets)
+        else:
+            term_ids, docs, tfs = (np.empty(0, dtype=np.int32),) * 3
+            offsets = np.zeros(1, dtype=np.int64)
+        gaps = np.diff(docs.astype(np.int64), prepend=0)
+        gaps[offsets[:-1]] = docs[offsets[:-1]]
+        vocabulary = sorted(self.vocabulary, key=self.vocabulary.get)
+
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                version=np.array(FORMAT_VERSION),
+                params=np.array([self.k1, self.b, self.size]),
+                vocabulary=np.frombuffer("\n".join(vocabulary).encode(), dtype=np.uint8),
+                term_ids=term_ids,
+                counts=np.diff(offsets).astype(np.min_scalar_type(max(1, len(docs)))),
+                gaps=gaps.astype(np.min_scalar_type(int(gaps.max(initial=0)))),
+                tfs=np.minimum(tfs, np.iinfo(np.uint16).max).astype(np.uint16),
+                lengths=self._lengths[:self.size].astype(np.uint32),
+                deleted=np.packbits(self._deleted[:self.size]),
+            )
+
+    @classmethod
+    def load(cls, path: str) -> 'BM25Index':
+        """Read an index written by `save`."""
+        with np.load(path) as data:
+            if int(data['version']) != FORMAT_VERSION:
+                raise ValueError(f"Unsupported BM25 index format {int(data['version'])}")
+            k1, b, size = data['params']
+            index = cls(float(k1), float(b))
+            text = data['vocabulary'].tobytes().decode()
+            tokens = text.split("\n") if text else []
+            index.vocabulary = {token: i for i, token in enumerate(tokens)}
+
+            size = int(size)
+            index._reserve(size)
+            index.size = size
+            index._buffer_start = size
+            index._lengths[:size] = data['lengths']
+            index._deleted[:size] = np.unpackbits(data['deleted'], count=size).astype(bool)
+            index.live = int(size - index._deleted[:size].sum())
+            index._total_length = float(index._lengths[:size][~index._deleted[:size]].sum())
+
+            counts = data['counts'].astype(np.int64)
+            if len(counts):
+                # Gaps restart at each term's first posting
+                totals = np.cumsum(data['gaps'], dtype=np.int64)
+                starts = np.cumsum(counts) - counts
+                before = np.where(starts > 0, totals[starts - 1], 0)
+                docs = totals - np.repeat(before, counts)
+                terms = np.repeat(data['term_ids'], counts)
+                index.segments = [_Segment(terms, docs, data['tfs'], index._lengths, size)]
+        return index
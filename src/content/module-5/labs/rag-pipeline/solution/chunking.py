@@ -0,0 +1,235 @@
+"""
+Markdown Chunking and Offset-Based Chunk Storage
+
+`split_markdown` chunks markdown along its structure instead of at
+character counts:
+
+- every heading starts a new chunk, and each chunk records its heading
+  breadcrumb, e.g. ("User Guide", "Getting Started", "Resetting Your
+  Password");
+- a heading with nothing under it but a subheading stays with that
+  subsection, so no chunk is a bare title;
+- sections longer than the chunk size are cut at the last paragraph or
+  list item boundary that fits, then at a line, then at a space;
+- fenced code blocks are never mistaken for headings or lists.
+
+Chunks are returned as (start, end, headings) offsets, not strings.
+`ChunkStore` keeps each document's text once and each chunk as a row of
+integers pointing into it, so stored chunks cost a few dozen bytes instead
+of a copied (and, with overlap, partly duplicated) string plus a metadata
+dict. Chunk text and metadata are materialized only when a chunk is read,
+which for a retriever means only for the results it returns.
+
+Example:
+    >>> spans = split_markdown(USER_GUIDE, chunk_size=1000)
+    >>> start, end, headings = spans[2]
+    >>> headings
+    ('User Guide', 'Getting Started', 'Password Requirements')
+"""
+
+import bisect
+import re
+from array import array
+
+# Lines that start sections (headings) or toggle code fences
+_STRUCTURE = re.compile(r'^(?:[ \t]{0,3}(?P<fence>```|~~~)|(?P<level>#{1,6})[ \t]+(?P<title>.*?)'
+                        r'[ \t#]*$)', re.MULTILINE)
+# Paragraph and list item starts: preferred places to cut a long section
+_BLOCK_START = re.compile(r'(?:^|\n)[ \t]*\n(?=[ \t]*\S)|^(?=[ \t]*(?:[-*+]|\d{1,9}[.)])[ \t])',
+                          re.MULTILINE)
+_LINE_START = re.compile(r'^(?=.)', re.MULTILINE)
+_NON_SPACE = re.compile(r'\S')
+
+
+# =============================================================================
+# MARKDOWN SPLITTING
+# =============================================================================
+
+def split_markdown(text: str, chunk_size: int = 1000) -> list[tuple[int, int, tuple[str, ...]]]:
+    """
+    Split markdown into chunks along headings, paragraphs and list items.
+
+    Args:
+        text: Markdown source.
+        chunk_size: Largest chunk length in characters.
+
+    Returns:
+        (start, end, headings) for each chunk in order, where
+        `text[start:end]` is the chunk without surrounding whitespace and
+        `headings` is the breadcrumb of the section it belongs to.
+    """
+    chunks = []
+    for start, end, headings in _sections(text):
+        start, end = _trim(text, start, end)
+        if end - start <= chunk_size:
+            if start < end:
+                chunks.append((start, end, headings))
+            continue
+
+        # Rare: only long sections pay for finding their inner boundaries
+        strong = [match.end() for match in _BLOCK_START.finditer(text, start, end)]
+        weak = [match.start() for match in _LINE_START.finditer(text, start, end)]
+        while end - start > chunk_size:
+            cut = _cut(text, start, start + chunk_size, strong, weak)
+            chunks.append((*_trim(text, start, cut), headings))
+            start, end = _trim(text, cut, end)
+        if start < end:
+            chunks.append((start, end, headings))
+    return chunks
+
+
+def _sections(text: str) -> list[tuple[int, int, tuple[str, ...]]]:
+    """
+    (start, end, headings) of each heading's section, in order.
+
+    A heading followed only by whitespace before the next heading shares
+    that heading's section. Text before the first heading forms a section
+    with no headings.
+    """
+    sections = []
+    levels, titles = [], []
+    start, headings, body = 0, (), 0
+    fence = None
+
+    for match in _STRUCTURE.finditer(text):
+        marker, hashes, title = match.groups()
+        if marker:
+            if fence is None:
+                fence = marker
+            elif marker == fence:
+                fence = None
+            continue
+        if fence is not None:
+            continue
+
+        level = len(hashes)
+        while levels and levels[-1] >= level:
+            levels.pop()
+            titles.pop()
+        levels.append(level)
+        titles.append(title)
+        position = match.start()
+        if _NON_SPACE.search(text, body, position):
+            sections.append((start, position, headings))
+            start = position
+        # else: nothing since the last heading, which stays with this one
+        headings = tuple(titles)
+        body = match.end()
+
+    sections.append((start, len(text), headings))
+    return sections
+
+
+def _cut(text: str, start: int, limit: int, strong: list[int], weak: list[int]) -> int:
+    """
+    Where to end a chunk that starts at `start` and may not pass `limit`.
+
+    Prefers the last paragraph or list item start, then line start, then
+    space in the second half of the window, so chunks are not cut tiny.
+    """
+    floor = start + (limit - start) // 2
+    for boundaries in (strong, weak):
+        i = bisect.bisect_right(boundaries, limit) - 1
+        if i >= 0 and boundaries[i] > floor:
+            return boundaries[i]
+    space = text.rfind(' ', floor, limit)
+    return space if space > start else limit
+
+
+def _trim(text: str, start: int, end: int) -> tuple[int, int]:
+    """Narrow [start, end) to exclude surrounding whitespace."""
+    first = _NON_SPACE.search(text, start, end)
+    if first is None:
+        return end, end
+    start = first.start()
+    return start, start + len(text[start:end].rstrip())
+
+
+def locate_chunks(text: str, chunks: list[str]) -> list[tuple[int, int]]:
+    """
+    Offsets of chunks that are substrings of `text`, in order.
+
+    Chunks from `rag_pipeline.split_text` may overlap, so each search starts
+    just after the previous chunk's start.
+    """
+    spans, cursor = [], 0
+    for chunk in chunks:
+        start = text.find(chunk, cursor)
+        if start < 0:
+            raise ValueError("Chunk is not a substring of the text")
+        spans.append((start, start + len(chunk)))
+        cursor = start + 1
+    return spans
+
+
+# =============================================================================
+# CHUNK STORAGE
+# =============================================================================
+
+class ChunkStore:
+    """
+    Chunks stored as (document, start, end) offsets into their documents' text.
+
+    Supports `len()`, indexing and iteration; reading a chunk returns a new
+    dict {"page_content": ..., "metadata": {...}} whose metadata is the
+    document's plus `chunk` (number within the document), `id`, `start`,
+    `end` and, for markdown chunks, `headings`.
+    """
+
+    def __init__(self):
+        self._texts = []
+        self._metadata = []
+        self._breadcrumbs = [()]
+        self._breadcrumb_ids = {(): 0}
+        self._documents = array('i')
+        self._starts = array('q')
+        self._ends = array('q')
+        self._numbers = array('i')
+        self._headings = array('i')
+
+    def add_document(self, text: str, metadata: dict) -> int:
+        """Keep a document's text (not copied) and metadata; returns its id."""
+        self._texts.append(text)
+        self._metadata.append(metadata)
+        return len(self._texts) - 1
+
+    def add(self, document: int, start: int, end: int, number: int,
+            headings: tuple[str, ...] = ()) -> int:
+        """Record a chunk of a stored document; returns the chunk id."""
+        breadcrumb = self._breadcrumb_ids.get(headings)
+        if breadcrumb is None:
+            breadcrumb = self._breadcrumb_ids[headings] = len(self._breadcrumbs)
+            self._breadcrumbs.append(headings)
+        self._documents.append(document)
+        self._starts.append(start)
+        self._ends.append(end)
+        self._numbers.append(number)
+        self._headings.append(breadcrumb)
+        return len(self._starts) - 1
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def text(self, i: int) -> str:
+        """The text of chunk `i`."""
+        return self._texts[self._documents[i]][self._starts[i]:self._ends[i]]
+
+    def __getitem__(self, i: int) -> dict:
+        if not -len(self) <= i < len(self):
+            raise IndexError("chunk id out of range")
+        i = int(i) % len(self)
+        metadata = {**self._metadata[self._documents[i]], 'chunk': self._numbers[i],
+                    'id': i, 'start': self._starts[i], 'end': self._ends[i]}
+        headings = self._breadcrumbs[self._headings[i]]
+        if headings:
+            metadata['headings'] = list(headings)
+        return {'page_content': self.text(i), 'metadata': metadata}
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate bytes held for offsets, excluding the shared document text."""
+        return sum(column.itemsize * len(column) for column in
+                   (self._documents, self._starts, self._ends, self._numbers, self._headings))
@@ -0,0 +1,110 @@
+"""
+Local Deterministic Embeddings
+
+A stand-in for `OpenAIEmbeddings` so the reference pipeline runs offline and
+gives the same vectors on every machine and run. Texts are embedded by
+signed feature hashing:
+
+- text is lowercased and split into word tokens;
+- each unigram and (at half weight) each adjacent word pair is hashed with
+  CRC-32 to a dimension and a sign, so collisions cancel out on average
+  instead of piling up;
+- term frequencies are damped (1 + log tf) and every vector is L2-normalized,
+  so a dot product is the cosine similarity.
+
+Texts sharing words land close together, which is enough to exercise and
+load-test retrieval; it is not a semantic model. Anything with the same
+`embed_documents`/`embed_query` interface can replace it.
+
+Example:
+    >>> embedder = HashingEmbedder(dim=256)
+    >>> vectors = embedder.embed_documents(["Reset your password", "API rate limits"])
+    >>> vectors.shape, vectors.dtype
+    ((2, 256), dtype('float32'))
+"""
+
+import math
+import re
+import zlib
+
+import numpy as np
+
+DEFAULT_DIM = 256
+
+# Weight of a word pair relative to a single word
+BIGRAM_WEIGHT = 0.5
+
+# Hashed features remembered before the cache is reset; bounds memory on
+# corpora whose vocabulary keeps growing (numbers, identifiers, bigrams)
+MAX_CACHED_FEATURES = 50_000
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens (letters and digits) of `text`."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class HashingEmbedder:
+    """
+    Signed feature-hashing embedder over word unigrams and bigrams.
+
+    Args:
+        dim: Embedding dimension.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        if dim < 1:
+            raise ValueError("Embedding dimension must be positive")
+        self.dim = dim
+        # Hashing dominates embedding time, and vocabularies repeat heavily
+        self._slots = {}
+
+    def _slot(self, feature: str) -> tuple[int, float]:
+        slot = self._slots.get(feature)
+        if slot is None:
+            if len(self._slots) >= MAX_CACHED_FEATURES:
+                self._slots.clear()
+            digest = zlib.crc32(feature.encode())
+            slot = self._slots[feature] = (digest % self.dim,
+                                           1.0 if digest & 0x80000000 else -1.0)
+        return slot
+
+    def embed_into(self, text: str, out: np.ndarray) -> None:
+        """Write the normalized embedding of `text` into the zeroed row `out`."""
+        tokens = tokenize(text)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1.0
+        for first, second in zip(tokens, tokens[1:]):
+            pair = first + ' ' + second
+            counts[pair] = counts.get(pair, 0) + BIGRAM_WEIGHT
+
+        for feature, count in counts.items():
+            index, sign = self._slot(feature)
+            out[index] += sign * (1.0 + math.log(count) if count >= 1 else count)
+
+        norm = float(np.linalg.norm(out))
+        if norm > 0:
+            out /= norm
+
+    def embed_documents(self, texts: list[str]) -> np.ndarray:
+        """
+        Embed many texts.
+
+        Args:
+            texts: Texts to embed.
+
+        Returns:
+            A (len(texts), dim) float32 matrix of unit-length rows (all-zero
+            rows for texts without any word).
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in zip(vectors, texts):
+            self.embed_into(text, row)
+        return vectors
+
+    def embed_query(self, text: str) -> np.ndarray:
+        """Embed one query; returns a unit-length float32 vector of length `dim`."""
+        return self.embed_documents([text])[0]
@@ -0,0 +1,474 @@
+"""
+Streaming Corpus Ingestion
+
+`DocumentIndexer.load_documents` reads every file into memory before
+anything is embedded, which does not scale to hundreds of thousands of
+pages. `IngestionPipeline` streams the corpus through five stages instead:
+
+    discover -> read -> split -> embed -> index
+
+- discover walks the input paths lazily;
+- read yields each file in pieces: a PDF page at a time, text and markdown
+  in blocks of about `READ_BLOCK_CHARS` cut at paragraph breaks;
+- split turns each piece into chunks with the indexer's splitter;
+- embed groups chunks into batches and embeds them in a worker pool
+  (threads for remote embedding APIs, or processes for CPU-bound local
+  embedders);
+- index adds embedded batches to the indexer, in corpus order.
+
+Each stage runs in its own thread and hands work to the next through a
+bounded queue, so a slow stage holds back the ones before it instead of
+letting work pile up: the pipeline's own memory is bounded by the queue
+sizes whatever the size of the corpus. Only the index itself grows, by its
+per-chunk footprint (see `bench_index.py`); pass a `sink` to send embedded
+chunks elsewhere.
+
+Every stage counts the items it produced and the time it spent working
+(excluding waits on its neighbours), so `stats()` shows where the
+bottleneck is.
+
+Usage:
+    python ingest.py docs/ more_docs/ --workers 4 --processes
+    python ingest.py --synthesize 20000 --corpus /tmp/corpus --no-index
+"""
+
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+LOADABLE_EXTENSIONS = ('.md', '.txt', '.pdf')
+
+# Characters of text read from a file per document piece
+READ_BLOCK_CHARS = 1 << 20
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_WORKERS = 2
+# Items per queue between stages; the chunk queue holds this many batches' worth
+DEFAULT_QUEUE_SIZE = 8
+
+STAGES = ('discover', 'read', 'split', 'embed', 'index')
+
+# How often blocked stages check whether the pipeline was aborted
+_POLL_SECONDS = 0.1
+
+_DONE = object()
+
+
+# =============================================================================
+# FILE READING
+# =============================================================================
+
+def discover_files(path: str) -> Iterator[tuple[str, str]]:
+    """
+    Loadable files under `path` (or `path` itself), in sorted order.
+
+    Yields:
+        (path, source) pairs; source is the path relative to `path`'s
+        directory tree (the file name for a single file).
+
+    Raises:
+        FileNotFoundError: If `path` does not exist.
+    """
+    if os.path.isfile(path):
+        yield path, os.path.basename(path)
+        return
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No such file or directory: {path!r}")
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(LOADABLE_EXTENSIONS):
+                full = os.path.join(root, name)
+                yield full, os.path.relpath(full, path)
+
+
+def read_file(path: str, source: str) -> Iterator[dict]:
+    """
+    Read one file as a sequence of documents, without holding all of it in memory.
+
+    PDF files (which need pypdf) yield a document per page with
+    `metadata['page']`. Text files yield blocks of about `READ_BLOCK_CHARS`,
+    split at the last paragraph (or line) break, with `metadata['part']`.
+    """
+    if path.lower().endswith('.pdf'):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            print(f"Skipping {source}: install pypdf to load PDF files", file=sys.stderr)
+            return
+        for number, page in enumerate(PdfReader(path).pages, 1):
+            text = page.extract_text() or ""
+            if text.strip():
+                yield {'page_content': text, 'metadata': {'source': source, 'page': number}}
+        return
+
+    part, pending = 0, ""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        while True:
+            block = f.read(READ_BLOCK_CHARS)
+            pending += block
+            if block and len(pending) < READ_BLOCK_CHARS:
+                continue
+            cut = len(pending)
+            if block:
+                for separator in ("\n\n", "\n"):
+                    position = pending.rfind(separator)
+                    if position > 0:
+                        cut = position + len(separator)
+                        break
+            text, pending = pending[:cut], pending[cut:]
+            if text.strip():
+                yield {'page_content': text, 'metadata': {'source': source, 'part': part}}
+                part += 1
+            if not block:
+                return
+
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+class StageCounter:
+    """Items one stage produced and seconds it spent producing them."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.busy += seconds
+
+    def to_dict(self) -> dict:
+        return {
+            'stage': self.name,
+            'items': self.items,
+            'busy_seconds': self.busy,
+            # Throughput while working; a stage with the lowest rate is the bottleneck
+            'items_per_second': self.items / self.busy if self.busy else 0.0,
+        }
+
+
+class _Aborted(Exception):
+    """Raised in a stage thread when another stage has failed."""
+
+
+class IngestionPipeline:
+    """
+    Stream files through discover, read, split, embed and index stages.
+
+    Args:
+        indexer: A `DocumentIndexer`; its `split_document` chunks pieces and
+            its embedder embeds them.
+        batch_size: Chunks per embedding call.
+        workers: Embedding workers.
+        processes: Embed in worker processes instead of threads (the
+            embedder must be picklable).
+        queue_size: Capacity of each queue between stages.
+        sink: Called as `sink(chunks, vectors)` for each embedded batch, in
+            corpus order. Defaults to `indexer.add_chunks`.
+    """
+
+    def __init__(self, indexer, batch_size: int = DEFAULT_BATCH_SIZE,
+                 workers: int = DEFAULT_WORKERS, processes: bool = False,
+                 queue_size: int = DEFAULT_QUEUE_SIZE,
+                 sink: Callable | None = None):
+        self.indexer = indexer
+        self.batch_size = batch_size
+        self.workers = workers
+        self.processes = processes
+        self.queue_size = queue_size
+        self.sink = sink or indexer.add_chunks
+        self.counters = {name: StageCounter(name) for name in STAGES}
+        self.elapsed = 0.0
+        self._abort = threading.Event()
+        self._error = None
+
+    def stats(self) -> dict:
+        """Per-stage counters, wall time and overall chunks/s."""
+        chunks = self.counters['index'].items
+        return {
+            'stages': [counter.to_dict() for counter in self.counters.values()],
+            'elapsed_seconds': self.elapsed,
+            'chunks_per_second': chunks / self.elapsed if self.elapsed else 0.0,
+        }
+
+    def run(self, paths: Iterable[str]) -> dict:
+        """
+        Ingest every loadable file under `paths`.
+
+        Args:
+            paths: Files or directories.
+
+        Returns:
+            `stats()` after the last chunk is indexed.
+
+        Raises:
+            Exception: The first error raised by any stage; the other stages
+                are stopped.
+        """
+        started = time.perf_counter()
+        self._abort.clear()
+        self._error = None
+        files = queue.Queue(self.queue_size)
+        documents = queue.Queue(self.queue_size)
+        chunks = queue.Queue(self.queue_size * self.batch_size)
+        embedded = queue.Queue(self.queue_size)
+
+        if self.processes:
+            pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                       initargs=(self.indexer.embedder,))
+        else:
+            pool = ThreadPoolExecutor(self.workers, thread_name_prefix='embed')
+
+        threads = [
+            threading.Thread(target=self._stage, daemon=True,
+                             args=('discover', iter(paths), files, discover_files)),
+            threading.Thread(target=self._stage, daemon=True,
+                             args=('read', self._drain(files), documents,
+                                   lambda item: read_file(*item))),
+            threading.Thread(target=self._stage, daemon=True,
+                             args=('split', self._drain(documents), chunks,
+                                   self.indexer.split_document)),
+            threading.Thread(target=self._dispatch, daemon=True,
+                             args=(chunks, embedded, pool)),
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            self._index(embedded)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._abort.set()
+            for thread in threads:
+                thread.join()
+            pool.shutdown(wait=True, cancel_futures=True)
+            self.elapsed += time.perf_counter() - started
+
+        if self._error is not None and not isinstance(self._error, _Aborted):
+            raise self._error
+        return self.stats()
+
+    # -------------------------------------------------------------------------
+    # Stages
+    # -------------------------------------------------------------------------
+
+    def _stage(self, name: str, items: Iterator, outbox: queue.Queue,
+               transform: Callable[..., Iterable]) -> None:
+        """Put the outputs of `transform(item)` for each item on `outbox`."""
+        counter = self.counters[name]
+        try:
+            for item in items:
+                # Transforms may do their work eagerly (returning a list) or lazily
+                tick = time.perf_counter()
+                outputs = iter(transform(item))
+                counter.record(0, time.perf_counter() - tick)
+                while True:
+                    tick = time.perf_counter()
+                    output = next(outputs, _DONE)
+                    counter.record(output is not _DONE, time.perf_counter() - tick)
+                    if output is _DONE:
+                        break
+                    self._put(outbox, output)
+            self._put(outbox, _DONE)
+        except BaseException as e:
+            self._fail(e)
+
+    def _dispatch(self, inbox: queue.Queue, outbox: queue.Queue, pool) -> None:
+        """Group chunks into batches and submit them to the embedding pool, in order."""
+        embedder = None if self.processes else self.indexer.embedder
+        try:
+            batch = []
+            for chunk in self._drain(inbox):
+                batch.append(chunk)
+                if len(batch) == self.batch_size:
+                    texts = [item['page_content'] for item in batch]
+                    self._put(outbox, (batch, pool.submit(_embed_batch, texts, embedder)))
+                    batch = []
+            if batch:
+                texts = [item['page_content'] for item in batch]
+                self._put(outbox, (batch, pool.submit(_embed_batch, texts, embedder)))
+            self._put(outbox, _DONE)
+        except BaseException as e:
+            self._fail(e)
+
+    def _index(self, inbox: queue.Queue) -> None:
+        """Hand embedded batches to the sink as they complete, in submission order."""
+        for batch, future in self._drain(inbox):
+            vectors, seconds = future.result()
+            self.counters['embed'].record(len(batch), seconds)
+            tick = time.perf_counter()
+            self.sink(batch, vectors)
+            self.counters['index'].record(len(batch), time.perf_counter() - tick)
+
+    # -------------------------------------------------------------------------
+    # Queues
+    # -------------------------------------------------------------------------
+
+    def _put(self, outbox: queue.Queue, item) -> None:
+        while True:
+            if self._abort.is_set() and self._error is not None:
+                raise _Aborted()
+            try:
+                outbox.put(item, timeout=_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def _drain(self, inbox: queue.Queue) -> Iterator:
+        """Items from `inbox` until the upstream stage finishes."""
+        while True:
+            if self._abort.is_set() and self._error is not None:
+                raise _Aborted()
+            try:
+                item = inbox.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    def _fail(self, error: BaseException) -> None:
+        if self._error is None:
+            self._error = error
+        self._abort.set()
+
+
+_EMBEDDER = None
+
+
+def _init_worker(embedder) -> None:
+    """Give a worker process its own copy of the embedder, sent once."""
+    global _EMBEDDER
+    _EMBEDDER = embedder
+
+
+def _embed_batch(texts: list[str], embedder=None) -> tuple:
+    """Embed a batch; returns (vectors, seconds spent)."""
+    started = time.perf_counter()
+    vectors = (embedder or _EMBEDDER).embed_documents(texts)
+    return vectors, time.perf_counter() - started
+
+
+# =============================================================================
+# SYNTHETIC CORPUS
+# =============================================================================
+
+def synthetic_documents(count: int, seed: int = 0) -> Iterator[tuple[str, str]]:
+    """
+    Generate markdown documents built from the lab's sample documents.
+
+    Each takes one of the sample documents, shuffles its sections and tags
+    it with its number, so documents differ while keeping realistic text.
+
+    Yields:
+        (name, content) pairs, e.g. ("0000002_faq.md", "# Frequently ...").
+    """
+    from rag_pipeline import sample_documents
+
+    rng = random.Random(seed)
+    templates = []
+    for document in sample_documents():
+        head, *sections = document['page_content'].split("\n## ")
+        templates.append((document['metadata']['source'], head, sections))
+
+    for number in range(count):
+        name, head, sections = templates[number % len(templates)]
+        sections = rng.sample(sections, len(sections))
+        yield f"{number:07d}_{name}", "\n## ".join([f"{head}\n\nRevision {number}", *sections])
+
+
+def synthesize_corpus(directory: str, files: int, seed: int = 0,
+                      files_per_dir: int = 1000) -> int:
+    """
+    Write `synthetic_documents` to disk as a large markdown corpus.
+
+    Existing files are left alone, so a corpus can be reused between runs.
+
+    Args:
+        directory: Where to write; files go in subdirectories of
+            `files_per_dir` files.
+        files: Number of files.
+        seed: Seed for the section order.
+
+    Returns:
+        Total characters in the corpus.
+    """
+    total = 0
+    for number, (name, content) in enumerate(synthetic_documents(files, seed)):
+        total += len(content)
+        path = os.path.join(directory, f"{number // files_per_dir:04d}", name)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(content)
+    return total
+
+
+# =============================================================================
+# CLI INTERFACE
+# =============================================================================
+
+def print_stats(stats: dict) -> None:
+    print(f"{'stage':<9} {'items':>10} {'busy':>8} {'items/s':>10}")
+    for stage in stats['stages']:
+        print(f"{stage['stage']:<9} {stage['items']:>10,} {stage['busy_seconds']:>7.1f}s "
+              f"{stage['items_per_second']:>10.0f}")
+    print(f"\n{stats['elapsed_seconds']:.1f}s wall, "
+          f"{stats['chunks_per_second']:.0f} chunks/s end to end")
+
+
+def main():
+    """Ingest a corpus from the command line and report per-stage throughput."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stream a document corpus into the index")
+    parser.add_argument("paths", nargs="*", help="Files or directories to ingest")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--processes", action="store_true",
+                        help="Embed in worker processes instead of threads")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE)
+    parser.add_argument("--synthesize", type=int, metavar="FILES",
+                        help="First write a synthetic corpus of this many files to --corpus")
+    parser.add_argument("--corpus", default="synthetic_corpus",
+                        help="Directory for --synthesize (default: %(default)s)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="Discard embedded chunks instead of indexing them")
+    args = parser.parse_args()
+
+    from rag_pipeline import DocumentIndexer
+
+    paths = args.paths
+    if args.synthesize:
+        characters = synthesize_corpus(args.corpus, args.synthesize)
+        print(f"Synthesized {args.synthesize:,} files ({characters / 1e6:.0f}M characters) "
+              f"in {args.corpus}")
+        paths = paths or [args.corpus]
+    if not paths:
+        parser.error("give paths to ingest or --synthesize")
+
+    indexer = DocumentIndexer()
+    pipeline = IngestionPipeline(indexer, batch_size=args.batch_size, workers=args.workers,
+                                 processes=args.processes, queue_size=args.queue_size,
+                                 sink=(lambda chunks, vectors: None) if args.no_index else None)
+    print_stats(pipeline.run(paths))
+
+    if sys.platform != 'win32':
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(f"peak memory {peak / 1024:.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+"""
+Solution: Production RAG Pipeline - Reference Retrieval Engine
+
+A dependency-light reference implementation of the lab's `DocumentIndexer`
+and `HybridRetriever` that runs offline and can be load-tested:
+
+- markdown is chunked along its headings, paragraphs and list items, and
+  each chunk keeps its heading breadcrumb (`chunking.py`); the lab's
+  recursive character splitter with overlap is available as
+  `chunker="recursive"`;
+- chunks are stored as offsets into their document's text, not copies;
+- chunks are embedded locally and deterministically (`embeddings.py`) and
+  stored in a contiguous float32 matrix (`vector_index.py`), so a batch of
+  queries is answered with one matrix multiply and `argpartition` top-k;
+  large corpora can use an approximate IVF-PQ index instead
+  (`ann_index.py`);
+- keyword relevance is Okapi BM25 over an incrementally updated inverted
+  index with block-max top-k pruning (`bm25.py`);
+- hybrid retrieval re-scores the union of both candidate sets and blends
+  min-max normalized scores with `alpha` (0 = BM25 only, 1 = vectors only).
+
+Documents and chunks are plain dicts shaped like LangChain documents,
+{"page_content": str, "metadata": {"source": ..., ...}}, so the
+cross-encoder re-ranking and answer generation steps of the lab apply
+unchanged.
+
+Usage:
+    python rag_pipeline.py                      # index the sample docs
+    python rag_pipeline.py sample_docs/ -q "How do I reset my password?"
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from bm25 import BM25Index
+from chunking import ChunkStore, locate_chunks, split_markdown
+from embeddings import HashingEmbedder
+from ingest import discover_files, read_file
+from vector_index import VectorIndex
+
+# Chunking defaults from the lab instructions
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+SEPARATORS = ("\n\n", "\n", ". ", " ", "")
+CHUNKERS = ('markdown', 'recursive')
+
+# Candidates taken from each retriever before hybrid re-scoring
+DEFAULT_CANDIDATES = 50
+
+
+# =============================================================================
+# CHUNKING
+# =============================================================================
+
+def split_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+               separators: tuple[str, ...] = SEPARATORS) -> list[str]:
+    """
+    Split text into chunks of at most `chunk_size` characters.
+
+    Text is split on the first separator that occurs in it; pieces that are
+    still too long are split again with the next separators. Pieces are then
+    merged back into chunks, and consecutive chunks share up to
+    `chunk_overlap` characters of trailing pieces.
+
+    Args:
+        text: Text to split.
+        chunk_size: Largest chunk length in characters.
+        chunk_overlap: Characters of context repeated between chunks.
+        separators: Separators from coarsest to finest; "" splits characters.
+
+    Returns:
+        The chunks, in order, without leading or trailing whitespace.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    separator, finer = separators[-1], ()
+    for i, candidate in enumerate(separators):
+        if candidate == "" or candidate in text:
+            separator, finer = candidate, separators[i + 1:]
+            break
+
+    pieces = text.split(separator) if separator else list(text)
+    chunks, current, length = [], [], 0
+    joiner = len(separator)
+
+    def flush() -> None:
+        chunk = separator.join(current).strip()
+        if chunk:
+            chunks.append(chunk)
+
+    for piece in pieces:
+        if len(piece) > chunk_size:
+            if current:
+                flush()
+                current, length = [], 0
+            if finer:
+                chunks.extend(split_text(piece, chunk_size, chunk_overlap, finer))
+            else:
+                chunks.append(piece)
+            continue
+
+        if current and length + joiner + len(piece) > chunk_size:
+            flush()
+            # Keep trailing pieces as overlap while they fit
+            while current and (length > chunk_overlap
+                               or length + joiner + len(piece) > chunk_size):
+                length -= len(current.pop(0)) + (joiner if current else 0)
+        length += len(piece) + (joiner if current else 0)
+        current.append(piece)
+
+    if current:
+        flush()
+    return chunks
+
+
+# =============================================================================
+# INDEXING
+# =============================================================================
+
+class DocumentIndexer:
+    """
+    Load, chunk, embed and index documents.
+
+    Args:
+        embedder: Object with `embed_documents(texts)` returning a float32
+            matrix; defaults to a local `HashingEmbedder`.
+        chunk_size: Largest chunk length in characters.
+        chunk_overlap: Characters shared by consecutive chunks ("recursive" only).
+        chunker: "markdown" (structure-aware, see `chunking.split_markdown`)
+            or "recursive" (`split_text`).
+        vector_index: Called with the embedding dimension to create the
+            vector index; defaults to an exact `VectorIndex`. Pass e.g.
+            `ann_index.IVFPQIndex` for approximate search over large corpora.
+
+    Attributes:
+        chunks: A `ChunkStore`; chunk i is row i of the vector index.
+    """
+
+    def __init__(self, embedder=None, chunk_size: int = CHUNK_SIZE,
+                 chunk_overlap: int = CHUNK_OVERLAP, chunker: str = 'markdown',
+                 vector_index=None):
+        if chunker not in CHUNKERS:
+            raise ValueError(f"Unknown chunker {chunker!r}; expected one of {CHUNKERS}")
+        self.embedder = embedder or HashingEmbedder()
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunker = chunker
+        self.vector_index = vector_index
+        self.chunks = ChunkStore()
+        self.index = None
+        self.keywords = BM25Index()
+        self._document = (None, -1)
+
+    def load_documents(self, docs_dir: str) -> list[dict]:
+        """
+        Load .md, .txt and (with pypdf installed) .pdf files from a directory tree.
+
+        Args:
+            docs_dir: Directory to search recursively.
+
+        Returns:
+            Documents with `page_content` and `metadata['source']` (the path
+            relative to `docs_dir`), in path order: one per PDF page, and one
+            per text file unless it is very large (see `ingest.read_file`).
+        """
+        return [document for path, source in discover_files(docs_dir)
+                for document in read_file(path, source)]
+
+    def split_document(self, document: dict) -> list[dict]:
+        """
+        Chunks of one document, ready to embed.
+
+        A chunk's `page_content` is the text to index: for chunks under a
+        heading, the breadcrumb line ("Guide > Setup > Passwords") then the
+        chunk text. Its metadata is the document's plus `chunk`, `start`,
+        `end` and `headings`, and `document` refers to the source document.
+        """
+        text = document['page_content']
+        if self.chunker == 'markdown':
+            spans = split_markdown(text, self.chunk_size)
+        else:
+            pieces = split_text(text, self.chunk_size, self.chunk_overlap)
+            spans = [(start, end, ()) for start, end in locate_chunks(text, pieces)]
+
+        chunks = []
+        for number, (start, end, headings) in enumerate(spans):
+            body = text[start:end]
+            chunks.append({
+                'page_content': f"{' > '.join(headings)}\n\n{body}" if headings else body,
+                'metadata': {**document['metadata'], 'chunk': number, 'start': start,
+                             'end': end, 'headings': list(headings)},
+                'document': document,
+            })
+        return chunks
+
+    def add_chunks(self, chunks: list[dict], vectors: np.ndarray) -> np.ndarray:
+        """
+        Add embedded chunks to the vector and keyword indexes.
+
+        Only offsets are kept for each chunk; its document's text is stored
+        once, when its first chunk arrives.
+
+        Args:
+            chunks: Chunks from `split_document`, in order; `metadata['id']`
+                is set on each.
+            vectors: A (len(chunks), dim) matrix of their embeddings.
+
+        Returns:
+            The ids assigned to the chunks.
+        """
+        if self.index is None:
+            dim = vectors.shape[1]
+            self.index = (self.vector_index(dim) if self.vector_index
+                          else VectorIndex(dim, capacity=max(1, len(chunks))))
+        ids = self.index.add(vectors)
+        self.keywords.add([chunk['page_content'] for chunk in chunks])
+        for chunk in chunks:
+            document, document_id = self._document
+            if chunk['document'] is not document:
+                document = chunk['document']
+                document_id = self.chunks.add_document(document['page_content'],
+                                                       document['metadata'])
+                self._document = (document, document_id)
+            metadata = chunk['metadata']
+            metadata['id'] = self.chunks.add(document_id, metadata['start'], metadata['end'],
+                                             metadata['chunk'], tuple(metadata['headings']))
+        return ids
+
+    def index_documents(self, documents: list[dict]) -> VectorIndex:
+        """
+        Split documents into chunks and add them to the vector and keyword indexes.
+
+        May be called repeatedly; chunk ids continue across calls. For corpora
+        that do not fit in memory use `ingest.IngestionPipeline`.
+
+        Args:
+            documents: Documents with `page_content` and `metadata`.
+
+        Returns:
+            The vector index; row i holds the embedding of `self.chunks[i]`.
+        """
+        chunks = [chunk for document in documents for chunk in self.split_document(document)]
+        vectors = self.embedder.embed_documents([chunk['page_content'] for chunk in chunks])
+        self.add_chunks(chunks, vectors)
+        return self.index
+
+
+# =============================================================================
+# RETRIEVAL
+# =============================================================================
+
+class HybridRetriever:
+    """
+    Combine vector and BM25 keyword search over a `DocumentIndexer`.
+
+    Args:
+        indexer: An indexer whose documents have been indexed.
+        alpha: Default balance; 0 is BM25 only, 1 is vectors only.
+        candidates: Candidates taken from each retriever before blending.
+    """
+
+    def __init__(self, indexer: DocumentIndexer, alpha: float = 0.5,
+                 candidates: int = DEFAULT_CANDIDATES):
+        if indexer.index is None:
+            raise ValueError("Index documents before creating a retriever")
+        self.indexer = indexer
+        self.alpha = alpha
+        self.candidates = candidates
+
+    def retrieve(self, query: str, k: int = 10, alpha: float | None = None) -> list[dict]:
+        """
+        Hybrid retrieval for one query.
+
+        Args:
+            query: Search query.
+            k: Number of results.
+            alpha: Balance (0=BM25 only, 1=vector only); defaults to `self.alpha`.
+
+        Returns:
+            Up to k chunks, best first, each with `score`, `vector_score`
+            and `keyword_score` added.
+        """
+        return self.retrieve_batch([query], k, alpha)[0]
+
+    def retrieve_batch(self, queries: list[str], k: int = 10,
+                       alpha: float | None = None) -> list[list[dict]]:
+        """
+        Hybrid retrieval for many queries, with one matrix multiply for all of them.
+
+        Returns:
+            One result list per query (see `retrieve`).
+        """
+        alpha = self.alpha if alpha is None else alpha
+        vectors = self.indexer.embedder.embed_documents(queries)
+        index = self.indexer.index
+        _, vector_ids = index.search(vectors, max(k, self.candidates))
+
+        results = []
+        for query, vector, ids in zip(queries, vectors, vector_ids):
+            keywords = self.indexer.keywords
+            _, keyword_ids = keywords.search(query, max(k, self.candidates))
+            candidates = np.union1d(ids, keyword_ids)
+
+            semantic = index.matrix[candidates] @ vector
+            lexical = keywords.score(query, candidates)
+            blended = alpha * _min_max(semantic) + (1 - alpha) * _min_max(lexical)
+            best = np.argsort(-blended, kind='stable')[:k]
+            results.append([
+                {**self.indexer.chunks[candidates[i]], 'score': float(blended[i]),
+                 'vector_score': float(semantic[i]), 'keyword_score': float(lexical[i])}
+                for i in best
+            ])
+        return results
+
+
+def _min_max(scores: np.ndarray) -> np.ndarray:
+    """Scale scores to [0, 1]; constant scores become zeros."""
+    if not scores.size:
+        return np.zeros_like(scores)
+    low, high = scores.min(), scores.max()
+    if high - low <= 1e-12:
+        return np.zeros_like(scores)
+    return (scores - low) / (high - low)
+
+
+# =============================================================================
+# SAMPLE DATA AND CLI
+# =============================================================================
+
+def sample_documents() -> list[dict]:
+    """The lab's sample corpora from `starter_code/sample_docs.py`, as documents."""
+    starter = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'starter_code')
+    if starter not in sys.path:
+        sys.path.append(starter)
+    import sample_docs
+
+    return [
+        {'page_content': sample_docs.USER_GUIDE.strip(), 'metadata': {'source': 'user_guide.md'}},
+        {'page_content': sample_docs.API_REFERENCE.strip(),
+         'metadata': {'source': 'api_reference.md'}},
+        {'page_content': sample_docs.FAQ.strip(), 'metadata': {'source': 'faq.md'}},
+    ]
+
+
+def main():
+    """Index documents and answer queries with hybrid retrieval."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reference hybrid retrieval over documents")
+    parser.add_argument("docs_dir", nargs="?",
+                        help="Directory of .md/.txt/.pdf files (default: the sample docs)")
+    parser.add_argument("-q", "--query", action="append",
+                        help="Query to run (repeatable); defaults to the lab's test questions")
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--chunker", choices=CHUNKERS, default='markdown')
+    args = parser.parse_args()
+
+    indexer = DocumentIndexer(chunker=args.chunker)
+    documents = indexer.load_documents(args.docs_dir) if args.docs_dir else sample_documents()
+    indexer.index_documents(documents)
+    print(f"Indexed {len(documents)} documents as {len(indexer.chunks)} chunks")
+
+    retriever = HybridRetriever(indexer, alpha=args.alpha)
+    queries = args.query or ["How do I reset my password?", "What are the API rate limits?"]
+    for query, results in zip(queries, retriever.retrieve_batch(queries, k=args.k)):
+        print(f"\n{query}")
+        for result in results:
+            preview = ' '.join(result['page_content'].split())[:70]
+            print(f"  {result['score']:.3f}  {result['metadata']['source']:<18} {preview}")
+
+
+if __name__ == "__main__":
+    main()
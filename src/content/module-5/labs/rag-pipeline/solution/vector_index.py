@@ -0,0 +1,186 @@
+"""
+In-Memory Vector Index
+
+Exact (brute-force) cosine-similarity search over a contiguous float32
+matrix, laid out so NumPy's BLAS does all the work:
+
+- Rows are L2-normalized once when added, so cosine similarity is a plain
+  dot product and queries never divide by norms.
+- Rows live in one preallocated C-contiguous matrix that grows by doubling,
+  so adding chunks is amortized O(1) and search reads memory sequentially.
+  There is no per-chunk Python object on the search path.
+- A batch of queries is answered with a single matrix multiply
+  (queries @ matrix.T), then `np.argpartition` selects each row's top k in
+  linear time; only those k are sorted. Large batches are split into
+  blocks so the score matrix stays within `SCORE_BLOCK_BYTES`.
+
+At 256 dimensions each chunk costs 1 KiB of vectors; a million chunks fit in
+1 GiB and are searched without any index structure.
+
+Example:
+    >>> index = VectorIndex(dim=256)
+    >>> ids = index.add(embedder.embed_documents(texts))
+    >>> scores, ids = index.search(embedder.embed_documents(queries), k=5)
+"""
+
+import numpy as np
+
+# Upper bound on the (queries x chunks) float32 score block of one multiply
+SCORE_BLOCK_BYTES = 64 * 1024 * 1024
+
+INITIAL_CAPACITY = 1024
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+    Return `vectors` as a C-contiguous float32 matrix of unit-length rows.
+
+    All-zero rows are left as zeros. A float32 C-contiguous input is
+    normalized in place.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def top_k(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Best `k` columns of each row of a score matrix, highest first.
+
+    Args:
+        scores: A (queries, candidates) matrix.
+        k: Results per row; clipped to the number of candidates.
+
+    Returns:
+        (values, indices), both of shape (queries, min(k, candidates)).
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(scores.dtype), empty.astype(np.int64)
+    if k < scores.shape[1]:
+        # Linear-time selection; only the selected k get sorted
+        indices = np.argpartition(scores, -k, axis=1)[:, -k:]
+    else:
+        indices = np.broadcast_to(np.arange(k), scores.shape).copy()
+    values = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-values, axis=1, kind='stable')
+    return np.take_along_axis(values, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+class VectorIndex:
+    """
+    Exact cosine-similarity index over a growable float32 matrix.
+
+    Row i of the matrix is the vector with id i; ids are assigned in the
+    order vectors are added.
+
+    Args:
+        dim: Vector dimension.
+        capacity: Rows to preallocate.
+    """
+
+    def __init__(self, dim: int, capacity: int = INITIAL_CAPACITY):
+        if dim < 1:
+            raise ValueError("Vector dimension must be positive")
+        self.dim = dim
+        self.size = 0
+        self._matrix = np.zeros((max(1, capacity), dim), dtype=np.float32)
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray) -> 'VectorIndex':
+        """
+        Index the rows of an existing matrix of unit vectors without copying it.
+
+        The matrix may be read-only, e.g. memory-mapped with
+        `np.load(path, mmap_mode='r')`; adding vectors copies it into memory.
+        """
+        if matrix.ndim != 2 or matrix.dtype != np.float32:
+            raise ValueError("Expected a 2-D float32 matrix")
+        index = cls(matrix.shape[1], capacity=1)
+        index._matrix = matrix
+        index.size = matrix.shape[0]
+        return index
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """The (size, dim) matrix of stored unit vectors (a view, not a copy)."""
+        return self._matrix[:self.size]
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes allocated for vectors, including spare capacity."""
+        return self._matrix.nbytes
+
+    def reserve(self, capacity: int) -> None:
+        """Make room for `capacity` rows in total without further reallocation."""
+        if capacity > self._matrix.shape[0]:
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:self.size] = self._matrix[:self.size]
+            self._matrix = grown
+
+    def add(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Normalize and append vectors.
+
+        Args:
+            vectors: A (n, dim) matrix or a single vector.
+
+        Returns:
+            The ids assigned to the new rows.
+
+        Raises:
+            ValueError: If the vectors do not have `dim` columns.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors.reshape(1, -1)
+        if vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+        count = vectors.shape[0]
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+        needed = self.size + count
+        if needed > self._matrix.shape[0]:
+            self.reserve(max(needed, 2 * self._matrix.shape[0]))
+
+        rows = self._matrix[self.size:needed]
+        rows[:] = vectors
+        normalize_rows(rows)
+        ids = np.arange(self.size, needed)
+        self.size = needed
+        return ids
+
+    def search(self, queries: np.ndarray, k: int = 10) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the `k` most similar stored vectors for each query.
+
+        Args:
+            queries: A (n, dim) matrix or a single vector; need not be normalized.
+            k: Results per query.
+
+        Returns:
+            (scores, ids), each of shape (n, min(k, size)), best first;
+            scores are cosine similarities.
+        """
+        queries = normalize_rows(np.array(queries, dtype=np.float32))
+        if queries.shape[1] != self.dim:
+            raise ValueError(f"Expected queries of dimension {self.dim}, got {queries.shape[1]}")
+
+        matrix = self.matrix
+        k = min(k, self.size)
+        scores = np.empty((queries.shape[0], k), dtype=np.float32)
+        ids = np.empty((queries.shape[0], k), dtype=np.int64)
+        block = max(1, SCORE_BLOCK_BYTES // (4 * max(1, self.size)))
+        for start in range(0, queries.shape[0], block):
+            end = start + block
+            block_scores = queries[start:end] @ matrix.T
+            scores[start:end], ids[start:end] = top_k(block_scores, k)
+        return scores, ids